@@ -1,6 +1,7 @@
 from flask_cors import CORS
 
 from app import create_app
+from app.resources.task.worker import start_embedded_pool
 
 app = create_app()
 # CORS(app, resources=r'/*')
@@ -17,4 +18,6 @@ if __name__ == '__main__':
         }
     })
     CORS(app)
+    # 未单独部署worker时，由web服务启动翻译worker进程池
+    start_embedded_pool(app)
     app.run(host='0.0.0.0', port=5000)
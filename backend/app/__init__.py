@@ -6,6 +6,7 @@ from .models.setting import Setting
 from .resources.task.translate_service import TranslateEngine
 from .script.init_db import safe_init_mysql
 from .script.insert_init_db import insert_initial_data, set_auto_increment, insert_initial_settings, insert_initial_users
+from .script.upgrade_db import upgrade_schema, migrate_content_terms
 from .utils.response import APIResponse
 
 
@@ -47,6 +48,8 @@ def create_app(config_class=None):
         # if not SystemSetting.query.filter_by(key='version').first():
         #     db.session.add(SystemSetting(key='version', value='business'))
         #     db.session.commit()
+    upgrade_schema(app)  # 已有数据库补充新增字段
+    migrate_content_terms(app)  # 旧版术语表内容迁移为术语条目
     insert_initial_data(app)
     insert_initial_users(app)
     set_auto_increment(app)
@@ -39,6 +39,8 @@ CREATE TABLE `comparison` (
   `customer_id` int(11) DEFAULT NULL,
   `created_at` datetime DEFAULT NULL,
   `updated_at` datetime DEFAULT NULL,
+  `terms_version` int(11) DEFAULT 0,
+  `terms_migrated` int(11) DEFAULT 0,
   `deleted_flag` text
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
@@ -58,6 +60,24 @@ CREATE TABLE `comparison_fav` (
 
 -- --------------------------------------------------------
 
+--
+-- 表的结构 `comparison_term`
+--
+
+CREATE TABLE `comparison_term` (
+  `id` int(11) NOT NULL,
+  `comparison_id` int(11) NOT NULL,
+  `source` varchar(512) NOT NULL,
+  `target` varchar(1024) NOT NULL,
+  `normalized_source` varchar(512) NOT NULL,
+  `origin_lang` varchar(32) DEFAULT '',
+  `target_lang` varchar(32) DEFAULT '',
+  `created_at` datetime DEFAULT NULL,
+  `updated_at` datetime DEFAULT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- --------------------------------------------------------
+
 --
 -- 表的结构 `customer`
 --
@@ -209,7 +229,11 @@ CREATE TABLE `translate` (
   `size` bigint(20) DEFAULT NULL,
   `server` text,
   `app_id` text,
-  `app_key` text
+  `app_key` text,
+  `queued_at` datetime DEFAULT NULL,
+  `worker_id` varchar(128) DEFAULT NULL,
+  `heartbeat_at` datetime DEFAULT NULL,
+  `attempts` int(11) DEFAULT 0
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 --
@@ -264,6 +288,15 @@ ALTER TABLE `comparison`
 ALTER TABLE `comparison_fav`
   ADD PRIMARY KEY (`id`);
 
+--
+-- 表的索引 `comparison_term`
+--
+ALTER TABLE `comparison_term`
+  ADD PRIMARY KEY (`id`),
+  ADD KEY `idx_comparison_term_comparison` (`comparison_id`,`id`),
+  ADD KEY `idx_comparison_term_source` (`comparison_id`,`normalized_source`),
+  ADD KEY `idx_comparison_term_lang` (`origin_lang`,`target_lang`,`normalized_source`);
+
 --
 -- 表的索引 `customer`
 --
@@ -322,6 +355,12 @@ ALTER TABLE `comparison`
 ALTER TABLE `comparison_fav`
   MODIFY `id` int(11) NOT NULL AUTO_INCREMENT;
 
+--
+-- 使用表AUTO_INCREMENT `comparison_term`
+--
+ALTER TABLE `comparison_term`
+  MODIFY `id` int(11) NOT NULL AUTO_INCREMENT;
+
 --
 -- 使用表AUTO_INCREMENT `customer`
 --
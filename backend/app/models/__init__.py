@@ -4,4 +4,6 @@ from .customer import Customer
 from .setting import Setting
 
 from .send_code import  SendCode
-__all__ = ['User', 'Customer', 'Setting','SendCode']
\ No newline at end of file
+from .cache import Cache, CacheLock
+from .checkpoint import TranslateCheckpoint
+__all__ = ['User', 'Customer', 'Setting','SendCode', 'Cache', 'CacheLock', 'TranslateCheckpoint']
\ No newline at end of file
@@ -0,0 +1,12 @@
+from app import db
+
+
+class TranslateCheckpoint(db.Model):
+    """ 翻译断点表：已完成的文本块译文，任务重启时跳过这些块 """
+    __tablename__ = 'translate_checkpoint'
+    translate_id = db.Column(db.Integer, primary_key=True)
+    block_key = db.Column(db.String(128), primary_key=True)  # 文本块uid，无uid时为原文哈希
+    source_hash = db.Column(db.String(40), nullable=False)  # 原文哈希，恢复时校验原文未变化
+    translated_text = db.Column(db.Text, nullable=False)
+    word_count = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.Integer, nullable=False)  # 写入时间（Unix时间戳）
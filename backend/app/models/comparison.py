@@ -11,10 +11,12 @@ class Comparison(db.Model):
     target_lang = db.Column(db.String(32), nullable=False)          # 目标语言代码（如zh）
     share_flag = db.Column(db.Enum('N', 'Y'), default='N')          # 是否共享
     added_count = db.Column(db.Integer, default=0)                  # 被添加次数（之前遗漏的字段）[^2]
-    content = db.Column(db.Text, nullable=False)                    # 术语内容（源1,目标1;源2,目标2）
+    content = db.Column(db.Text, nullable=False, default='')        # 旧版术语内容（源1: 目标1; 源2: 目标2），迁移到 comparison_term 后保留原文
     customer_id = db.Column(db.Integer, default=0)                  # 创建用户ID
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, onupdate=datetime.utcnow)                            # 更新时间
+    terms_version = db.Column(db.Integer, default=0)                # 术语版本号，术语每次变化加1（翻译任务的术语缓存以它判断是否失效）
+    terms_migrated = db.Column(db.Integer, default=0)               # 旧版 content 是否已迁移为术语条目（见 script/upgrade_db.py）
     deleted_flag = db.Column(db.Enum('N', 'Y'), default='N')        # 删除标记
 
     def to_dict(self):
@@ -43,3 +45,31 @@ class ComparisonFav(db.Model):
     updated_at = db.Column(db.DateTime,onupdate=datetime.utcnow)                             # 更新时间
 
 
+class ComparisonTerm(db.Model):
+    """ 术语表条目（每个术语一行） """
+    __tablename__ = 'comparison_term'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    comparison_id = db.Column(db.Integer, nullable=False)           # 所属术语表ID
+    source = db.Column(db.String(512), nullable=False)              # 源术语
+    target = db.Column(db.String(1024), nullable=False)             # 目标术语
+    normalized_source = db.Column(db.String(512), nullable=False)   # 规范化源术语（小写、去首尾空白），用于查询
+    origin_lang = db.Column(db.String(32), default='')              # 源语言（冗余自术语表，便于按语言对查询）
+    target_lang = db.Column(db.String(32), default='')              # 目标语言
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('idx_comparison_term_comparison', 'comparison_id', 'id'),
+        db.Index('idx_comparison_term_source', 'comparison_id', 'normalized_source'),
+        db.Index('idx_comparison_term_lang', 'origin_lang', 'target_lang', 'normalized_source'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'comparison_id': self.comparison_id,
+            'origin': self.source,
+            'target': self.target,
+            'origin_lang': self.origin_lang,
+            'target_lang': self.target_lang,
+        }
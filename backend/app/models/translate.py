@@ -43,6 +43,11 @@ class Translate(db.Model):
     server = db.Column(db.String(32), default='openai')
     app_id = db.Column(db.String(64), default='')
     app_key = db.Column(db.String(64), default='')
+    # 任务队列（app/resources/task/job_queue.py）
+    queued_at = db.Column(db.DateTime)  # 入队时间，非空且 status='process' 表示在队列中
+    worker_id = db.Column(db.String(128))  # 领取任务的worker标识
+    heartbeat_at = db.Column(db.DateTime)  # worker最近一次心跳
+    attempts = db.Column(db.Integer, default=0)  # 已领取次数
 
     def to_dict(self):
         return {
@@ -9,6 +9,7 @@ from flask_restful import Resource, reqparse
 from app import db
 from app.models import Customer
 from app.models.translate import Translate
+from app.resources.task import job_queue
 from app.utils.response import APIResponse
 from app.utils.validators import (
     validate_id_list
@@ -209,10 +210,8 @@ class AdminTranslateRestartResource(Resource):
             if record.status not in ['failed', 'done']:
                 return APIResponse.error('当前状态无法重启', 400)
 
-            record.status = 'none'
-            record.start_at = None
-            record.end_at = None
-            record.failed_reason = None
+            # 重新入队，已完成的文本块从断点恢复（translate/checkpoint.py）
+            job_queue.enqueue(record)
             db.session.commit()
             return APIResponse.success(message='任务已重启')
         except Exception as e:
@@ -1,19 +1,31 @@
 # resources/comparison.py
-import zipfile
-from io import BytesIO
-import pandas as pd
+import tempfile
+from urllib.parse import quote
 import pytz
-from flask import request, current_app, send_file
+from flask import request, current_app, send_file, Response, stream_with_context
 from flask_restful import Resource, reqparse
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from app.models import Customer
-from app.models.comparison import Comparison, ComparisonFav
+from app.models.comparison import Comparison, ComparisonFav, ComparisonTerm
+from app.translate import glossary
+from app.utils import comparison_terms
+from app.utils.file_utils import stream_zip
 from app.utils.response import APIResponse
 from sqlalchemy import func
 from datetime import datetime
 
 
+def _parse_form_content(data):
+    """解析表单中的 content[i][origin] / content[i][target]，返回 [(源术语, 目标术语), ...]"""
+    content_list = []
+    for key, value in data.items():
+        if key.startswith('content[') and '][origin]' in key:
+            # 提取索引
+            index = key.split('[')[1].split(']')[0]
+            content_list.append((value, data.get(f'content[{index}][target]', '')))
+    return content_list
+
 
 class MyComparisonListResource(Resource):
     @jwt_required()
@@ -21,7 +33,10 @@ class MyComparisonListResource(Resource):
         """获取我的术语表列表"""
         # 直接查询所有数据（不解析查询参数）
         query = Comparison.query.filter_by(customer_id=get_jwt_identity())
-        comparisons = [self._format_comparison(comparison) for comparison in query.all()]
+        records = query.all()
+        terms_map = comparison_terms.get_terms_map([comparison.id for comparison in records])
+        comparisons = [self._format_comparison(comparison, terms_map[comparison.id])
+                       for comparison in records]
 
         # 返回结果
         return APIResponse.success({
@@ -29,19 +44,8 @@ class MyComparisonListResource(Resource):
             'total': len(comparisons)
         })
 
-    def _format_comparison(self, comparison):
+    def _format_comparison(self, comparison, content_list):
         """格式化术语表数据"""
-        # 解析 content 字段
-        content_list = []
-        if comparison.content:
-            for item in comparison.content.split('; '):
-                if ':' in item:
-                    origin, target = item.split(':', 1)
-                    content_list.append({
-                        'origin': origin.strip(),
-                        'target': target.strip()
-                    })
-
         # 返回格式化后的数据
         return {
             'id': comparison.id,
@@ -96,13 +100,14 @@ class SharedComparisonListResource(Resource):
 
         # 直接获取所有结果
         results = query.all()
+        terms_map = comparison_terms.get_terms_map([comparison.id for comparison, _, _ in results])
 
         comparisons = [{
             'id': comparison.id,
             'title': comparison.title,
             'origin_lang': comparison.origin_lang,
             'target_lang': comparison.target_lang,
-            'content': self.parse_content(comparison.content),
+            'content': terms_map[comparison.id],
             'email': customer_email if customer_email else '匿名用户',
             'added_count': comparison.added_count,
             'created_at': comparison.created_at.strftime('%Y-%m-%d %H:%M'),
@@ -143,28 +148,16 @@ class EditComparisonResource(Resource):
             except ValueError:
                 return APIResponse.error("无效的 added_count 格式", 400)
 
-        # 更新 content
-        content_list = []
-        for key, value in data.items():
-            if key.startswith('content[') and '][origin]' in key:
-                # 提取索引
-                index = key.split('[')[1].split(']')[0]
-                origin = value
-                target = data.get(f'content[{index}][target]', '')
-                content_list.append(f"{origin}: {target}")
-
-        # 将 content_list 转换为字符串
-        content_str = '; '.join(content_list)
-        comparison.content = content_str
-
-        # 获取应用配置中的时区
-        timezone_str = current_app.config['TIMEZONE']
-        timezone = pytz.timezone(timezone_str)
+        # 整表编辑（提交了 content 或 title）时整体替换术语，单条增删改使用术语条目接口
+        content_list = _parse_form_content(data)
+        if content_list or 'title' in data:
+            comparison_terms.replace_terms(comparison, content_list)
 
         # 更新 updated_at 字段
-        comparison.updated_at = datetime.now(timezone)
+        comparison_terms.touch(comparison)
 
         db.session.commit()
+        glossary.invalidate(comparison.id)
         return APIResponse.success(message='术语表更新成功')
 
 
@@ -199,13 +192,15 @@ class CopyComparisonResource(Resource):
 
         new_comparison = Comparison(
             title=f"{comparison.title} (副本)",
-            content=comparison.content,
+            content='',
             origin_lang=comparison.origin_lang,
             target_lang=comparison.target_lang,
             customer_id=get_jwt_identity(),
             share_flag='N'
         )
         db.session.add(new_comparison)
+        db.session.flush()
+        comparison_terms.copy_terms(comparison.id, new_comparison)
         db.session.commit()
         return APIResponse.success({
             'new_id': new_comparison.id
@@ -251,17 +246,7 @@ class CreateComparisonResource(Resource):
             return APIResponse.error('缺少必要参数', 400)
 
         # 解析 content 参数
-        content_list = []
-        for key, value in data.items():
-            if key.startswith('content[') and '][origin]' in key:
-                # 提取索引
-                index = key.split('[')[1].split(']')[0]
-                origin = value
-                target = data.get(f'content[{index}][target]', '')
-                content_list.append(f"{origin}: {target}")
-
-        # 将 content_list 转换为字符串
-        content_str = '; '.join(content_list)
+        content_list = _parse_form_content(data)
 
         # 获取应用配置中的时区
         timezone_str = current_app.config['TIMEZONE']
@@ -276,13 +261,15 @@ class CreateComparisonResource(Resource):
             title=data['title'],
             origin_lang=data['origin_lang'],
             target_lang=data['target_lang'],
-            content=content_str,  # 插入转换后的 content 字符串
+            content='',  # 术语保存在 comparison_term 表
             customer_id=get_jwt_identity(),
             share_flag=data.get('share_flag', 'N'),
             created_at=current_time,  # 显式赋值
             updated_at=current_time  # 显式赋值
         )
         db.session.add(comparison)
+        db.session.flush()
+        comparison_terms.add_terms(comparison, content_list)
         db.session.commit()
         return APIResponse.success({
             'id': comparison.id
@@ -299,8 +286,10 @@ class DeleteComparisonResource(Resource):
             customer_id=get_jwt_identity()
         ).first_or_404()
 
+        comparison_terms.delete_terms(comparison.id)
         db.session.delete(comparison)
         db.session.commit()
+        glossary.invalidate(id)
         return APIResponse.success(message='删除成功')
 
 
@@ -339,34 +328,42 @@ class ImportComparisonResource(Resource):
             return APIResponse.error('未选择文件', 400)
         file = request.files['file']
 
+        # 以只读模式打开 Excel 文件并检查表头（逐行读取，不整表加载），退出 with 块时关闭工作簿
+        try:
+            with comparison_terms.read_terms_workbook(file.stream) as rows:
+                return self._import_rows(rows)
+        except ValueError as e:
+            return APIResponse.error(str(e), 406)
+        except Exception as e:
+            return APIResponse.error(f"文件导入失败：{str(e)}", 500)
+
+    @staticmethod
+    def _import_rows(rows):
+        """创建术语表并写入导入的术语"""
         try:
-            # 读取 Excel 文件
-            import pandas as pd
-            df = pd.read_excel(file)
-
-            # 检查文件是否包含所需的列
-            if not {'源术语', '目标术语'}.issubset(df.columns):
-                return APIResponse.error('文件格式不符合模板要求', 406)
-            # 解析 Excel 文件内容
-            content = ';'.join(
-                [f"{row['源术语']}: {row['目标术语']}" for _, row in df.iterrows()])  # 按 ': ' 分隔
             # 创建术语表
             comparison = Comparison(
                 title='导入的术语表',
                 origin_lang='未知',
                 target_lang='未知',
-                content=content,  # 使用改进后的格式
+                content='',
                 customer_id=get_jwt_identity(),
-                share_flag='N'
+                share_flag='N',
+                updated_at=datetime.now(pytz.timezone(current_app.config['TIMEZONE']))
             )
             db.session.add(comparison)
+            db.session.flush()
+            # 逐行读取，按批批量写入术语
+            comparison_terms.add_terms(comparison, rows)
             db.session.commit()
+            glossary.invalidate(comparison.id)
 
             # 返回成功响应
             return APIResponse.success({
                 'id': comparison.id
             })
         except Exception as e:
+            db.session.rollback()
             # 捕获并返回错误信息
             return APIResponse.error(f"文件导入失败：{str(e)}", 500)
 
@@ -383,19 +380,13 @@ class ExportComparisonResource(Resource):
 
         # 查询术语表
         comparison = Comparison.query.get_or_404(id)
-        print(comparison.customer_id, current_user_id)
         # 检查术语表是否共享或属于当前用户
         if comparison.share_flag == 'Y' or comparison.customer_id != int(current_user_id):
             return {'message': '术语表未共享或无权限访问', 'code': 403}, 403
 
-        # 解析术语内容
-        terms = [term.split(': ') for term in comparison.content.split(';')]  # 按 ': ' 分割
-        df = pd.DataFrame(terms, columns=['源术语', '目标术语'])
-
-        # 创建 Excel 文件
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, index=False)
+        # 逐行写入临时文件，不在内存中构建整个工作簿
+        output = tempfile.TemporaryFile()
+        comparison_terms.write_terms_workbook(comparison.id, output)
         output.seek(0)
 
         # 返回文件下载响应
@@ -407,44 +398,130 @@ class ExportComparisonResource(Resource):
         )
 
 
-
-
 # 批量导出所有术语表
 class ExportAllComparisonsResource(Resource):
     @jwt_required()
     def get(self):
         """
         批量导出所有术语表
+        逐个术语表写入临时文件并流式打包为ZIP分块返回，内存中只保留当前块
         """
         # 获取当前用户 ID
         current_user_id = get_jwt_identity()
 
         # 查询当前用户的所有术语表
-        comparisons = Comparison.query.filter_by(customer_id=current_user_id).all()
+        comparisons = db.session.query(Comparison.id, Comparison.title).filter_by(
+            customer_id=current_user_id).all()
+
+        def workbooks():
+            used_names = set()
+            for comparison_id, title in comparisons:
+                # 同名术语表加上ID区分，避免ZIP内文件重名
+                name = f"{title}.xlsx"
+                if name in used_names:
+                    name = f"{title}_{comparison_id}.xlsx"
+                used_names.add(name)
+
+                with tempfile.TemporaryFile() as output:
+                    comparison_terms.write_terms_workbook(comparison_id, output)
+                    output.seek(0)
+                    yield name, output
+
+        download_name = f'术语表_{datetime.now().strftime("%Y%m%d")}.zip'
+        return Response(
+            stream_with_context(stream_zip(workbooks())),
+            mimetype='application/zip',
+            headers={'Content-Disposition':
+                     f"attachment; filename=comparisons.zip; filename*=UTF-8''{quote(download_name)}"}
+        )
 
-        # 创建 ZIP 文件
-        memory_file = BytesIO()
-        with zipfile.ZipFile(memory_file, 'w') as zf:
-            for comparison in comparisons:
-                # 解析术语内容
-                terms = [term.split(': ') for term in comparison.content.split(';')]  # 按 ': ' 分割
-                df = pd.DataFrame(terms, columns=['源术语', '目标术语'])
 
-                # 创建 Excel 文件
-                output = BytesIO()
-                with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                    df.to_excel(writer, index=False)
-                output.seek(0)
+def _get_owned_comparison(id):
+    """获取当前用户的术语表"""
+    return Comparison.query.filter_by(
+        id=id,
+        customer_id=get_jwt_identity(),
+        deleted_flag='N'
+    ).first_or_404()
 
-                # 将 Excel 文件添加到 ZIP 中
-                zf.writestr(f"{comparison.title}.xlsx", output.getvalue())
 
-        memory_file.seek(0)
+# 术语条目列表（分页）/ 添加术语
+class ComparisonTermListResource(Resource):
+    @jwt_required()
+    def get(self, id):
+        """分页获取术语条目（自己的或共享的术语表）"""
+        comparison = Comparison.query.filter_by(id=id, deleted_flag='N').first_or_404()
+        if comparison.customer_id != int(get_jwt_identity()) and comparison.share_flag != 'Y':
+            return APIResponse.error('术语表未共享或无权限访问', 403)
 
-        # 返回 ZIP 文件下载响应
-        return send_file(
-            memory_file,
-            mimetype='application/zip',
-            as_attachment=True,
-            download_name=f'术语表_{datetime.now().strftime("%Y%m%d")}.zip'
-        )
+        parser = reqparse.RequestParser()
+        parser.add_argument('page', type=int, default=1, location='args')
+        parser.add_argument('limit', type=int, default=100, location='args')
+        parser.add_argument('keyword', type=str, default='', location='args')
+        args = parser.parse_args()
+
+        query = ComparisonTerm.query.filter_by(comparison_id=id)
+        keyword = (args['keyword'] or '').strip()
+        if keyword:
+            query = query.filter(ComparisonTerm.normalized_source.like(
+                f"%{comparison_terms.normalize_source(keyword)}%"))
+        pagination = query.order_by(ComparisonTerm.id).paginate(
+            page=args['page'], per_page=args['limit'], error_out=False)
+
+        return APIResponse.success({
+            'data': [term.to_dict() for term in pagination.items],
+            'total': pagination.total
+        })
+
+    @jwt_required()
+    def post(self, id):
+        """添加术语，支持单条（origin/target）或多条（content[i][origin]/content[i][target]）"""
+        comparison = _get_owned_comparison(id)
+        data = request.form
+        content_list = _parse_form_content(data)
+        if 'origin' in data:
+            content_list.append((data['origin'], data.get('target', '')))
+
+        count = comparison_terms.add_terms(comparison, content_list)
+        if not count:
+            return APIResponse.error('术语不能为空', 400)
+        comparison_terms.touch(comparison)
+        db.session.commit()
+        glossary.invalidate(comparison.id)
+        return APIResponse.success({'count': count}, message='术语添加成功')
+
+
+# 修改/删除单条术语
+class ComparisonTermResource(Resource):
+    @jwt_required()
+    def put(self, id, term_id):
+        """修改术语"""
+        comparison = _get_owned_comparison(id)
+        term = ComparisonTerm.query.filter_by(id=term_id, comparison_id=id).first_or_404()
+
+        data = request.form
+        origin = data.get('origin', term.source).strip()
+        target = data.get('target', term.target).strip()
+        if not origin or not target:
+            return APIResponse.error('术语不能为空', 400)
+
+        term.source = origin[:comparison_terms.SOURCE_MAX_LENGTH]
+        term.target = target[:comparison_terms.TARGET_MAX_LENGTH]
+        term.normalized_source = comparison_terms.normalize_source(term.source)
+        term.updated_at = datetime.utcnow()
+        comparison_terms.touch(comparison)
+        db.session.commit()
+        glossary.invalidate(comparison.id)
+        return APIResponse.success(term.to_dict(), message='术语更新成功')
+
+    @jwt_required()
+    def delete(self, id, term_id):
+        """删除术语"""
+        comparison = _get_owned_comparison(id)
+        term = ComparisonTerm.query.filter_by(id=term_id, comparison_id=id).first_or_404()
+
+        db.session.delete(term)
+        comparison_terms.touch(comparison)
+        db.session.commit()
+        glossary.invalidate(comparison.id)
+        return APIResponse.success(message='删除成功')
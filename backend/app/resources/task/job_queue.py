@@ -0,0 +1,146 @@
+# resources/task/job_queue.py
+"""
+基于 translate 表的翻译任务队列
+- 入队：status='process' 且 queued_at 非空、worker_id 为空（doc2x 等外部任务 queued_at 为空，不会被领取）
+- 领取：按入队顺序加行锁（MySQL: FOR UPDATE SKIP LOCKED），再以 worker_id 为空作条件更新，
+  不支持行锁的数据库（SQLite）也只会被一个worker领取
+- 心跳：worker 定时刷新 heartbeat_at
+- 回收：心跳超时的任务重新入队，超过最大领取次数则置为失败
+"""
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import func, or_
+
+from app.extensions import db
+from app.models.translate import Translate
+
+# 队列配置
+HEARTBEAT_INTERVAL = int(os.environ.get('TRANSLATE_HEARTBEAT_INTERVAL', 15))  # 秒
+STALE_TIMEOUT = int(os.environ.get('TRANSLATE_STALE_TIMEOUT', 120))  # 心跳超时（秒）
+MAX_ATTEMPTS = int(os.environ.get('TRANSLATE_MAX_ATTEMPTS', 3))  # 最大领取次数
+
+
+def enqueue(task: Translate):
+    """任务入队（调用方负责提交）"""
+    task.status = 'process'
+    task.process = 0.00
+    task.queued_at = datetime.utcnow()
+    task.worker_id = None
+    task.heartbeat_at = None
+    task.attempts = 0
+    task.start_at = None
+    task.end_at = None
+    task.failed_reason = None
+
+
+def claim(worker_id: str, start_at: datetime) -> Optional[int]:
+    """
+    领取一个排队中的任务
+    :return: 任务ID，队列为空或被其他worker抢先时返回None
+    """
+    try:
+        task = (Translate.query
+                .filter(Translate.status == 'process',
+                        Translate.queued_at.isnot(None),
+                        Translate.worker_id.is_(None),
+                        Translate.deleted_flag == 'N')
+                .order_by(Translate.queued_at, Translate.id)
+                .with_for_update(skip_locked=_supports_skip_locked())
+                .first())
+        if task is None:
+            db.session.rollback()
+            return None
+
+        claimed = (Translate.query
+                   .filter(Translate.id == task.id, Translate.worker_id.is_(None))
+                   .update({'worker_id': worker_id,
+                            'heartbeat_at': datetime.utcnow(),
+                            'start_at': start_at,
+                            'attempts': func.coalesce(Translate.attempts, 0) + 1},
+                           synchronize_session=False))
+        db.session.commit()
+        return task.id if claimed else None
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"领取翻译任务失败: {str(e)}")
+        return None
+
+
+def _supports_skip_locked() -> bool:
+    """MySQL 8.0.1+ 支持 SKIP LOCKED，其他版本退化为普通行锁"""
+    dialect = db.engine.dialect
+    if dialect.name != 'mysql' or getattr(dialect, 'is_mariadb', False):
+        return False
+    return (dialect.server_version_info or ()) >= (8, 0, 1)
+
+
+def heartbeat(task_id: int, worker_id: str) -> bool:
+    """
+    刷新心跳
+    :return: 任务是否仍由该worker持有
+    """
+    try:
+        updated = (Translate.query
+                   .filter(Translate.id == task_id, Translate.worker_id == worker_id)
+                   .update({'heartbeat_at': datetime.utcnow()}, synchronize_session=False))
+        db.session.commit()
+        return bool(updated)
+    except Exception as e:
+        db.session.rollback()
+        logging.warning(f"[任务{task_id}] 心跳更新失败: {str(e)}")
+        return True
+
+
+def release(task_id: int, worker_id: str):
+    """worker退出时归还未完成的任务，不计入领取次数"""
+    try:
+        (Translate.query
+         .filter(Translate.id == task_id, Translate.worker_id == worker_id,
+                 Translate.status == 'process')
+         .update({'worker_id': None,
+                  'heartbeat_at': None,
+                  'attempts': func.coalesce(Translate.attempts, 1) - 1},
+                 synchronize_session=False))
+        db.session.commit()
+        logging.info(f"[任务{task_id}] 已归还队列")
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"[任务{task_id}] 归还队列失败: {str(e)}")
+
+
+def requeue_stale(end_at: datetime) -> int:
+    """
+    回收心跳超时的任务（worker崩溃或重启）
+    :return: 回收的任务数
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=STALE_TIMEOUT)
+    count = 0
+    try:
+        stale = (Translate.query
+                 .filter(Translate.status == 'process',
+                         Translate.worker_id.isnot(None),
+                         or_(Translate.heartbeat_at.is_(None), Translate.heartbeat_at < cutoff))
+                 .all())
+        for task in stale:
+            if (task.attempts or 0) >= MAX_ATTEMPTS:
+                values = {'status': 'failed',
+                          'worker_id': None,
+                          'end_at': end_at,
+                          'failed_reason': f"worker异常退出，已重试{task.attempts}次"}
+                logging.warning(f"[任务{task.id}] worker {task.worker_id} 心跳超时，超过最大重试次数，置为失败")
+            else:
+                values = {'worker_id': None, 'heartbeat_at': None}
+                logging.warning(f"[任务{task.id}] worker {task.worker_id} 心跳超时，重新入队")
+
+            # 以原worker_id为条件，避免覆盖其他进程刚做的回收或领取
+            count += (Translate.query
+                      .filter(Translate.id == task.id, Translate.worker_id == task.worker_id)
+                      .update(values, synchronize_session=False))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"回收超时翻译任务失败: {str(e)}")
+    return count
@@ -20,9 +20,9 @@ def main_wrapper(task_id, config, origin_path):
             current_app.logger.error(f"任务 {task_id} 不存在")
             return False
 
-        # 初始化翻译配置   (提示词-术语库加载)
-        _init_translate_config(task)
-        to_translate.init_openai(config['api_url'], config['api_key'])
+        # 初始化翻译配置：任务独立的OpenAI客户端，避免并发任务互相覆盖接口地址
+        if config.get('api_url') and config.get('api_key'):
+            config['client'] = to_translate.init_openai(config['api_url'], config['api_key'])
         # 获取文件扩展名
         extension = os.path.splitext(origin_path)[1].lower()
         # 调用文件处理器
@@ -64,36 +64,3 @@ def pdf_handler(config, origin_path):
     #     # 这里均使用gptpdf实现
     #     return gptpdf.start(config)
     #     # return pdf.start(config)
-
-
-def _init_translate_config(trans):
-    """
-    初始化翻译配置
-    :param trans: 翻译任务对象
-    """
-    # 设置OpenAI API
-    if trans.api_url and trans.api_key:
-        set_openai_config(trans.api_url, trans.api_key)
-
-
-def set_openai_config(api_url, api_key):
-    """设置OpenAI API配置"""
-    import openai
-
-    # 确保URL以/v1/结尾
-    base_url = api_url
-    if not base_url.endswith("/v1/"):
-        if base_url.endswith("/v1"):
-            # 如果以 /v1 结尾，添加 /
-            base_url = base_url + "/"
-        elif base_url.endswith("/"):
-            # 如果以 / 结尾，添加 v1/
-            base_url = base_url + "v1/"
-        else:
-            # 如果不以 / 结尾，添加 /v1/
-            base_url = base_url + "/v1/"
-
-    openai.base_url = base_url
-    openai.api_key = api_key
-
-
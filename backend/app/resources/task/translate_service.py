@@ -1,10 +1,12 @@
 import logging
 import os
 from datetime import datetime
-from threading import Thread
 from flask import current_app
 from app.models.translate import Translate
 from app.extensions import db
+from app.translate import glossary
+from app.utils import comparison_terms
+from . import job_queue
 from .main import main_wrapper
 from ...models.comparison import Comparison
 from ...models.prompt import Prompt
@@ -12,53 +14,58 @@ import pytz
 
 
 class TranslateEngine:
-    def __init__(self, task_id):
+    def __init__(self, task_id, app=None, worker_id=None, cancel_event=None):
         self.task_id = task_id
-        self.app = current_app._get_current_object()  # 获取真实app对象
+        self.app = app or current_app._get_current_object()  # 获取真实app对象
+        self.worker_id = worker_id  # 由worker进程执行时的worker标识
+        self.cancel_event = cancel_event  # 任务被回收给其他worker时由心跳线程设置，翻译随之中断
 
     def execute(self):
-        """启动翻译任务入口"""
+        """启动翻译任务入口：只负责入队，由 worker 进程（worker.py）领取执行"""
         try:
-            # 在主线程上下文中准备任务
             with self.app.app_context():
-                task = self._prepare_task()
-
-            # 启动线程时传递真实app对象和任务ID
-            thr = Thread(
-                target=self._async_wrapper,
-                args=(self.app, self.task_id)
-            )
-            thr.start()
+                self._prepare_task()
             return True
         except Exception as e:
+            db.session.rollback()
             self.app.logger.error(f"任务初始化失败: {str(e)}", exc_info=True)
             return False
 
-    def _async_wrapper(self, app, task_id):
-        """异步执行包装器"""
-        with app.app_context():
-            from app.extensions import db  # 确保在每个线程中导入
+    def run(self):
+        """在worker进程中执行已领取的任务"""
+        with self.app.app_context():
             try:
                 # 使用新会话获取任务对象
-                task = db.session.query(Translate).get(task_id)
+                task = db.session.query(Translate).get(self.task_id)
                 if not task:
-                    app.logger.error(f"任务 {task_id} 不存在")
+                    self.app.logger.error(f"任务 {self.task_id} 不存在")
                     return
 
                 # 执行核心逻辑
                 success = self._execute_core(task)
+                if self._cancelled():
+                    return
                 self._complete_task(success)
             except Exception as e:
-                app.logger.error(f"任务执行异常: {str(e)}", exc_info=True)
-                self._complete_task(False)
+                self.app.logger.error(f"任务执行异常: {str(e)}", exc_info=True)
+                if not self._cancelled():
+                    self._complete_task(False)
             finally:
                 db.session.remove()  # 清理线程局部session
 
+    def _cancelled(self):
+        """任务是否已被回收给其他worker（此时不再更新任务状态，结果以新的执行为准）"""
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            self.app.logger.warning(f"[任务{self.task_id}] 已被回收给其他worker，中止执行")
+            return True
+        return False
+
     def _execute_core(self, task):
         """执行核心翻译逻辑"""
         try:
-            # 初始化翻译配置
-            self._init_translate_config(task)
+            # 验证文件存在性
+            if not os.path.exists(task.origin_filepath):
+                raise FileNotFoundError(f"原始文件不存在: {task.origin_filepath}")
 
             # 构建符合要求的 trans 字典
             trans_config = self._build_trans_config(task)
@@ -71,7 +78,7 @@ class TranslateEngine:
             return False
 
     def _prepare_task(self):
-        """准备翻译任务"""
+        """准备翻译任务并入队"""
         task = Translate.query.get(self.task_id)
         if not task:
             raise ValueError(f"任务 {self.task_id} 不存在")
@@ -81,13 +88,17 @@ class TranslateEngine:
             raise FileNotFoundError(f"原始文件不存在: {task.origin_filepath}")
 
         # 更新任务状态
-        task.status = 'process'
-        task.start_at = datetime.now(pytz.timezone(self.app.config['TIMEZONE']))  # 使用配置的时区
+        job_queue.enqueue(task)
         db.session.commit()
         return task
 
+    def _now(self):
+        """当前时间（使用配置的时区）"""
+        return datetime.now(pytz.timezone(self.app.config['TIMEZONE']))
+
     def _build_trans_config(self, task):
         """构建符合文件处理器要求的 trans 字典"""
+        terms_index = self._get_matched_terms(task) if task.comparison_id else None
         config = {
             'id': task.id,  # 任务ID
             'target_lang': task.lang,
@@ -110,9 +121,12 @@ class TranslateEngine:
             'comparison_id': task.comparison_id,
             'prompt_id': task.prompt_id,
             'prompt': self._get_final_prompt(task),
-            'terms_dict': self._get_matched_terms(task) if task.comparison_id else None,
+            'terms_dict': terms_index.term_pairs if terms_index else None,
+            # 术语索引只构建一次（并在任务间缓存），所有文本块复用
+            'terms_index': terms_index,
             'use_baidu_terms': self._should_use_baidu_terms(task),
-            'extension': os.path.splitext(task.origin_filepath)[1]
+            'extension': os.path.splitext(task.origin_filepath)[1],
+            'cancel_event': self.cancel_event,
 
         }
 
@@ -144,8 +158,9 @@ class TranslateEngine:
 
     def _get_matched_terms(self, task):
         """
-        获取术语库内容（用于AI翻译动态匹配）
-        返回解析后的术语对列表
+        获取术语库（用于AI翻译动态匹配）
+        返回术语索引（glossary.GlossaryIndex，含解析后的术语对列表），
+        按 (术语库ID, 术语版本号) 缓存，多个任务共用同一术语库时不再重复解析
         """
         if not task.comparison_id or task.comparison_id == 0:
             logging.info(f"[任务{task.id}] 未设置术语库ID")
@@ -155,7 +170,9 @@ class TranslateEngine:
 
         try:
             # 添加更详细的查询条件，确保未删除
-            comparison = db.session.query(Comparison).filter(
+            comparison = db.session.query(
+                Comparison.id, Comparison.title, Comparison.created_at, Comparison.terms_version
+            ).filter(
                 Comparison.id == task.comparison_id,
                 Comparison.deleted_flag == 'N'
             ).first()
@@ -164,64 +181,31 @@ class TranslateEngine:
                 logging.warning(f"[任务{task.id}] 术语库ID {task.comparison_id} 不存在或已删除")
                 return None
 
-            if not comparison.content or comparison.content.strip() == '':
+            # 术语库删除后ID可能被复用（新库版本号同样从0开始），版本键带上创建时间加以区分
+            version = (comparison.created_at, comparison.terms_version)
+            index = glossary.get_cached(comparison.id, version)
+            if index is not None:
+                logging.info(
+                    f"[任务{task.id}] 使用缓存的术语库: {comparison.title}，共 {len(index)} 个术语对")
+                return index
+
+            # 按ID分批读取术语条目
+            term_pairs = [{'source': source, 'target': target}
+                          for source, target in comparison_terms.iter_terms(comparison.id)]
+            if not term_pairs:
                 logging.warning(f"[任务{task.id}] 术语库ID {task.comparison_id} 内容为空")
                 return None
 
-            logging.info(
-                f"[任务{task.id}] 找到术语库: {comparison.title}, 内容长度: {len(comparison.content)}")
-
-            # 解析术语库内容
-            terms_content = comparison.content.strip()
-            term_pairs = []
-
-            # 支持多种分隔符
-            separator = ';'
-            if ';' not in terms_content:
-                if '\n' in terms_content:
-                    separator = '\n'
-                elif '|' in terms_content:
-                    separator = '|'
-
-            for term_pair in terms_content.split(separator):
-                term_pair = term_pair.strip()
-                if not term_pair:
-                    continue
-
-                # 支持多种格式：逗号、制表符、冒号
-                if ',' in term_pair:
-                    parts = term_pair.split(',', 1)
-                elif '\t' in term_pair:
-                    parts = term_pair.split('\t', 1)
-                elif ':' in term_pair:
-                    parts = term_pair.split(':', 1)
-                else:
-                    continue
-
-                if len(parts) != 2:
-                    continue
-
-                source_term = parts[0].strip()
-                target_term = parts[1].strip()
-
-                if source_term and target_term:
-                    term_pairs.append({
-                        'source': source_term,
-                        'target': target_term
-                    })
-
-            if term_pairs:
-                logging.info(f"[任务{task.id}] 成功解析术语库，共 {len(term_pairs)} 个术语对")
-                # 打印前几个术语对作为示例
-                sample = term_pairs[:3]
-                for i, pair in enumerate(sample):
-                    logging.info(
-                        f"[任务{task.id}] 术语示例{i + 1}: {pair['source']} → {pair['target']}")
-                return term_pairs
-            else:
-                logging.warning(
-                    f"[任务{task.id}] 术语库解析后为空，原始内容: {terms_content[:100]}...")
-                return None
+            logging.info(f"[任务{task.id}] 找到术语库: {comparison.title}，共 {len(term_pairs)} 个术语对")
+            # 打印前几个术语对作为示例
+            sample = term_pairs[:3]
+            for i, pair in enumerate(sample):
+                logging.info(
+                    f"[任务{task.id}] 术语示例{i + 1}: {pair['source']} → {pair['target']}")
+
+            index = glossary.build_index(term_pairs)
+            glossary.put_cached(comparison.id, version, index)
+            return index
 
         except Exception as e:
             logging.error(f"[任务{task.id}] 获取术语库失败: {e}")
@@ -239,21 +223,20 @@ class TranslateEngine:
         # 百度翻译：comparison_id=1表示启用术语库
         return task.comparison_id == 1
 
-    def _init_translate_config(self, task):
-        """初始化翻译配置"""
-        if task.api_url and task.api_key:
-            import openai
-            openai.api_base = task.api_url
-            openai.api_key = task.api_key
-
     def _complete_task(self, success):
         """更新任务状态"""
         try:
             task = db.session.query(Translate).get(self.task_id)
+            if task and self.worker_id and task.worker_id != self.worker_id:
+                # 心跳超时后任务已被回收给其他worker，结果以新的执行为准
+                self.app.logger.warning(f"[任务{self.task_id}] 已不再由当前worker持有，忽略执行结果")
+                return
             if task:
                 task.status = 'done' if success else 'failed'
-                task.end_at = datetime.now(pytz.timezone(self.app.config['TIMEZONE']))  # 使用配置的时区
+                task.end_at = self._now()
                 task.process = 100.00 if success else 0.00
+                task.worker_id = None
+                task.heartbeat_at = None
                 db.session.commit()
         except Exception as e:
             db.session.rollback()
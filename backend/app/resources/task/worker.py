@@ -0,0 +1,177 @@
+# resources/task/worker.py
+"""
+翻译worker进程池
+- 主进程：启动时回收超时任务，守护N个worker子进程（崩溃自动拉起），定时回收心跳超时的任务
+- 子进程：循环领取队列中的任务并同步执行，执行期间后台线程发送心跳；
+  心跳失败（任务已被回收给其他worker）时设置取消事件，翻译中断且不再更新任务状态
+- 子进程收到SIGTERM时立即归还当前任务，无需等待心跳超时
+- 未单独部署worker（未设置 TRANSLATE_EXTERNAL_WORKER）时，由web服务启动进程池并在退出时停止
+"""
+import atexit
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+from threading import Event, Thread
+
+import pytz
+
+from app.extensions import db
+from app.translate import db as translate_db
+from . import job_queue
+from .translate_service import TranslateEngine
+
+# 进程池配置
+WORKER_PROCESSES = int(os.environ.get('TRANSLATE_WORKERS', 2))
+POLL_INTERVAL = float(os.environ.get('TRANSLATE_POLL_INTERVAL', 2))  # 队列为空时的轮询间隔（秒）
+SUPERVISE_INTERVAL = 5  # 主进程检查子进程的间隔（秒）
+# 已单独运行 worker.py（如docker-compose中的worker服务）时设置，web服务不再自带进程池
+EXTERNAL_WORKER = os.environ.get('TRANSLATE_EXTERNAL_WORKER', '').lower() in ('1', 'true', 'yes')
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+
+def run_pool(processes=None):
+    """启动worker进程池（阻塞）"""
+    from app import create_app
+
+    processes = processes or WORKER_PROCESSES
+    app = create_app()
+    with app.app_context():
+        count = job_queue.requeue_stale(_now(app))
+        if count:
+            logging.info(f"启动时回收 {count} 个超时任务")
+
+    # spawn 避免继承主进程的数据库连接和线程
+    ctx = multiprocessing.get_context('spawn')
+    workers = {}
+    stopping = Event()
+
+    def stop(signum, frame):
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    logging.info(f"翻译worker进程池启动，进程数: {processes}")
+    last_check = time.monotonic()
+    while not stopping.is_set():
+        for no in range(processes):
+            proc = workers.get(no)
+            if proc is None or not proc.is_alive():
+                if proc is not None:
+                    logging.warning(f"worker-{no} 已退出（exitcode={proc.exitcode}），重新启动")
+                proc = ctx.Process(target=_worker_main, args=(no,), name=f'translate-worker-{no}')
+                proc.start()
+                workers[no] = proc
+
+        if time.monotonic() - last_check >= job_queue.HEARTBEAT_INTERVAL:
+            last_check = time.monotonic()
+            with app.app_context():
+                job_queue.requeue_stale(_now(app))
+                db.session.remove()
+
+        stopping.wait(SUPERVISE_INTERVAL)
+
+    logging.info("翻译worker进程池停止中...")
+    for proc in workers.values():
+        if proc.is_alive():
+            proc.terminate()
+    for proc in workers.values():
+        proc.join(timeout=10)
+
+
+def start_embedded_pool(app):
+    """
+    web服务自带的worker进程池：以子进程运行 worker.py，web服务退出时一并停止
+    已单独部署worker时不启动；调试模式下只在重载器的服务子进程中启动
+    :return: 进程池子进程，未启动时返回None
+    """
+    if EXTERNAL_WORKER:
+        return None
+    if app.debug and os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        return None
+
+    proc = subprocess.Popen([sys.executable, os.path.join(BACKEND_DIR, 'worker.py')], cwd=BACKEND_DIR)
+    atexit.register(_stop_embedded_pool, proc)
+    # docker stop 发送SIGTERM，转为正常退出以便停止进程池、归还执行中的任务
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    logging.info(f"未配置独立worker，web服务启动翻译worker进程池（pid={proc.pid}）")
+    return proc
+
+
+def _stop_embedded_pool(proc):
+    """停止web服务自带的进程池"""
+    if proc.poll() is not None:
+        return
+    proc.terminate()
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def _worker_main(no):
+    """worker子进程入口"""
+    from app import create_app
+
+    app = create_app()
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    current = {'task_id': None}
+
+    def release_and_exit(signum, frame):
+        task_id = current['task_id']
+        if task_id is not None:
+            with app.app_context():
+                job_queue.release(task_id, worker_id)
+        os._exit(0)
+
+    signal.signal(signal.SIGTERM, release_and_exit)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # 由主进程统一处理Ctrl+C
+
+    logging.info(f"worker-{no} 已启动: {worker_id}")
+    while True:
+        with app.app_context():
+            task_id = job_queue.claim(worker_id, _now(app))
+            db.session.remove()
+
+        if task_id is None:
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        logging.info(f"[任务{task_id}] 由 {worker_id} 领取执行")
+        current['task_id'] = task_id
+        done = Event()
+        cancel = Event()
+        beat = Thread(target=_heartbeat_loop, args=(app, task_id, worker_id, done, cancel),
+                      daemon=True, name=f'heartbeat-{task_id}')
+        beat.start()
+        try:
+            TranslateEngine(task_id, app, worker_id, cancel).run()
+        finally:
+            done.set()
+            beat.join()
+            current['task_id'] = None
+            logging.info(f"[任务{task_id}] 执行结束，翻译数据库连接池: {translate_db.pool_stats()}")
+
+
+def _heartbeat_loop(app, task_id, worker_id, done, cancel):
+    """任务执行期间定时发送心跳，任务已被回收时设置取消事件"""
+    with app.app_context():
+        try:
+            while not done.wait(job_queue.HEARTBEAT_INTERVAL):
+                if not job_queue.heartbeat(task_id, worker_id):
+                    logging.warning(f"[任务{task_id}] 已被回收，停止心跳并中止翻译")
+                    cancel.set()
+                    return
+        finally:
+            db.session.remove()
+
+
+def _now(app):
+    """当前时间（使用配置的时区），与任务的 start_at/end_at 一致"""
+    return datetime.now(pytz.timezone(app.config['TIMEZONE']))
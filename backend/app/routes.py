@@ -19,7 +19,7 @@ from app.resources.api.comparison import MyComparisonListResource, SharedCompari
     EditComparisonResource, ShareComparisonResource, CopyComparisonResource, \
     FavoriteComparisonResource, CreateComparisonResource, DeleteComparisonResource, \
     DownloadTemplateResource, ImportComparisonResource, ExportComparisonResource, \
-    ExportAllComparisonsResource
+    ExportAllComparisonsResource, ComparisonTermListResource, ComparisonTermResource
 from app.resources.api.customer import GuestIdResource, CustomerDetailResource
 from app.resources.api.doc2x import Doc2XTranslateStartResource, Doc2XTranslateStatusResource
 from app.resources.api.files import FileUploadResource, FileDeleteResource
@@ -84,6 +84,8 @@ def register_routes(api):
     api.add_resource(ImportComparisonResource, '/api/comparison/import')
     api.add_resource(ExportComparisonResource, '/api/comparison/export/<int:id>')
     api.add_resource(ExportAllComparisonsResource, '/api/comparison/export/all')
+    api.add_resource(ComparisonTermListResource, '/api/comparison/<int:id>/terms')
+    api.add_resource(ComparisonTermResource, '/api/comparison/<int:id>/terms/<int:term_id>')
 
     api.add_resource(SystemVersionResource, '/api/common/version')
     api.add_resource(SystemSettingsResource, '/api/common/all_settings')
@@ -0,0 +1,86 @@
+import logging
+
+from flask import Flask
+from sqlalchemy import inspect, text
+
+logger = logging.getLogger(__name__)
+
+# 已有数据库需要补充的字段：(表名, 字段名, 字段类型)
+# db.create_all() 只创建缺失的表，不会给已有表加字段
+UPGRADE_COLUMNS = [
+    ('translate', 'queued_at', 'DATETIME'),
+    ('translate', 'worker_id', 'VARCHAR(128)'),
+    ('translate', 'heartbeat_at', 'DATETIME'),
+    ('translate', 'attempts', 'INTEGER DEFAULT 0'),
+    ('comparison', 'terms_version', 'INTEGER DEFAULT 0'),
+    ('comparison', 'terms_migrated', 'INTEGER DEFAULT 0'),
+]
+
+
+def upgrade_schema(app: Flask) -> bool:
+    """为已有数据库补充新增字段（MySQL/SQLite通用），需在 db.create_all() 之后调用"""
+    from app.extensions import db
+
+    with app.app_context():
+        try:
+            inspector = inspect(db.engine)
+            tables = set(inspector.get_table_names())
+            existing = {}
+            for table, column, column_type in UPGRADE_COLUMNS:
+                if table not in tables:
+                    continue
+                if table not in existing:
+                    existing[table] = {c['name'] for c in inspector.get_columns(table)}
+                if column in existing[table]:
+                    continue
+                logger.info(f"数据库升级: {table} 表新增字段 {column}")
+                with db.engine.begin() as conn:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"))
+                existing[table].add(column)
+            return True
+        except Exception as e:
+            logger.error(f"数据库升级失败: {str(e)}", exc_info=True)
+            return False
+
+
+def migrate_content_terms(app: Flask) -> int:
+    """
+    数据迁移：把旧版 Comparison.content 文本拆分为 comparison_term 条目，需在 upgrade_schema() 之后调用
+    - 每个术语表先以 UPDATE ... WHERE terms_migrated=0 认领，认领与写入条目在同一事务中提交：
+      web服务和各worker进程同时启动时同一术语表只由一个进程迁移，失败时整体回滚、下次启动重试
+    - content 保留原文，确认迁移结果无误前可据此核对或重新迁移（把 terms_migrated 置0）
+    :return: 迁移的术语表数量
+    """
+    from sqlalchemy import func
+
+    from app.extensions import db
+    from app.models.comparison import Comparison
+    from app.translate import glossary
+    from app.utils import comparison_terms
+
+    migrated = 0
+    with app.app_context():
+        try:
+            pending = func.coalesce(Comparison.terms_migrated, 0) == 0
+            ids = [cid for (cid,) in db.session.query(Comparison.id)
+                   .filter(pending, Comparison.content.isnot(None), Comparison.content != '')]
+            for comparison_id in ids:
+                claimed = (db.session.query(Comparison)
+                           .filter(Comparison.id == comparison_id, pending)
+                           .update({Comparison.terms_migrated: 1}, synchronize_session=False))
+                if not claimed:
+                    # 已由其他进程迁移
+                    db.session.rollback()
+                    continue
+                comparison = Comparison.query.get(comparison_id)
+                pairs = [(p['source'], p['target']) for p in glossary.parse_terms(comparison.content)]
+                comparison_terms.replace_terms(comparison, pairs)
+                db.session.commit()
+                migrated += 1
+                logger.info(f"术语表 {comparison_id} 已迁移 {len(pairs)} 条术语")
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"术语表迁移失败: {str(e)}", exc_info=True)
+        finally:
+            db.session.remove()
+    return migrated
@@ -0,0 +1,364 @@
+# translate/async_engine.py
+"""
+异步翻译引擎
+- 进程内一个后台事件循环线程，所有任务共享
+- 共享 httpx.AsyncClient 连接池，按 (base_url, api_key) 缓存 AsyncOpenAI 客户端
+- 进程级在途请求上限 + 每任务并发上限（按任务的线程数配置，与线程池模式一致），
+  工作协程按需取任务，内存不随块数增长
+- 由 to_translate.translate_batch(trans, texts, event) 调用，断点恢复与最终写入在那里完成
+"""
+import asyncio
+import concurrent.futures
+import logging
+import os
+import time
+from threading import Thread, Lock
+from typing import Dict, List, Optional
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+
+from . import cache
+from . import clients
+from . import common
+from . import rate_limit
+from . import to_translate
+from .to_translate import FatalError, MAX_RETRIES, RETRY_DELAY, count_text
+
+# 并发配置
+MAX_IN_FLIGHT = int(os.environ.get('ASYNC_MAX_IN_FLIGHT', 256))  # 进程内在途请求上限
+TASK_CONCURRENCY = int(os.environ.get('ASYNC_TASK_CONCURRENCY', 32))  # 单任务并发数的上限（实际按任务线程数配置）
+MAX_CONNECTIONS = int(os.environ.get('ASYNC_MAX_CONNECTIONS', 256))
+MAX_KEEPALIVE = int(os.environ.get('ASYNC_MAX_KEEPALIVE', 64))
+REQUEST_TIMEOUT = 120  # 秒
+CANCEL_POLL_INTERVAL = 0.5  # 秒
+
+_loop = None  # type: Optional[asyncio.AbstractEventLoop]
+_loop_lock = Lock()
+_http_client = None  # type: Optional[httpx.AsyncClient]
+_clients = {}  # {(base_url, api_key): AsyncOpenAI}
+_in_flight = None  # type: Optional[asyncio.Semaphore]
+
+
+def translate_batch(trans, texts, event, checkpoints):
+    """
+    批量翻译文本块（异步模式）
+    :param trans: 翻译配置
+    :param texts: 文本块列表
+    :param event: 中断事件
+    :param checkpoints: 断点写入器（checkpoint.Writer）
+    :return: 是否全部成功
+    """
+    loop = _get_loop()
+    future = asyncio.run_coroutine_threadsafe(
+        _translate_batch(trans, texts, event, checkpoints), loop)
+
+    while True:
+        try:
+            return future.result(timeout=CANCEL_POLL_INTERVAL)
+        except concurrent.futures.TimeoutError:
+            if event.is_set():
+                future.cancel()
+                return False
+        except concurrent.futures.CancelledError:
+            return False
+
+
+def _get_loop():
+    """获取（必要时启动）后台事件循环"""
+    global _loop
+    with _loop_lock:
+        if _loop is None or not _loop.is_running():
+            loop = asyncio.new_event_loop()
+            Thread(target=_run_loop, args=(loop,), daemon=True, name='translate-async').start()
+            while not loop.is_running():
+                time.sleep(0.01)
+            _loop = loop
+        return _loop
+
+
+def _run_loop(loop):
+    global _http_client, _in_flight
+    asyncio.set_event_loop(loop)
+    _http_client = httpx.AsyncClient(
+        timeout=REQUEST_TIMEOUT,
+        limits=httpx.Limits(max_connections=MAX_CONNECTIONS,
+                            max_keepalive_connections=MAX_KEEPALIVE),
+    )
+    _in_flight = asyncio.Semaphore(MAX_IN_FLIGHT)
+    loop.run_forever()
+
+
+def _get_client(trans) -> AsyncOpenAI:
+    """按 (base_url, api_key) 获取共享连接池的客户端（仅在事件循环线程调用）"""
+    base_url = clients.normalize_base_url(trans.get('api_url'))
+    api_key = trans.get('api_key') or ''
+    key = (base_url, api_key)
+    client = _clients.get(key)
+    if client is None:
+        client = AsyncOpenAI(base_url=base_url, api_key=api_key, http_client=_http_client,
+                             max_retries=0)
+        _clients[key] = client
+    return client
+
+
+async def _translate_batch(trans, texts, event, checkpoints):
+    translate_id = trans['id']
+
+    # 规划（去重、按token打包、构建术语索引）耗CPU，放到工作线程，不阻塞其他任务的请求
+    total_count, packs, single_groups = await asyncio.to_thread(to_translate._plan_batch, trans, texts)
+    if not total_count:
+        return True
+
+    units = [('pack', pack) for pack in packs] + [('single', g) for g in single_groups]
+    state = {'completed': 0, 'fatal': False}
+    pending = iter(units)
+
+    def stopped():
+        return state['fatal'] or event.is_set()
+
+    async def mark_done(indices, result):
+        if to_translate.cancelled(trans):
+            return
+        flush = False
+        for index in indices:
+            if result is not None:
+                flush = checkpoints.add(texts[index], result) or flush
+                texts[index]['text'] = result['translated_text']
+                texts[index]['count'] = result['count']
+            else:
+                texts[index]['count'] = count_text(texts[index].get('text', ''))
+            texts[index]['complete'] = True
+        state['completed'] += len(indices)
+        if result is not None:
+            to_translate.report_progress(translate_id, state['completed'], total_count,
+                                         trans.get('progress_span'))
+        if flush:
+            await asyncio.to_thread(checkpoints.flush)
+
+    async def translate_single(indices):
+        try:
+            result = await _translate_text_block(trans, texts[indices[0]])
+            await mark_done(indices, result)
+        except FatalError as e:
+            logging.error(f"[任务{translate_id}] 致命错误: {str(e)}")
+            state['fatal'] = True
+            if not to_translate.cancelled(trans):
+                await asyncio.to_thread(to_translate.error, translate_id, str(e))
+            event.set()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(
+                f"[任务{translate_id}] 文本块{indices[0]}翻译失败，保留原文"
+                f"（共{len(indices)}处）: {str(e)}")
+            await mark_done(indices, None)
+
+    async def translate_pack(pack):
+        try:
+            results = await _translate_text_pack(trans, [texts[g[0]].get('text', '') for g in pack])
+        except FatalError as e:
+            logging.error(f"[任务{translate_id}] 致命错误: {str(e)}")
+            state['fatal'] = True
+            if not to_translate.cancelled(trans):
+                await asyncio.to_thread(to_translate.error, translate_id, str(e))
+            event.set()
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.warning(f"[任务{translate_id}] 打包翻译异常，回退单段翻译: {e}")
+            results = [None] * len(pack)
+
+        for indices, result in zip(pack, results):
+            if stopped():
+                return
+            if result is not None:
+                await mark_done(indices, result)
+            else:
+                await translate_single(indices)
+
+    async def worker():
+        for kind, unit in pending:
+            if stopped():
+                return
+            if kind == 'pack':
+                await translate_pack(unit)
+            else:
+                await translate_single(unit)
+
+    concurrency = max(1, min(common.parse_threads(trans.get('threads')), TASK_CONCURRENCY, len(units)))
+    logging.info(f"[任务{translate_id}] 异步引擎并发数: {concurrency}")
+    workers = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        for w in workers:
+            w.cancel()
+
+    stats = await asyncio.to_thread(cache.get_stats, translate_id)
+    logging.info(
+        f"[任务{translate_id}] 翻译记忆命中 {stats['hit']} 次，未命中 {stats['miss']} 次")
+
+    return not stopped()
+
+
+async def _translate_text_block(trans, text_item):
+    """
+    翻译单个文本块，包含缓存、重试和备用模型逻辑
+    :return: {'translated_text': str, 'count': int}
+    """
+    original_text = text_item.get('text', '')
+    if not original_text or not original_text.strip():
+        return {'translated_text': original_text, 'count': 0}
+
+    model = trans.get('model')
+    backup_model = trans.get('backup_model')
+
+    result = await _translate_with_cache(trans, original_text, model)
+    if result:
+        return result
+
+    if backup_model and backup_model.strip():
+        logging.info(f"[任务{trans['id']}] 主模型{model}失败，切换到备用模型{backup_model}")
+        await asyncio.sleep(RETRY_DELAY)
+        result = await _translate_with_cache(trans, original_text, backup_model)
+        if result:
+            return result
+
+    raise FatalError(f"主模型和备用模型均失败，最后使用模型: {backup_model or model}")
+
+
+def _lookup(trans, text, model):
+    """计算缓存键（含术语匹配）并查询翻译记忆，在工作线程中调用"""
+    key = to_translate.cache_key(trans, text, model)
+    return key, cache.get(key, trans['id'])
+
+
+async def _translate_with_cache(trans, text, model) -> Optional[Dict]:
+    key, cached = await asyncio.to_thread(_lookup, trans, text, model)
+    if cached:
+        return {'translated_text': cached['translated_text'],
+                'count': cached.get('count', count_text(text))}
+
+    result = await _try_translate_with_retries(trans, text, model)
+    if result:
+        await asyncio.to_thread(cache.put, key, result)
+    return result
+
+
+async def _try_translate_with_retries(trans, text, model) -> Optional[Dict]:
+    translate_id = trans['id']
+    # 构建消息需匹配术语，放到工作线程
+    messages = await asyncio.to_thread(to_translate.build_messages, trans, text, model)
+
+    for attempt in range(1, MAX_RETRIES + 1):
+        try:
+            logging.info(f"[任务{translate_id}] ,翻译模型{model} ,第{attempt}次请求")
+            translated = await _chat_completion(trans, model, messages)
+
+            if not to_translate._is_valid_translation(translated):
+                logging.warning(
+                    f"[任务{translate_id}] 翻译结果无效: {translated[:50] if translated else 'None'}...")
+                await asyncio.sleep(rate_limit.backoff_delay(attempt))
+                continue
+
+            return {'translated_text': translated.strip(), 'count': count_text(text)}
+
+        except openai.RateLimitError as e:
+            logging.warning(f"[任务{translate_id}] 速率限制，等待后重试: {e}")
+            await asyncio.sleep(rate_limit.backoff_delay(attempt))
+            continue
+
+        except openai.AuthenticationError as e:
+            raise FatalError(f"API密钥无效: {e}")
+
+        except asyncio.CancelledError:
+            raise
+
+        except Exception as e:
+            logging.warning(f"[任务{translate_id}] 翻译异常: {e}")
+            await asyncio.sleep(rate_limit.backoff_delay(attempt))
+            continue
+
+    return None
+
+
+async def _translate_text_pack(trans, pack_texts: List[str]) -> List[Optional[Dict]]:
+    """打包翻译多段短文本，返回值含义同 to_translate._translate_text_pack"""
+    translate_id = trans['id']
+    model = trans.get('model')
+
+    results = [None] * len(pack_texts)
+    lookups = await asyncio.to_thread(
+        lambda: [_lookup(trans, text, model) for text in pack_texts])
+    keys = [key for key, _ in lookups]
+    pending = []
+
+    for i, (text, (key, cached)) in enumerate(zip(pack_texts, lookups)):
+        if cached:
+            results[i] = {'translated_text': cached['translated_text'],
+                          'count': cached.get('count', count_text(text))}
+        else:
+            pending.append(i)
+
+    # 只剩一段未命中时交给单段翻译
+    if len(pending) <= 1:
+        return results
+
+    segments = [pack_texts[i] for i in pending]
+    messages = await asyncio.to_thread(to_translate.build_pack_messages, trans, segments)
+    for attempt in range(1, MAX_RETRIES + 1):
+        try:
+            logging.info(
+                f"[任务{translate_id}] 打包翻译 {len(segments)} 段，模型{model}，第{attempt}次请求")
+            content = await _chat_completion(trans, model, messages)
+            translated = to_translate.parse_pack_response(content, len(segments))
+            if translated is None:
+                logging.warning(f"[任务{translate_id}] 打包结果段数不匹配或无法解析，回退单段翻译")
+                return results
+            break
+
+        except openai.RateLimitError as e:
+            logging.warning(f"[任务{translate_id}] 速率限制，等待后重试: {e}")
+            await asyncio.sleep(rate_limit.backoff_delay(attempt))
+            continue
+
+        except openai.AuthenticationError as e:
+            raise FatalError(f"API密钥无效: {e}")
+
+        except asyncio.CancelledError:
+            raise
+
+        except Exception as e:
+            logging.warning(f"[任务{translate_id}] 打包翻译异常: {e}")
+            return results
+    else:
+        return results
+
+    for i, text in zip(pending, translated):
+        if not to_translate._is_valid_translation(text):
+            continue
+        result = {'translated_text': text.strip(), 'count': count_text(pack_texts[i])}
+        results[i] = result
+        await asyncio.to_thread(cache.put, keys[i], result)
+
+    return results
+
+
+async def _chat_completion(trans, model, messages) -> str:
+    """经接口限流器、在进程级在途上限内发送chat completion请求"""
+    client = _get_client(trans)
+
+    async def request():
+        async with _in_flight:
+            return await client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.7
+            )
+
+    tokens = await asyncio.to_thread(to_translate.estimate_request_tokens, messages, model)
+    response = await rate_limit.call_async(to_translate.get_limiter(trans, model), tokens, request)
+    return response.choices[0].message.content
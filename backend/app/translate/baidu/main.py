@@ -4,6 +4,11 @@ import requests
 import random
 import hashlib
 
+from .. import rate_limit
+
+BAIDU_API_URL = "https://fanyi-api.baidu.com/api/trans/vip/translate"
+# 百度限流错误码：54003 访问频率受限，54005 长query请求频繁
+RATE_LIMIT_ERROR_CODES = {'54003', '54005'}
 
 
 def baidu_translate(
@@ -41,17 +46,11 @@ def baidu_translate(
     if use_term_base:
         params['needIntervene'] = 1  # 启用术语库
 
-    # 3. 发送请求
+    # 3. 经限流器发送请求（同一APP ID的所有任务共享配额）
+    limiter = rate_limit.get_limiter(BAIDU_API_URL, appid, 'baidu',
+                                     rpm=rate_limit.BAIDU_RPM, tpm=0)
     try:
-        response = requests.get(
-            "https://fanyi-api.baidu.com/api/trans/vip/translate",
-            params=params,
-            timeout=60
-        )
-        result = response.json()
-
-        if 'error_code' in result:
-            raise Exception(f"百度API错误 {result['error_code']}: {result['error_msg']}")
+        result = rate_limit.call(limiter, 0, lambda: _request(params))
 
         # 4. 拼接翻译结果（保留原文换行结构）
         return '\n'.join(item['dst'] for item in result['trans_result'])
@@ -59,4 +58,19 @@ def baidu_translate(
     except requests.exceptions.RequestException as e:
         raise Exception(f"网络请求失败: {str(e)}")
     except json.JSONDecodeError:
-        raise Exception("百度API返回数据解析失败")
\ No newline at end of file
+        raise Exception("百度API返回数据解析失败")
+
+
+def _request(params: dict) -> dict:
+    """发送请求，限流错误抛出 RateLimited"""
+    response = requests.get(BAIDU_API_URL, params=params, timeout=60)
+    if response.status_code == 429:
+        raise rate_limit.RateLimited(
+            "百度API访问频率受限", rate_limit.parse_retry_after(response.headers))
+
+    result = response.json()
+    if 'error_code' in result:
+        if str(result['error_code']) in RATE_LIMIT_ERROR_CODES:
+            raise rate_limit.RateLimited(f"百度API访问频率受限 {result['error_code']}")
+        raise Exception(f"百度API错误 {result['error_code']}: {result['error_msg']}")
+    return result
@@ -0,0 +1,184 @@
+# translate/cache.py
+"""
+翻译记忆缓存（Translation Memory）
+- 一级缓存：进程内LRU，带TTL
+- 二级缓存：数据库 cache 表（app/models/cache.py），带过期时间
+- 缓存键：规范化原文 + 目标语言 + 模型 + 提示词哈希 + 匹配术语哈希
+- 按任务统计命中/未命中次数
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+import unicodedata
+from collections import OrderedDict
+from threading import Lock
+from typing import Optional, Dict, List
+
+from . import db
+
+# 缓存配置
+CACHE_ENABLED = os.environ.get('TM_CACHE_ENABLED', 'true').lower() == 'true'
+CACHE_TTL = int(os.environ.get('TM_CACHE_TTL', 30 * 24 * 3600))  # 默认30天
+LRU_MAX_SIZE = int(os.environ.get('TM_CACHE_LRU_SIZE', 20000))
+PURGE_INTERVAL = 3600  # 过期数据清理间隔（秒）
+KEY_PREFIX = 'tm:'
+
+_lru = OrderedDict()  # {key: (value, expiration)}
+_lru_lock = Lock()
+
+_stats = {}  # {task_id: {'hit': int, 'miss': int}}
+_stats_lock = Lock()
+
+_last_purge = [0.0]
+
+
+def normalize_text(text: str) -> str:
+    """规范化原文：统一换行、Unicode NFC、去除首尾空白"""
+    if not text:
+        return ''
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    text = unicodedata.normalize('NFC', text)
+    return text.strip()
+
+
+def _hash(value: str) -> str:
+    return hashlib.sha256((value or '').encode('utf-8')).hexdigest()
+
+
+def make_key(text: str, target_lang: str, model: str, prompt: str,
+             matched_terms: Optional[List[str]] = None) -> str:
+    """
+    生成缓存键
+    :param matched_terms: 当前文本匹配到的术语列表
+    """
+    terms_hash = _hash('\n'.join(sorted(matched_terms))) if matched_terms else ''
+    raw = '\x1f'.join([
+        normalize_text(text),
+        target_lang or '',
+        model or '',
+        _hash(prompt),
+        terms_hash,
+    ])
+    return KEY_PREFIX + _hash(raw)
+
+
+def get(key: str, task_id=None) -> Optional[Dict]:
+    """
+    查询缓存：先查LRU，再查数据库
+    :return: {'translated_text': str, 'count': int} 或 None
+    """
+    if not CACHE_ENABLED:
+        return None
+
+    now = time.time()
+    value = _lru_get(key, now)
+
+    if value is None:
+        value = _db_get(key, now)
+        if value is not None:
+            _lru_put(key, value, now + CACHE_TTL)
+
+    _record(task_id, value is not None)
+    return value
+
+
+def put(key: str, value: Dict):
+    """写入缓存（LRU + 数据库）"""
+    if not CACHE_ENABLED or not value:
+        return
+
+    now = time.time()
+    expiration = now + CACHE_TTL
+    _lru_put(key, value, expiration)
+
+    try:
+        db.execute(
+            db.upsert_sql('cache', ('key', 'value', 'expiration'), ('key',)),
+            key, json.dumps(value, ensure_ascii=False), int(expiration)
+        )
+    except Exception as e:
+        logging.warning(f"写入翻译缓存失败: {e}")
+
+    _maybe_purge(now)
+
+
+def get_stats(task_id) -> Dict[str, int]:
+    """获取任务的缓存命中统计"""
+    with _stats_lock:
+        return dict(_stats.get(task_id, {'hit': 0, 'miss': 0}))
+
+
+def pop_stats(task_id) -> Dict[str, int]:
+    """获取并清理任务的缓存命中统计"""
+    with _stats_lock:
+        return _stats.pop(task_id, {'hit': 0, 'miss': 0})
+
+
+def clear_memory():
+    """清空进程内缓存"""
+    with _lru_lock:
+        _lru.clear()
+
+
+def _record(task_id, hit: bool):
+    if task_id is None:
+        return
+    with _stats_lock:
+        stats = _stats.setdefault(task_id, {'hit': 0, 'miss': 0})
+        stats['hit' if hit else 'miss'] += 1
+
+
+def _lru_get(key: str, now: float) -> Optional[Dict]:
+    with _lru_lock:
+        entry = _lru.get(key)
+        if entry is None:
+            return None
+        value, expiration = entry
+        if expiration <= now:
+            del _lru[key]
+            return None
+        _lru.move_to_end(key)
+        return value
+
+
+def _lru_put(key: str, value: Dict, expiration: float):
+    with _lru_lock:
+        _lru[key] = (value, expiration)
+        _lru.move_to_end(key)
+        while len(_lru) > LRU_MAX_SIZE:
+            _lru.popitem(last=False)
+
+
+def _db_get(key: str, now: float) -> Optional[Dict]:
+    try:
+        row = db.get("SELECT value, expiration FROM cache WHERE `key`=%s", key)
+    except Exception as e:
+        logging.warning(f"读取翻译缓存失败: {e}")
+        return None
+
+    if not row:
+        return None
+
+    if int(row.get('expiration') or 0) <= now:
+        db.execute("DELETE FROM cache WHERE `key`=%s", key)
+        return None
+
+    try:
+        value = json.loads(row['value'])
+    except (TypeError, ValueError):
+        return None
+
+    if not isinstance(value, dict) or 'translated_text' not in value:
+        return None
+    return value
+
+
+def _maybe_purge(now: float):
+    """按间隔清理数据库中的过期缓存"""
+    if now - _last_purge[0] < PURGE_INTERVAL:
+        return
+    _last_purge[0] = now
+    db.execute("DELETE FROM cache WHERE `key` LIKE %s AND expiration<%s",
+               KEY_PREFIX + '%', int(now))
@@ -0,0 +1,136 @@
+# translate/checkpoint.py
+"""
+文本块级断点续译
+- 翻译完成的文本块按 (任务ID, 块标识) 写入 translate_checkpoint 表（app/models/checkpoint.py）
+- 块标识优先使用处理器给的uid（_block_uid / _uid），没有uid时使用原文哈希
+- 写入先缓冲，累积到一定数量或间隔后批量写库，不会每块写一次
+- 任务重启时 restore() 把已有译文回填为 complete=True，只翻译剩余的块
+- 任务成功完成后清理断点
+"""
+import hashlib
+import logging
+import os
+import time
+from threading import Lock
+from typing import Dict, List, Tuple
+
+from . import db
+
+# 断点配置
+CHECKPOINT_ENABLED = os.environ.get('TRANSLATE_CHECKPOINT_ENABLED', 'true').lower() == 'true'
+BATCH_SIZE = int(os.environ.get('TRANSLATE_CHECKPOINT_BATCH', 50))  # 每批写入块数
+FLUSH_INTERVAL = float(os.environ.get('TRANSLATE_CHECKPOINT_INTERVAL', 10))  # 最长写入间隔（秒）
+CHECKPOINT_TTL = 7 * 24 * 3600  # 未完成任务的断点保留时间（秒）
+RESTORE_LOOKUP_LIMIT = 1000  # 不超过该块数时按块标识查询断点，否则读取任务全部断点
+
+UID_FIELDS = ('_block_uid', '_uid')
+
+# 断点表的列与主键（写入时按数据库类型生成插入或更新语句）
+COLUMNS = ('translate_id', 'block_key', 'source_hash', 'translated_text', 'word_count', 'updated_at')
+PRIMARY_KEY = ('translate_id', 'block_key')
+
+
+def block_key(text_item: Dict) -> Tuple[str, str]:
+    """
+    计算文本块的断点标识（须在译文回填前调用）
+    :return: (块标识, 原文哈希)
+    """
+    source_hash = hashlib.sha1(text_item.get('text', '').encode('utf-8')).hexdigest()
+    for field in UID_FIELDS:
+        uid = text_item.get(field)
+        if uid:
+            return str(uid), source_hash
+    return source_hash, source_hash
+
+
+def restore(translate_id, texts: List[Dict]) -> int:
+    """
+    用已保存的断点回填文本块
+    :return: 恢复的块数
+    """
+    if not CHECKPOINT_ENABLED:
+        return 0
+
+    if len(texts) <= RESTORE_LOOKUP_LIMIT:
+        # 块数较少（如流式翻译的一个窗口）时只查询这些块的断点
+        keys = list({block_key(item)[0] for item in texts
+                     if not item.get('complete', False) and not item.get('skip', False)})
+        if not keys:
+            return 0
+        rows = db.get_all(
+            "SELECT block_key, source_hash, translated_text, word_count "
+            "FROM translate_checkpoint WHERE translate_id=%s "
+            f"AND block_key IN ({', '.join(['%s'] * len(keys))})",
+            translate_id, *keys
+        )
+    else:
+        rows = db.get_all(
+            "SELECT block_key, source_hash, translated_text, word_count "
+            "FROM translate_checkpoint WHERE translate_id=%s",
+            translate_id
+        )
+    if not rows:
+        return 0
+
+    saved = {row['block_key']: row for row in rows}
+    restored = 0
+    for item in texts:
+        if item.get('complete', False) or item.get('skip', False):
+            continue
+        key, source_hash = block_key(item)
+        row = saved.get(key)
+        if not row or row['source_hash'] != source_hash:
+            continue
+        item['text'] = row['translated_text']
+        item['count'] = row['word_count'] or 0
+        item['complete'] = True
+        restored += 1
+
+    if restored:
+        logging.info(f"[任务{translate_id}] 从断点恢复 {restored} 个已翻译文本块")
+    return restored
+
+
+def clear(translate_id):
+    """任务完成后清理断点"""
+    if not CHECKPOINT_ENABLED:
+        return
+    db.execute("DELETE FROM translate_checkpoint WHERE translate_id=%s", translate_id)
+    db.execute("DELETE FROM translate_checkpoint WHERE updated_at<%s",
+               int(time.time() - CHECKPOINT_TTL))
+
+
+class Writer:
+    """单个任务的断点缓冲写入器（线程安全）"""
+
+    def __init__(self, translate_id):
+        self.translate_id = translate_id
+        self._pending = []  # type: List[tuple]
+        self._lock = Lock()
+        self._last_flush = time.monotonic()
+
+    def add(self, text_item: Dict, result: Dict) -> bool:
+        """
+        缓冲一个已完成的文本块（须在译文回填前调用）
+        :return: 是否需要调用 flush()
+        """
+        if not CHECKPOINT_ENABLED:
+            return False
+        key, source_hash = block_key(text_item)
+        with self._lock:
+            self._pending.append((key, source_hash, result['translated_text'], result['count']))
+            return (len(self._pending) >= BATCH_SIZE or
+                    time.monotonic() - self._last_flush >= FLUSH_INTERVAL)
+
+    def flush(self):
+        """批量写入缓冲的断点"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+
+        now = int(time.time())
+        rows = [(self.translate_id,) + row + (now,) for row in pending]
+        if not db.execute_many(db.upsert_sql('translate_checkpoint', COLUMNS, PRIMARY_KEY), rows):
+            logging.warning(f"[任务{self.translate_id}] 写入断点失败，{len(rows)} 个文本块未保存")
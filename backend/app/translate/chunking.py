@@ -0,0 +1,197 @@
+# translate/chunking.py
+"""
+按模型 token 数切分长文本（各文件处理器共用）
+- token 数用 tiktoken 按模型编码计算；tiktoken 不可用（未安装或离线无法加载编码表）时按字符类别估算
+- 每块 token 上限 = min(CHUNK_MAX_TOKENS, 模型上下文窗口 / CHUNK_CONTEXT_DIVISOR)，
+  为提示词、术语和译文输出预留空间；可用 CHUNK_MODEL_MAX_TOKENS 按模型单独指定
+  （如 "gpt-4o=3000,deepseek=2000"，按前缀匹配），短文本打包的目标大小也使用该上限
+- 先按句子边界切分（正则预编译），单句超限时再按 token 数强制切分
+"""
+import logging
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# 分块配置
+CHUNK_MAX_TOKENS = int(os.environ.get('CHUNK_MAX_TOKENS', 1200))  # 每块token上限
+CONTEXT_DIVISOR = int(os.environ.get('CHUNK_CONTEXT_DIVISOR', 4))  # 每块最多占上下文窗口的 1/N
+DEFAULT_CONTEXT_WINDOW = int(os.environ.get('CHUNK_CONTEXT_WINDOW', 8192))  # 未知模型的上下文窗口
+# 按模型指定每块token上限，格式 "模型前缀=token数,..."
+MODEL_MAX_TOKENS = {
+    name.strip().lower(): int(value)
+    for name, _, value in (item.partition('=') for item in
+                           os.environ.get('CHUNK_MODEL_MAX_TOKENS', '').split(','))
+    if name.strip() and value.strip().isdigit()
+}
+DEFAULT_ENCODING = 'cl100k_base'  # tiktoken 不认识的模型（deepseek、qwen 等）使用的近似编码
+
+# 常见模型的上下文窗口（按模型名前缀匹配，最长前缀优先）
+MODEL_CONTEXT_WINDOWS = {
+    'gpt-3.5-turbo': 16385,
+    'gpt-4': 8192,
+    'gpt-4-32k': 32768,
+    'gpt-4-turbo': 128000,
+    'gpt-4o': 128000,
+    'gpt-4.1': 1047576,
+    'gpt-5': 400000,
+    'o1': 200000,
+    'o3': 200000,
+    'o4': 200000,
+    'deepseek': 65536,
+    'qwen': 32768,
+    'glm-4': 128000,
+    'moonshot-v1-8k': 8192,
+    'moonshot-v1-32k': 32768,
+    'moonshot-v1-128k': 131072,
+    'gemini': 1048576,
+}
+
+# 句子边界（保留句末标点和其后的空白）
+SENTENCE_PATTERN = re.compile(r'([.!?。！？；;]\s*)')
+# 不以分号断句（Markdown 段落）
+SENTENCE_PATTERN_NO_SEMICOLON = re.compile(r'([.!?。！？]\s*)')
+
+_CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]')
+
+
+def _match_prefix(model: Optional[str], table: Dict[str, int]) -> Optional[int]:
+    """按模型名前缀查表（最长前缀优先）"""
+    name = (model or '').lower()
+    best = ''
+    for prefix in table:
+        if name.startswith(prefix) and len(prefix) > len(best):
+            best = prefix
+    return table[best] if best else None
+
+
+def context_window(model: Optional[str]) -> int:
+    """模型的上下文窗口（token）"""
+    return _match_prefix(model, MODEL_CONTEXT_WINDOWS) or DEFAULT_CONTEXT_WINDOW
+
+
+def max_chunk_tokens(model: Optional[str]) -> int:
+    """模型对应的每块token上限"""
+    configured = _match_prefix(model, MODEL_MAX_TOKENS)
+    if configured:
+        return configured
+    return max(1, min(CHUNK_MAX_TOKENS, context_window(model) // max(1, CONTEXT_DIVISOR)))
+
+
+@lru_cache(maxsize=32)
+def _get_encoding(model: Optional[str]):
+    """获取模型的 tiktoken 编码，不可用时返回None（按字符估算）"""
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding(DEFAULT_ENCODING)
+        except KeyError:
+            return tiktoken.get_encoding(DEFAULT_ENCODING)
+    except Exception as e:
+        logging.warning(f"加载tiktoken编码失败，按字符估算token数: {e}")
+        return None
+
+
+def _estimate_tokens(text: str) -> int:
+    """估算token数：中日韩字符约1个token，其他字符约3个一个token（偏保守）"""
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk) // 3 + 1
+
+
+class Chunker:
+    """按token数切分文本"""
+
+    def __init__(self, model: Optional[str] = None, max_tokens: Optional[int] = None):
+        self.model = model
+        self.max_tokens = max_tokens or max_chunk_tokens(model)
+        self._encoding = _get_encoding(model)
+
+    def count(self, text: str) -> int:
+        """文本的token数"""
+        if not text:
+            return 0
+        if self._encoding is None:
+            return _estimate_tokens(text)
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def fits(self, text: str) -> bool:
+        """文本是否不超过每块token上限"""
+        # 每个token至少对应一个UTF-8字节，短文本无需编码
+        if len(text) * 4 <= self.max_tokens:
+            return True
+        return self.count(text) <= self.max_tokens
+
+    def split(self, text: str, pattern=SENTENCE_PATTERN, strip: bool = False) -> List[str]:
+        """
+        按句子边界切分长文本，合并相邻句子直到接近token上限
+        :param pattern: 句子边界正则（需包含一个捕获分组）
+        :param strip: 是否去除每块首尾空白
+        :return: 文本块列表（不超限时返回 [text]）
+        """
+        chunks = []
+        current = ""
+        current_tokens = 0
+
+        for sentence in split_sentences(text, pattern):
+            tokens = self.count(sentence)
+            # 单个句子就超过限制，强制切分
+            if tokens > self.max_tokens:
+                if current:
+                    chunks.append(current)
+                    current, current_tokens = "", 0
+                chunks.extend(self._hard_split(sentence, tokens))
+                continue
+
+            if current_tokens + tokens <= self.max_tokens:
+                current += sentence
+                current_tokens += tokens
+            else:
+                if current:
+                    chunks.append(current)
+                current, current_tokens = sentence, tokens
+
+        if current:
+            chunks.append(current)
+
+        if strip:
+            chunks = [c.strip() for c in chunks if c.strip()]
+        return chunks if chunks else [text]
+
+    def _hard_split(self, text: str, tokens: int) -> List[str]:
+        """按平均每token字符数切分超长句子，切片超限时逐步缩小"""
+        chars_per_token = len(text) / max(1, tokens)
+        step = max(1, int(self.max_tokens * chars_per_token))
+        pieces = []
+        start = 0
+        while start < len(text):
+            size = step
+            piece = text[start:start + size]
+            while size > 1 and self.count(piece) > self.max_tokens:
+                size = max(1, int(size * 0.9))
+                piece = text[start:start + size]
+            pieces.append(piece)
+            start += size
+        return pieces
+
+
+def split_sentences(text: str, pattern=SENTENCE_PATTERN) -> List[str]:
+    """按句子边界拆分，句末标点和空白归入前一句"""
+    parts = pattern.split(text)
+    sentences = []
+    # re.split 的结果中奇数位是捕获的句子边界
+    for i in range(0, len(parts), 2):
+        sentence = parts[i] + (parts[i + 1] if i + 1 < len(parts) else '')
+        if sentence.strip():
+            sentences.append(sentence)
+    return sentences
+
+
+def get_chunker(trans: Dict) -> Chunker:
+    """按任务配置的模型创建切分器"""
+    return Chunker(trans.get('model'))
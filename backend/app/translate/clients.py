@@ -0,0 +1,64 @@
+# translate/clients.py
+"""
+OpenAI客户端注册表
+- 按 (base_url, api_key) 缓存已配置的 OpenAI 客户端，不再修改 openai 模块级全局配置
+- 每个客户端持有独立的 httpx 连接池和 keep-alive，并发任务互不串用接口
+- 同一接口的任务复用连接
+"""
+import os
+from threading import Lock
+
+import httpx
+from openai import OpenAI
+
+# 连接池配置
+MAX_CONNECTIONS = int(os.environ.get('OPENAI_MAX_CONNECTIONS', 64))
+MAX_KEEPALIVE = int(os.environ.get('OPENAI_MAX_KEEPALIVE', 20))
+KEEPALIVE_EXPIRY = 60.0  # 秒
+REQUEST_TIMEOUT = 120.0  # 秒
+
+_clients = {}  # {(base_url, api_key): OpenAI}
+_lock = Lock()
+
+
+def normalize_base_url(url: str) -> str:
+    """确保API地址以/v1/结尾"""
+    url = (url or '').strip()
+    if not url.endswith("/v1/"):
+        if url.endswith("/v1"):
+            url = url + "/"
+        elif url.endswith("/"):
+            url = url + "v1/"
+        else:
+            url = url + "/v1/"
+    return url
+
+
+def get_client(api_url: str, api_key: str) -> OpenAI:
+    """获取（必要时创建）指定接口的客户端"""
+    key = (normalize_base_url(api_url), api_key or '')
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            http_client = httpx.Client(
+                timeout=REQUEST_TIMEOUT,
+                limits=httpx.Limits(max_connections=MAX_CONNECTIONS,
+                                    max_keepalive_connections=MAX_KEEPALIVE,
+                                    keepalive_expiry=KEEPALIVE_EXPIRY),
+            )
+            # 重试交给 to_translate 与限流器处理
+            client = OpenAI(base_url=key[0], api_key=key[1], http_client=http_client,
+                            max_retries=0)
+            _clients[key] = client
+        return client
+
+
+def close_all():
+    """关闭所有客户端连接池"""
+    with _lock:
+        for client in _clients.values():
+            try:
+                client.close()
+            except Exception:
+                pass
+        _clients.clear()
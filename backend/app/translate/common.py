@@ -1,11 +1,12 @@
 # translate/common.py
+import codecs
 import string
 import uuid
 import datetime
 import os
 import platform
 import subprocess
-from typing import Union
+from typing import List, Union
 
 # 线程控制常量
 MIN_THREADS = 1
@@ -218,3 +219,52 @@ def is_supported_file(filepath: str) -> bool:
     ]
     ext = get_file_extension(filepath)
     return ext in supported_extensions
+
+
+def detect_encoding(file_path: str, encodings: List[str], sample_size: int = 1024 * 1024) -> str:
+    """
+    读取文件开头的样本检测编码（样本末尾被截断的多字节字符不视为错误）
+    带UTF-8 BOM的文件返回 utf-8-sig
+    """
+    with open(file_path, 'rb') as f:
+        sample = f.read(sample_size)
+        at_eof = not f.read(1)
+
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+
+    for encoding in encodings:
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=at_eof)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+
+    raise ValueError("无法识别文件编码")
+
+
+def detect_stream_encoding(file_path: str, encodings: List[str], sample_size: int = 1024 * 1024) -> str:
+    """
+    流式处理用的编码检测：按开头样本检测后，再流式解码整个文件校验；
+    样本之后出现无法解码的内容时逐个尝试其他编码（与一次性读取时的回退规则一致）
+    """
+    encoding = detect_encoding(file_path, encodings, sample_size)
+    for candidate in [encoding] + [e for e in encodings if e != encoding]:
+        if _decodes_fully(file_path, candidate, sample_size):
+            return candidate
+    raise ValueError("无法识别文件编码")
+
+
+def _decodes_fully(file_path: str, encoding: str, chunk_size: int) -> bool:
+    """按块解码整个文件（不保留内容），检查是否没有无法解码的字节"""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    try:
+        with open(file_path, 'rb') as f:
+            while True:
+                data = f.read(chunk_size)
+                if not data:
+                    decoder.decode(b'', final=True)
+                    return True
+                decoder.decode(data)
+    except UnicodeDecodeError:
+        return False
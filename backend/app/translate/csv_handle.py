@@ -5,12 +5,22 @@ import csv
 import logging
 import re
 from typing import List, Dict, Any, Tuple
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from threading import Event
 from . import to_translate
 from . import common
+from .chunking import Chunker, get_chunker
 
-# 分块配置
-MAX_CHUNK_SIZE = 1500
+# 候选编码（按顺序尝试）
+ENCODINGS = ['utf-8', 'utf-8-sig', 'gbk', 'gb2312', 'iso-8859-1', 'big5']
+
+# 流式处理配置
+STREAM_THRESHOLD = int(os.environ.get('CSV_STREAM_THRESHOLD_MB', 20)) * 1024 * 1024  # 超过该大小的文件流式翻译
+STREAM_WINDOW_ROWS = int(os.environ.get('CSV_STREAM_WINDOW_ROWS', 5000))  # 每个窗口最多行数
+STREAM_WINDOW_CELLS = int(os.environ.get('CSV_STREAM_WINDOW_CELLS', 1000))  # 每个窗口最多待翻译文本块数
+STREAM_INFLIGHT = int(os.environ.get('CSV_STREAM_INFLIGHT', 2))  # 同时翻译的窗口数
+SNIFF_SAMPLE_SIZE = 64 * 1024  # 识别分隔符读取的字符数
 
 
 def start(trans: Dict[str, Any]) -> bool:
@@ -22,6 +32,14 @@ def start(trans: Dict[str, Any]) -> bool:
     translate_id = trans['id']
     start_time = datetime.datetime.now()
 
+    try:
+        if os.path.getsize(trans['file_path']) > STREAM_THRESHOLD:
+            return _start_streaming(trans, start_time)
+    except OSError as e:
+        logging.error(f"[任务{translate_id}] 读取CSV文件失败: {e}")
+        to_translate.error(translate_id, f"读取CSV文件失败: {str(e)}")
+        return False
+
     # 读取CSV文件
     try:
         content, encoding, dialect = _read_csv_file(trans['file_path'])
@@ -37,50 +55,7 @@ def start(trans: Dict[str, Any]) -> bool:
         return True
 
     # 提取需要翻译的单元格
-    texts = []
-    cell_map = []  # 记录单元格位置
-
-    for row_idx, row in enumerate(content):
-        for col_idx, cell in enumerate(row):
-            if _should_translate(cell):
-                # 检查是否需要分块
-                if len(cell) > MAX_CHUNK_SIZE:
-                    sub_cells = _split_cell(cell, MAX_CHUNK_SIZE)
-                    parent_uid = f"cell_{row_idx}_{col_idx}"
-                    for i, sub_cell in enumerate(sub_cells):
-                        texts.append({
-                            'text': sub_cell,
-                            'original': sub_cell,
-                            'complete': False,
-                            'count': 0,
-                            '_uid': f"{parent_uid}_{i}",
-                            'is_sub': True,
-                            'sub_index': i,
-                            'sub_total': len(sub_cells)
-                        })
-                        cell_map.append({
-                            'row': row_idx,
-                            'col': col_idx,
-                            'text_index': len(texts) - 1,
-                            'is_sub': True,
-                            'parent_uid': parent_uid
-                        })
-                else:
-                    uid = f"cell_{row_idx}_{col_idx}"
-                    texts.append({
-                        'text': cell,
-                        'original': cell,
-                        'complete': False,
-                        'count': 0,
-                        '_uid': uid,
-                        'is_sub': False
-                    })
-                    cell_map.append({
-                        'row': row_idx,
-                        'col': col_idx,
-                        'text_index': len(texts) - 1,
-                        'is_sub': False
-                    })
+    texts, cell_map = _extract_cells(content, 0, get_chunker(trans))
 
     if not texts:
         logging.info(f"[任务{translate_id}] CSV中没有需要翻译的内容")
@@ -111,13 +86,75 @@ def start(trans: Dict[str, Any]) -> bool:
     return True
 
 
+def _extract_cells(rows: List[List[str]], row_offset: int,
+                   chunker: Chunker) -> Tuple[List[Dict], List[Dict]]:
+    """
+    提取需要翻译的单元格
+    :param row_offset: rows 第一行在文件中的行号（用于生成uid）
+    :return: (文本块列表, 单元格映射)，映射中的 row 为 rows 内的下标
+    """
+    texts = []
+    cell_map = []  # 记录单元格位置
+    for row_idx, row in enumerate(rows):
+        _extract_row(row, row_idx, row_offset + row_idx, chunker, texts, cell_map)
+    return texts, cell_map
+
+
+def _extract_row(row: List[str], row_idx: int, file_row: int, chunker: Chunker,
+                 texts: List[Dict], cell_map: List[Dict]) -> int:
+    """
+    提取一行中需要翻译的单元格，超过token上限的单元格按句子切分
+    :return: 新增的文本块数
+    """
+    added = len(texts)
+    for col_idx, cell in enumerate(row):
+        if not _should_translate(cell):
+            continue
+        uid = f"cell_{file_row}_{col_idx}"
+        # 检查是否需要分块
+        if not chunker.fits(cell):
+            sub_cells = chunker.split(cell)
+            for i, sub_cell in enumerate(sub_cells):
+                texts.append({
+                    'text': sub_cell,
+                    'original': sub_cell,
+                    'complete': False,
+                    'count': 0,
+                    '_uid': f"{uid}_{i}",
+                    'is_sub': True,
+                    'sub_index': i,
+                    'sub_total': len(sub_cells)
+                })
+                cell_map.append({
+                    'row': row_idx,
+                    'col': col_idx,
+                    'text_index': len(texts) - 1,
+                    'is_sub': True,
+                    'parent_uid': uid
+                })
+        else:
+            texts.append({
+                'text': cell,
+                'original': cell,
+                'complete': False,
+                'count': 0,
+                '_uid': uid,
+                'is_sub': False
+            })
+            cell_map.append({
+                'row': row_idx,
+                'col': col_idx,
+                'text_index': len(texts) - 1,
+                'is_sub': False
+            })
+    return len(texts) - added
+
+
 def _read_csv_file(file_path: str) -> Tuple[List[List[str]], str, Any]:
     """
     读取CSV文件，尝试多种编码和分隔符
     :return: (内容列表, 使用的编码, csv dialect)
     """
-    encodings = ['utf-8', 'utf-8-sig', 'gbk', 'gb2312', 'iso-8859-1', 'big5']
-
     # 先尝试检测分隔符
     with open(file_path, 'rb') as f:
         sample = f.read(1024).decode('utf-8', errors='ignore')
@@ -127,7 +164,7 @@ def _read_csv_file(file_path: str) -> Tuple[List[List[str]], str, Any]:
         except:
             dialect = csv.excel  # 默认使用Excel的CSV格式
 
-    for encoding in encodings:
+    for encoding in ENCODINGS:
         try:
             with open(file_path, 'r', encoding=encoding, newline='') as f:
                 reader = csv.reader(f, dialect=dialect)
@@ -241,47 +278,6 @@ def _should_translate(text) -> bool:
     return True
 
 
-def _split_cell(cell: str, max_length: int) -> List[str]:
-    """
-    将超长单元格内容分割
-    优先按句子边界切分，保持语义完整
-    """
-    # 按句子分割（支持中英文）
-    sentence_pattern = r'(?<=[.!?。！？；;])\s+'
-    sentences = re.split(sentence_pattern, cell)
-
-    parts = []
-    current_part = ""
-
-    for sentence in sentences:
-        sentence = sentence.strip()
-        if not sentence:
-            continue
-
-        # 如果当前部分加上新句子超过限制
-        if len(current_part) + len(sentence) + 1 > max_length:
-            if current_part:
-                parts.append(current_part)
-                current_part = ""
-
-            # 如果单个句子就超过限制，强制按字符切分
-            if len(sentence) > max_length:
-                for i in range(0, len(sentence), max_length):
-                    parts.append(sentence[i:i + max_length])
-            else:
-                current_part = sentence
-        else:
-            if current_part:
-                current_part += " " + sentence
-            else:
-                current_part = sentence
-
-    if current_part:
-        parts.append(current_part)
-
-    return parts if parts else [cell]
-
-
 def _rebuild_csv(content: List[List[str]], texts: List[Dict],
                  cell_map: List[Dict], trans_type: str) -> int:
     """
@@ -337,3 +333,116 @@ def _rebuild_csv(content: List[List[str]], texts: List[Dict],
                 content[row][col] = translated or original
 
     return text_count
+
+
+# ==================== 流式处理 ====================
+
+def _start_streaming(trans: Dict[str, Any], start_time) -> bool:
+    """
+    大文件流式翻译：按窗口读取行，最多 STREAM_INFLIGHT 个窗口同时翻译，
+    译完的窗口放入顺序缓冲，按原顺序追加写入目标文件
+    编码按整个文件校验后严格解码；译文可能含原编码无法表示的字符，
+    非UTF-8文件改为输出带BOM的UTF-8（写到一半无法再更换编码）
+    """
+    translate_id = trans['id']
+    file_path = trans['file_path']
+
+    try:
+        encoding = common.detect_stream_encoding(file_path, ENCODINGS)
+        dialect = _sniff_dialect(file_path, encoding)
+    except Exception as e:
+        logging.error(f"[任务{translate_id}] 读取CSV文件失败: {e}")
+        to_translate.error(translate_id, f"读取CSV文件失败: {str(e)}")
+        return False
+    output_encoding = encoding if encoding in ('utf-8', 'utf-8-sig') else 'utf-8-sig'
+
+    file_size = max(1, os.path.getsize(file_path))
+    chunker = get_chunker(trans)
+    trans_type = trans.get('type', '')
+    event = Event()
+    logging.info(
+        f"[任务{translate_id}] 流式翻译CSV {file_size / 1024 / 1024:.1f}MB，编码 {encoding}（输出 {output_encoding}），"
+        f"每窗口 {STREAM_WINDOW_ROWS} 行/{STREAM_WINDOW_CELLS} 个文本块，并发 {STREAM_INFLIGHT} 个窗口")
+
+    def translate_window(rows, texts, cell_map, span):
+        if texts and not to_translate.translate_batch(
+                dict(trans, progress_span=span), texts, event):
+            return None
+        return _rebuild_csv(rows, texts, cell_map, trans_type)
+
+    text_count = 0
+    inflight = deque()  # 顺序缓冲：(窗口行, Future)，按读取顺序排列
+
+    def write_ready(writer, out, block: bool) -> bool:
+        """按顺序写出已完成的窗口；block 为 True 时等待队首窗口完成"""
+        nonlocal text_count
+        while inflight and (block or inflight[0][1].done()):
+            rows, future = inflight.popleft()
+            count = future.result()
+            # 任务已取消（已被回收给其他worker）时不再写目标文件
+            if count is None or to_translate.cancelled(trans):
+                return False
+            writer.writerows(rows)
+            out.flush()
+            text_count += count
+            block = False
+        return True
+
+    try:
+        os.makedirs(os.path.dirname(trans['target_file']), exist_ok=True)
+        with open(file_path, 'r', encoding=encoding, newline='') as f, \
+                open(trans['target_file'], 'w', encoding=output_encoding, newline='') as out, \
+                ThreadPoolExecutor(max_workers=max(1, STREAM_INFLIGHT)) as executor:
+            writer = csv.writer(out, dialect=dialect)
+            try:
+                rows, texts, cell_map = [], [], []
+                window_row = 0  # 窗口第一行的行号
+                window_start = 0  # 窗口起始位置（字节），用于计算整体进度
+
+                def submit_window() -> bool:
+                    nonlocal rows, texts, cell_map, window_row, window_start
+                    position = f.buffer.tell()
+                    span = (window_start / file_size * 100, max(0, position - window_start) / file_size * 100)
+                    inflight.append((rows, executor.submit(translate_window, rows, texts, cell_map, span)))
+                    window_row += len(rows)
+                    rows, texts, cell_map, window_start = [], [], [], position
+                    # 在途窗口已满时等待最早的窗口完成
+                    return write_ready(writer, out, block=len(inflight) >= max(1, STREAM_INFLIGHT))
+
+                for row in csv.reader(f, dialect=dialect):
+                    _extract_row(row, len(rows), window_row + len(rows), chunker, texts, cell_map)
+                    rows.append(row)
+                    if len(rows) >= STREAM_WINDOW_ROWS or len(texts) >= STREAM_WINDOW_CELLS:
+                        if not submit_window():
+                            event.set()
+                            return False
+
+                if rows and not submit_window():
+                    event.set()
+                    return False
+                while inflight:
+                    if not write_ready(writer, out, block=True):
+                        event.set()
+                        return False
+            except BaseException:
+                event.set()  # 中断其余在途窗口，避免退出线程池时等待它们译完
+                raise
+    except Exception as e:
+        logging.error(f"[任务{translate_id}] 流式翻译CSV失败: {e}")
+        to_translate.error(translate_id, f"流式翻译CSV失败: {str(e)}")
+        return False
+
+    end_time = datetime.datetime.now()
+    spend_time = common.display_spend(start_time, end_time)
+    to_translate.complete(trans, text_count, spend_time)
+    return True
+
+
+def _sniff_dialect(file_path: str, encoding: str) -> Any:
+    """按检测到的编码读取开头样本识别分隔符，识别失败时使用Excel格式"""
+    with open(file_path, 'r', encoding=encoding, newline='') as f:
+        sample = f.read(SNIFF_SAMPLE_SIZE)
+    try:
+        return csv.Sniffer().sniff(sample)
+    except csv.Error:
+        return csv.excel
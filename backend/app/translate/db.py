@@ -1,9 +1,10 @@
 # translate/db.py
 import sqlite3
+import time
 from urllib.parse import urlparse
 import logging
 from contextlib import contextmanager
-from threading import Lock
+from threading import Condition, Lock, local
 
 import pymysql
 import os
@@ -11,60 +12,251 @@ from dotenv import load_dotenv, find_dotenv
 
 _ = load_dotenv(find_dotenv())
 
-# 全局锁
-_db_lock = Lock()
+# 连接池配置
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))  # MySQL最大连接数
+POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))  # 等待空闲连接的超时（秒）
+POOL_MAX_LIFETIME = int(os.environ.get('DB_POOL_MAX_LIFETIME', 3600))  # 连接最长使用时间（秒）
+POOL_PING_IDLE = int(os.environ.get('DB_POOL_PING_IDLE', 10))  # 空闲超过该时间的连接取出时先ping（秒）
 
+# 连接出错后不再放回连接池的异常
+_BROKEN_ERRORS = (pymysql.err.OperationalError, pymysql.err.InterfaceError)
+
+
+class _PooledConnection:
+    __slots__ = ('conn', 'created_at', 'used_at')
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.used_at = self.created_at
+
+
+class MySQLPool:
+    """有界MySQL连接池：取出时检查寿命并ping，出错的连接直接丢弃"""
+
+    def __init__(self, params: dict, size: int = POOL_SIZE):
+        self._params = params
+        self._size = max(1, size)
+        self._idle = []  # 空闲连接，后进先出
+        self._cond = Condition()
+        self._total = 0  # 当前已建立的连接数（空闲+使用中）
+        self._stats = {'in_use': 0, 'waits': 0, 'creates': 0, 'discards': 0, 'ping_failures': 0}
+
+    def acquire(self) -> _PooledConnection:
+        """取出连接，连接数已满时等待归还"""
+        deadline = None
+        while True:
+            with self._cond:
+                if self._idle:
+                    item = self._idle.pop()
+                elif self._total < self._size:
+                    item = None
+                    self._total += 1
+                else:
+                    if deadline is None:
+                        deadline = time.monotonic() + POOL_TIMEOUT
+                        self._stats['waits'] += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(
+                            f"等待数据库连接超时（{POOL_TIMEOUT}秒），连接池已满: {self._size}")
+                    self._cond.wait(remaining)
+                    continue
+
+            if item is None:
+                item = self._connect()
+            elif not self._check(item):
+                self._discard(item)
+                continue
+
+            with self._cond:
+                self._stats['in_use'] += 1
+            return item
+
+    def release(self, item: _PooledConnection, broken: bool = False):
+        """归还连接"""
+        with self._cond:
+            self._stats['in_use'] -= 1
+        if broken:
+            self._discard(item)
+            return
+        item.used_at = time.monotonic()
+        with self._cond:
+            self._idle.append(item)
+            self._cond.notify()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return dict(self._stats, size=self._size, total=self._total, idle=len(self._idle))
+
+    def _connect(self) -> _PooledConnection:
+        try:
+            conn = pymysql.connect(**self._params)
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats['creates'] += 1
+        return _PooledConnection(conn)
+
+    def _check(self, item: _PooledConnection) -> bool:
+        """检查连接寿命，空闲较久时ping"""
+        now = time.monotonic()
+        if now - item.created_at > POOL_MAX_LIFETIME:
+            return False
+        if now - item.used_at > POOL_PING_IDLE:
+            try:
+                item.conn.ping(reconnect=False)
+            except Exception:
+                with self._cond:
+                    self._stats['ping_failures'] += 1
+                return False
+        return True
+
+    def _discard(self, item: _PooledConnection):
+        with self._cond:
+            self._total -= 1
+            self._stats['discards'] += 1
+            self._cond.notify()
+        try:
+            item.conn.close()
+        except Exception:
+            pass
 
-def get_conn():
-    """获取数据库连接"""
-    try:
-        db_url = os.environ.get('PROD_DATABASE_URL')
-        if not db_url:
-            raise ValueError("Database URL not found in environment variables.")
+
+class SQLitePool:
+    """SQLite：每个线程复用一个连接"""
+
+    def __init__(self, path: str):
+        self._path = path
+        self._local = local()
+        self._lock = Lock()
+        self._stats = {'in_use': 0, 'waits': 0, 'creates': 0, 'discards': 0, 'ping_failures': 0}
+
+    def acquire(self) -> _PooledConnection:
+        item = getattr(self._local, 'item', None)
+        if item is None:
+            conn = sqlite3.connect(self._path, check_same_thread=False, timeout=30)
+            conn.row_factory = sqlite3.Row
+            item = self._local.item = _PooledConnection(conn)
+            with self._lock:
+                self._stats['creates'] += 1
+        with self._lock:
+            self._stats['in_use'] += 1
+        return item
+
+    def release(self, item: _PooledConnection, broken: bool = False):
+        with self._lock:
+            self._stats['in_use'] -= 1
+        if broken:
+            self._local.item = None
+            with self._lock:
+                self._stats['discards'] += 1
+            try:
+                item.conn.close()
+            except Exception:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+
+_pool = None
+_pool_url = None
+_pool_lock = Lock()
+
+
+def get_pool():
+    """获取（必要时创建）当前数据库URL对应的连接池"""
+    global _pool, _pool_url
+    db_url = os.environ.get('PROD_DATABASE_URL')
+    if not db_url:
+        raise ValueError("Database URL not found in environment variables.")
+
+    with _pool_lock:
+        if _pool is not None and _pool_url == db_url:
+            return _pool
 
         # SQLite
         if db_url.startswith('sqlite:///'):
-            sqlite_db_path = db_url[len('sqlite:///'):]
-            conn = sqlite3.connect(sqlite_db_path, check_same_thread=False)
-            conn.row_factory = sqlite3.Row
-            return conn
+            _pool = SQLitePool(db_url[len('sqlite:///'):])
 
         # MySQL
         elif db_url.startswith('mysql+pymysql://'):
             parsed_url = urlparse(db_url)
-            conn = pymysql.connect(
-                host=parsed_url.hostname,
-                port=parsed_url.port or 3306,
-                user=parsed_url.username,
-                password=parsed_url.password,
-                db=parsed_url.path.lstrip('/'),
-                charset='utf8mb4',
-                cursorclass=pymysql.cursors.DictCursor,
-                autocommit=True
-            )
-            return conn
+            _pool = MySQLPool({
+                'host': parsed_url.hostname,
+                'port': parsed_url.port or 3306,
+                'user': parsed_url.username,
+                'password': parsed_url.password,
+                'db': parsed_url.path.lstrip('/'),
+                'charset': 'utf8mb4',
+                'cursorclass': pymysql.cursors.DictCursor,
+                'autocommit': True
+            })
 
         else:
             raise ValueError(f"Unsupported database URL: {db_url}")
 
+        _pool_url = db_url
+        return _pool
+
+
+def dialect() -> str:
+    """当前数据库类型：sqlite / mysql"""
+    return 'sqlite' if isinstance(get_pool(), SQLitePool) else 'mysql'
+
+
+def upsert_sql(table: str, columns: tuple, keys: tuple) -> str:
+    """
+    生成按主键插入或更新的语句（占位符为 %s），按数据库类型使用
+    MySQL 的 ON DUPLICATE KEY UPDATE 或 SQLite 的 ON CONFLICT(...) DO UPDATE
+    :param keys: 主键列，冲突时更新其余列
+    """
+    sql = (f"INSERT INTO {table} ({', '.join(f'`{c}`' for c in columns)}) "
+           f"VALUES ({', '.join(['%s'] * len(columns))}) ")
+    updates = [c for c in columns if c not in keys]
+    if dialect() == 'sqlite':
+        return sql + (f"ON CONFLICT({', '.join(f'`{c}`' for c in keys)}) DO UPDATE SET "
+                      + ', '.join(f'`{c}`=excluded.`{c}`' for c in updates))
+    return sql + "ON DUPLICATE KEY UPDATE " + ', '.join(f'`{c}`=VALUES(`{c}`)' for c in updates)
+
+
+def _placeholders(sql: str, conn) -> str:
+    """SQL统一以 %s 为占位符书写，SQLite 换为 ?"""
+    return sql.replace('%s', '?') if isinstance(conn, sqlite3.Connection) else sql
+
+
+def pool_stats() -> dict:
+    """连接池统计（in_use 使用中、waits 等待次数、creates 新建连接数等），用于监控"""
+    try:
+        return get_pool().stats()
     except Exception as e:
-        logging.error(f"Database connection error: {e}")
-        raise
+        logging.error(f"获取连接池统计失败: {e}")
+        return {}
 
 
 @contextmanager
 def get_connection():
-    """上下文管理器获取连接"""
-    conn = None
+    """上下文管理器：从连接池取出连接，用完归还"""
+    try:
+        pool = get_pool()
+        item = pool.acquire()
+    except Exception as e:
+        logging.error(f"Database connection error: {e}")
+        raise
+
+    broken = False
     try:
-        conn = get_conn()
-        yield conn
+        yield item.conn
+    except _BROKEN_ERRORS:
+        broken = True
+        raise
     finally:
-        if conn:
-            try:
-                conn.close()
-            except:
-                pass
+        pool.release(item, broken)
 
 
 def execute(sql: str, *params) -> bool:
@@ -72,17 +264,35 @@ def execute(sql: str, *params) -> bool:
     执行SQL语句（INSERT/UPDATE/DELETE）
     :return: 是否成功
     """
-    with _db_lock:
-        try:
-            with get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(sql, params)
-                conn.commit()
-                cursor.close()
-                return True
-        except Exception as e:
-            logging.error(f"SQL execute error: {e}, SQL: {sql}")
-            return False
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(_placeholders(sql, conn), params)
+            conn.commit()
+            cursor.close()
+            return True
+    except Exception as e:
+        logging.error(f"SQL execute error: {e}, SQL: {sql}")
+        return False
+
+
+def execute_many(sql: str, params_list: list) -> bool:
+    """
+    批量执行SQL语句（如多行INSERT），一次连接、一次提交
+    :return: 是否成功
+    """
+    if not params_list:
+        return True
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(_placeholders(sql, conn), params_list)
+            conn.commit()
+            cursor.close()
+            return True
+    except Exception as e:
+        logging.error(f"SQL executemany error: {e}, SQL: {sql}")
+        return False
 
 
 def get(sql: str, *params) -> dict:
@@ -90,27 +300,26 @@ def get(sql: str, *params) -> dict:
     查询单条记录
     :return: 字典或空字典
     """
-    with _db_lock:
-        try:
-            with get_connection() as conn:
-                cursor = conn.cursor()
-                if isinstance(cursor, sqlite3.Cursor):
-                    # SQLite
-                    cursor.execute(sql, params)
-                    row = cursor.fetchone()
-                    if row:
-                        columns = [desc[0] for desc in cursor.description]
-                        return dict(zip(columns, row))
-                    return {}
-                else:
-                    # MySQL
-                    cursor.execute(sql, params)
-                    result = cursor.fetchone()
-                    cursor.close()
-                    return result if result else {}
-        except Exception as e:
-            logging.error(f"SQL query error: {e}, SQL: {sql}")
-            return {}
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            if isinstance(cursor, sqlite3.Cursor):
+                # SQLite
+                cursor.execute(_placeholders(sql, conn), params)
+                row = cursor.fetchone()
+                if row:
+                    columns = [desc[0] for desc in cursor.description]
+                    return dict(zip(columns, row))
+                return {}
+            else:
+                # MySQL
+                cursor.execute(_placeholders(sql, conn), params)
+                result = cursor.fetchone()
+                cursor.close()
+                return result if result else {}
+    except Exception as e:
+        logging.error(f"SQL query error: {e}, SQL: {sql}")
+        return {}
 
 
 def get_all(sql: str, *params) -> list:
@@ -118,18 +327,17 @@ def get_all(sql: str, *params) -> list:
     查询多条记录
     :return: 字典列表
     """
-    with _db_lock:
-        try:
-            with get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(sql, params)
-                results = cursor.fetchall()
-                cursor.close()
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(_placeholders(sql, conn), params)
+            results = cursor.fetchall()
+            cursor.close()
 
-                if isinstance(cursor, sqlite3.Cursor):
-                    columns = [desc[0] for desc in cursor.description]
-                    return [dict(zip(columns, row)) for row in results]
-                return list(results) if results else []
-        except Exception as e:
-            logging.error(f"SQL query error: {e}, SQL: {sql}")
-            return []
+            if isinstance(cursor, sqlite3.Cursor):
+                columns = [desc[0] for desc in cursor.description]
+                return [dict(zip(columns, row)) for row in results]
+            return list(results) if results else []
+    except Exception as e:
+        logging.error(f"SQL query error: {e}, SQL: {sql}")
+        return []
@@ -1,13 +1,57 @@
 # translate/excel.py
+"""
+Excel文件翻译处理器
+
+设置 EXCEL_LARGE_THRESHOLD_MB 后，超过该大小的工作簿走按列去重的流式路径（默认关闭）：
+- 只读模式逐行解析工作表，只收集字符串单元格（跳过公式、数字、日期）
+- 每列建立 {值: 行号列表} 表，分类列重复值多，同一列的相同值只翻译一次
+- 合并区域按列分桶、按起始行二分做范围检查，不展开每个坐标
+- 只写模式逐行写出新工作簿，共享原工作簿的样式表，保留单元格样式、列宽、行高、合并区域、冻结窗格、
+  定义名称、超链接、条件格式、数据验证、筛选和打印设置；
+  图表、图片、批注、表格和数据透视表不保留，工作簿含这些部件时记录警告
+
+EXCEL_ENGINE=xml 时使用共享字符串引擎：
+- 直接从zip读取 xl/sharedStrings.xml，每个不重复字符串只翻译一次
+- 只改写共享字符串表和含内联字符串（inlineStr）的工作表，其他zip成员原样复制，
+  样式、公式、图表等不加载为Python对象
+- 字数统计按不重复字符串计（不逐个单元格累加）
+"""
+import os
+import posixpath
 import datetime
 import logging
-from typing import List, Dict, Any
+import zipfile
+from array import array
+from bisect import bisect_right
+from typing import List, Dict, Any, Iterable, Tuple
 from threading import Event
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.packaging.relationship import RelationshipList, get_dependents, get_rels_path
+from openpyxl.utils import get_column_letter, range_boundaries
+from openpyxl.worksheet._reader import WorkSheetParser
+from openpyxl.worksheet.dimensions import ColumnDimension, RowDimension
 from openpyxl.worksheet.worksheet import Worksheet
+from lxml import etree
 
 from . import to_translate
 from . import common
+from . import ooxml
+
+ENGINE = os.environ.get('EXCEL_ENGINE', 'openpyxl').lower()  # openpyxl / xml（共享字符串引擎）
+LARGE_THRESHOLD = int(os.environ.get('EXCEL_LARGE_THRESHOLD_MB', 0)) * 1024 * 1024  # 超过该大小的工作簿走流式路径，0为不启用
+
+# 只写工作簿与原工作簿共享的样式表，单元格的样式数组可直接复用
+STYLE_TABLES = ('_fonts', '_alignments', '_borders', '_fills', '_number_formats', '_protections',
+                '_colors', '_cell_styles', '_named_styles', '_table_styles', '_differential_styles')
+# 在写入行之前从原工作表复制的属性
+SHEET_PROPERTIES = ('sheet_properties', 'views', 'sheet_format')
+# 写完行之后从原工作表复制的属性（写在 sheetData 之后）
+SHEET_TAIL_PROPERTIES = ('protection', 'scenarios', 'auto_filter', 'data_validations', 'print_options',
+                         'page_margins', 'page_setup', 'HeaderFooter', 'row_breaks', 'col_breaks')
+# 流式路径无法保留的部件：(zip成员名前缀, 说明)
+LARGE_DROPPED_PARTS = (('xl/drawings/', '图表/图片'), ('xl/comments', '批注'), ('xl/tables/', '表格'),
+                       ('xl/pivotTables/', '数据透视表'))
 
 
 def start(trans: Dict[str, Any]) -> bool:
@@ -19,6 +63,16 @@ def start(trans: Dict[str, Any]) -> bool:
     translate_id = trans['id']
     start_time = datetime.datetime.now()
 
+    try:
+        if ENGINE == 'xml' and zipfile.is_zipfile(trans['file_path']):
+            return _start_xml(trans, start_time)
+        if LARGE_THRESHOLD and os.path.getsize(trans['file_path']) > LARGE_THRESHOLD:
+            return _start_large(trans, start_time)
+    except OSError as e:
+        logging.error(f"[任务{translate_id}] 无法打开Excel文件: {e}")
+        to_translate.error(translate_id, f"无法打开Excel文件: {str(e)}")
+        return False
+
     # 加载工作簿
     try:
         wb = openpyxl.load_workbook(trans['file_path'])
@@ -77,27 +131,15 @@ def _extract_sheet_texts(ws: Worksheet, sheet_name: str, texts: List[Dict], cell
     :param texts: 文本列表（输出）
     :param cell_map: 单元格位置映射（输出）
     """
-    # 获取合并单元格范围，避免重复翻译
-    merged_cells = set()
-    for merged_range in ws.merged_cells.ranges:
-        # 只保留合并区域的第一个单元格，其他跳过
-        first_cell = True
-        for row in range(merged_range.min_row, merged_range.max_row + 1):
-            for col in range(merged_range.min_col, merged_range.max_col + 1):
-                if first_cell:
-                    first_cell = False
-                else:
-                    merged_cells.add((row, col))
+    # 合并单元格范围，避免重复翻译
+    merged = MergedRanges(ws.merged_cells.ranges)
 
     # 遍历所有单元格
     for row_idx, row in enumerate(ws.iter_rows(), start=1):
         for col_idx, cell in enumerate(row, start=1):
-            # 跳过合并单元格的非首单元格
-            if (row_idx, col_idx) in merged_cells:
-                continue
-
             value = cell.value
-            if _should_translate(value):
+            # 跳过合并单元格的非首单元格
+            if _should_translate(value) and not merged.hides(row_idx, col_idx):
                 text_item = {
                     'text': str(value),
                     'original': str(value),
@@ -133,7 +175,6 @@ def _should_translate(value) -> bool:
     return True
 
 
-
 def _apply_translation(wb, texts: List[Dict], cell_map: List[Dict], trans_type: str) -> int:
     """
     应用翻译结果到工作簿
@@ -141,6 +182,7 @@ def _apply_translation(wb, texts: List[Dict], cell_map: List[Dict], trans_type:
     """
     text_count = 0
     keep_both = 'both' in trans_type
+    sheets = {}
 
     for mapping in cell_map:
         sheet_name = mapping['sheet']
@@ -154,7 +196,9 @@ def _apply_translation(wb, texts: List[Dict], cell_map: List[Dict], trans_type:
         text_item = texts[text_index]
         text_count += text_item.get('count', 0)
 
-        ws = wb[sheet_name]
+        ws = sheets.get(sheet_name)
+        if ws is None:
+            ws = sheets[sheet_name] = wb[sheet_name]
         cell = ws.cell(row=row, column=col)
 
         original = text_item.get('original', '')
@@ -168,3 +212,411 @@ def _apply_translation(wb, texts: List[Dict], cell_map: List[Dict], trans_type:
             cell.value = translated
 
     return text_count
+
+
+class MergedRanges:
+    """合并区域范围检查：按列分桶、按起始行二分查找，不展开区域内的每个坐标"""
+
+    def __init__(self, ranges: Iterable):
+        buckets = {}  # 列号 -> [(起始行, 结束行, 起始列), ...]
+        for cell_range in ranges:
+            min_col, min_row, max_col, max_row = range_boundaries(str(cell_range))
+            for col in range(min_col, max_col + 1):
+                buckets.setdefault(col, []).append((min_row, max_row, min_col))
+        self._buckets = {col: sorted(items) for col, items in buckets.items()}
+        self._starts = {col: [item[0] for item in items] for col, items in self._buckets.items()}
+
+    def hides(self, row: int, col: int) -> bool:
+        """单元格是否为合并区域的非首单元格（合并区域互不重叠，同一列内按起始行有序）"""
+        items = self._buckets.get(col)
+        if not items:
+            return False
+        k = bisect_right(self._starts[col], row) - 1
+        if k < 0:
+            return False
+        min_row, max_row, min_col = items[k]
+        return row <= max_row and (row != min_row or col != min_col)
+
+
+# ==================== 大工作簿 ====================
+
+def _start_large(trans: Dict[str, Any], start_time) -> bool:
+    """
+    大工作簿翻译：只读模式收集每列的不重复字符串，翻译后用只写模式逐行写出
+    """
+    translate_id = trans['id']
+
+    try:
+        wb = openpyxl.load_workbook(trans['file_path'], read_only=True)
+    except Exception as e:
+        logging.error(f"[任务{translate_id}] 无法打开Excel文件: {e}")
+        to_translate.error(translate_id, f"无法打开Excel文件: {str(e)}")
+        return False
+
+    try:
+        # 提取每列的不重复字符串
+        try:
+            texts, entries, merged = _collect_unique_cells(wb)
+        except Exception as e:
+            logging.error(f"[任务{translate_id}] 提取文本失败: {e}")
+            to_translate.error(translate_id, f"提取文本失败: {str(e)}")
+            return False
+
+        logging.info(
+            f"[任务{translate_id}] 大工作簿按列去重：{sum(n for _, _, n in entries)} 个单元格，"
+            f"{len(texts)} 个不重复文本需要翻译")
+        dropped = _dropped_parts(wb)
+        if dropped:
+            logging.warning(
+                f"[任务{translate_id}] 大工作簿流式写出不保留以下内容: {'、'.join(dropped)}"
+                f"（调大 EXCEL_LARGE_THRESHOLD_MB 或设为0可完整保留）")
+
+        event = Event()
+        if texts and not to_translate.translate_batch(trans, texts, event):
+            return False
+
+        # 按列汇总译文并逐行写出
+        try:
+            keep_both = 'both' in trans.get('type', '')
+            translations = {}  # 工作表序号 -> {(列号, 原文): 写入值}
+            text_count = 0
+            for text_item, (sheet_index, col, occurrences) in zip(texts, entries):
+                original = text_item.get('original', '')
+                translated = text_item.get('text', original)
+                value = f"{original}\n{translated}" if keep_both else translated
+                translations.setdefault(sheet_index, {})[(col, original)] = value
+                text_count += text_item.get('count', 0) * occurrences
+
+            _write_large(wb, translations, merged, trans['target_file'])
+        except Exception as e:
+            logging.error(f"[任务{translate_id}] 保存文件失败: {e}")
+            to_translate.error(translate_id, f"保存文件失败: {str(e)}")
+            return False
+    finally:
+        wb.close()
+
+    end_time = datetime.datetime.now()
+    spend_time = common.display_spend(start_time, end_time)
+    to_translate.complete(trans, text_count, spend_time)
+    return True
+
+
+def _sheet_parser(ws, src) -> WorkSheetParser:
+    """创建只读工作表的解析器（与 ReadOnlyWorksheet 内部一致），解析完成后可取得合并区域、列宽等"""
+    wb = ws.parent
+    return WorkSheetParser(src, ws._shared_strings, data_only=wb.data_only, epoch=wb.epoch,
+                           date_formats=wb._date_formats, timedelta_formats=wb._timedelta_formats)
+
+
+def _merge_refs(parser: WorkSheetParser) -> List[str]:
+    """解析器读到的合并区域"""
+    if not parser.merged_cells:
+        return []
+    return [cell.ref for cell in parser.merged_cells.mergeCell]
+
+
+def _collect_unique_cells(wb) -> Tuple[List[Dict], List[Tuple[int, int, int]], List[MergedRanges]]:
+    """
+    逐行读取所有工作表，按列统计需要翻译的字符串
+    :return: (文本块列表, 每个文本块的 (工作表序号, 列号, 出现次数), 每个工作表的合并区域)
+    """
+    texts = []
+    entries = []
+    merged = []
+
+    for sheet_index, ws in enumerate(wb.worksheets):
+        columns = {}  # 列号 -> {值: 行号数组}
+        with ws._get_source() as src:
+            parser = _sheet_parser(ws, src)
+            for row_idx, cells in parser.parse():
+                for cell in cells:
+                    value = cell['value']
+                    if cell['data_type'] != 's' or not _should_translate(value):
+                        continue
+                    rows = columns.setdefault(cell['column'], {}).get(value)
+                    if rows is None:
+                        rows = columns[cell['column']][value] = array('I')
+                    rows.append(row_idx)
+
+        # 合并区域在 sheetData 之后，读完整张表再剔除合并区域的非首单元格
+        sheet_merged = MergedRanges(_merge_refs(parser))
+        merged.append(sheet_merged)
+
+        for col in sorted(columns):
+            section = f"{ws.title}!{get_column_letter(col)}"
+            for value, rows in columns[col].items():
+                occurrences = sum(1 for row in rows if not sheet_merged.hides(row, col))
+                if not occurrences:
+                    continue
+                texts.append({
+                    'text': value,
+                    'original': value,
+                    'complete': False,
+                    'count': 0,
+                    'section': section
+                })
+                entries.append((sheet_index, col, occurrences))
+
+    return texts, entries, merged
+
+
+def _write_large(wb, translations: Dict[int, Dict], merged: List[MergedRanges], target_file: str):
+    """
+    以只写模式逐行写出工作簿，字符串单元格按 (列号, 原文) 替换为译文
+    """
+    out = openpyxl.Workbook(write_only=True)
+    for name in STYLE_TABLES:
+        setattr(out, name, getattr(wb, name))
+    out.defined_names = wb.defined_names
+    cell_styles = wb._cell_styles
+
+    for sheet_index, ws in enumerate(wb.worksheets):
+        out_ws = out.create_sheet(ws.title)
+        out_ws.sheet_state = ws.sheet_state
+        sheet_translations = translations.get(sheet_index, {})
+        sheet_merged = merged[sheet_index]
+
+        with ws._get_source() as src:
+            parser = _sheet_parser(ws, src)
+            written = 0
+            for row_idx, cells in parser.parse():
+                if not written:
+                    # 列宽、冻结窗格等在 sheetData 之前，写第一行前复制
+                    _copy_sheet_layout(parser, out_ws, cell_styles)
+                while written < row_idx - 1:
+                    out_ws.append([])
+                    written += 1
+
+                row = [None] * (cells[-1]['column'] if cells else 0)
+                for cell in cells:
+                    value = cell['value']
+                    style_id = cell['style_id']
+                    if value is None and not style_id:
+                        continue
+                    col = cell['column']
+                    out_cell = WriteOnlyCell(out_ws)
+                    if cell['data_type'] == 's' and not sheet_merged.hides(row_idx, col):
+                        value = sheet_translations.get((col, value), value)
+                    out_cell._value = value
+                    out_cell.data_type = cell['data_type']
+                    if style_id:
+                        out_cell._style = cell_styles[style_id]
+                    row[col - 1] = out_cell
+
+                attrs = parser.row_dimensions.pop(str(row_idx), None)
+                if attrs:
+                    if 's' in attrs:
+                        attrs['s'] = cell_styles[int(attrs['s'])]
+                    out_ws.row_dimensions[row_idx] = RowDimension(out_ws, **attrs)
+                out_ws.append(row)
+                out_ws.row_dimensions.pop(row_idx, None)
+                written = row_idx
+
+            if not written:
+                _copy_sheet_layout(parser, out_ws, cell_styles)
+            for ref in _merge_refs(parser):
+                out_ws.merged_cells.add(ref)
+            _copy_sheet_tail(ws, parser, out_ws)
+
+    out.save(target_file)
+
+
+def _copy_sheet_layout(parser: WorkSheetParser, out_ws, cell_styles):
+    """复制工作表属性、视图（冻结窗格）和列宽"""
+    for name in SHEET_PROPERTIES:
+        value = getattr(parser, name, None)
+        if value is not None:
+            setattr(out_ws, name, value)
+    for letter, attrs in parser.column_dimensions.items():
+        if 'style' in attrs:
+            attrs['style'] = cell_styles[int(attrs['style'])]
+        out_ws.column_dimensions[letter] = ColumnDimension(out_ws, **attrs)
+
+
+def _copy_sheet_tail(ws, parser: WorkSheetParser, out_ws):
+    """复制 sheetData 之后的内容：条件格式、数据验证、超链接、筛选、打印设置，以及工作表级定义名称"""
+    for name in SHEET_TAIL_PROPERTIES:
+        value = getattr(parser, name, None)
+        if value is not None:
+            setattr(out_ws, name, value)
+
+    differential_styles = ws.parent._differential_styles
+    for cf in parser.formatting:
+        for rule in cf.rules:
+            if rule.dxfId is not None:
+                rule.dxf = differential_styles[rule.dxfId]
+            out_ws.conditional_formatting[cf] = rule
+
+    # 外部链接的目标在工作表的关系文件中
+    rels = None
+    for link in parser.hyperlinks.hyperlink:
+        if link.id:
+            if rels is None:
+                rels = _sheet_rels(ws)
+            rel = rels.get(link.id)
+            link.target = rel.Target if rel is not None else None
+            link.id = None
+        out_ws._hyperlinks.append(link)
+
+    # 打印区域/标题由工作簿读取定义名称时设置到工作表，未设置时只读工作表上没有这些属性
+    out_ws.defined_names = ws.defined_names
+    for name in ('_print_area', '_print_rows', '_print_cols'):
+        if hasattr(ws, name):
+            setattr(out_ws, name, getattr(ws, name))
+
+
+def _sheet_rels(ws) -> RelationshipList:
+    """只读工作表的关系列表"""
+    archive = ws.parent._archive
+    rels_path = get_rels_path(ws._worksheet_path)
+    if rels_path not in archive.NameToInfo:
+        return RelationshipList()
+    return get_dependents(archive, rels_path)
+
+
+def _dropped_parts(wb) -> List[str]:
+    """工作簿中流式写出无法保留的部件说明"""
+    names = wb._archive.namelist()
+    return [label for prefix, label in LARGE_DROPPED_PARTS
+            if any(name.startswith(prefix) for name in names)]
+
+
+# ==================== 共享字符串引擎 ====================
+
+def _start_xml(trans: Dict[str, Any], start_time) -> bool:
+    """
+    共享字符串引擎：只翻译并改写共享字符串表和内联字符串，其余zip成员原样复制
+    """
+    translate_id = trans['id']
+
+    try:
+        with zipfile.ZipFile(trans['file_path']) as zin:
+            sst_path, sheet_paths = _workbook_parts(zin)
+            parts = {}  # zip成员名 -> 解析后的XML树
+            texts = []
+            elements = []  # 与 texts 对应的字符串元素（si / is）列表
+            index = {}  # 文本 -> texts 下标
+
+            if sst_path in zin.NameToInfo:
+                parts[sst_path] = ooxml.parse_part(zin, sst_path)
+                _collect_strings(parts[sst_path].getroot().iterchildren('{*}si'), texts, elements, index)
+
+            for sheet_path in sheet_paths:
+                if not ooxml.contains(zin, sheet_path, b'inlineStr'):
+                    continue
+                tree = ooxml.parse_part(zin, sheet_path)
+                inline = [c.find('{*}is') for c in tree.getroot().iter('{*}c') if c.get('t') == 'inlineStr']
+                if _collect_strings((el for el in inline if el is not None), texts, elements, index):
+                    parts[sheet_path] = tree
+    except Exception as e:
+        logging.error(f"[任务{translate_id}] 无法打开Excel文件: {e}")
+        to_translate.error(translate_id, f"无法打开Excel文件: {str(e)}")
+        return False
+
+    logging.info(
+        f"[任务{translate_id}] 共享字符串引擎：{len(texts)} 个字符串需要翻译，改写 {len(parts)} 个XML部件")
+
+    event = Event()
+    if texts and not to_translate.translate_batch(trans, texts, event):
+        return False
+
+    try:
+        keep_both = 'both' in trans.get('type', '')
+        text_count = 0
+        for text_item, group in zip(texts, elements):
+            original = text_item.get('original', '')
+            translated = text_item.get('text', original)
+            value = f"{original}\n{translated}" if keep_both else translated
+            for element in group:
+                _set_string(element, value)
+            text_count += text_item.get('count', 0)
+
+        ooxml.repack(trans['file_path'], trans['target_file'],
+                     {name: (lambda src, tree=tree: ooxml.serialize(tree)) for name, tree in parts.items()})
+    except Exception as e:
+        logging.error(f"[任务{translate_id}] 保存文件失败: {e}")
+        to_translate.error(translate_id, f"保存文件失败: {str(e)}")
+        return False
+
+    end_time = datetime.datetime.now()
+    spend_time = common.display_spend(start_time, end_time)
+    to_translate.complete(trans, text_count, spend_time)
+    return True
+
+
+def _workbook_parts(zin: zipfile.ZipFile) -> Tuple[str, List[str]]:
+    """
+    按关系文件定位共享字符串表和各工作表
+    :return: (共享字符串表路径, 工作表路径列表)
+    """
+    workbook = ooxml.main_part(zin, 'xl/workbook.xml')
+    sst_path = posixpath.join(posixpath.dirname(workbook), 'sharedStrings.xml')
+    sheet_paths = []
+    for rel_type, target in ooxml.read_rels(zin, workbook):
+        if rel_type.endswith('/sharedStrings'):
+            sst_path = target
+        elif rel_type.endswith('/worksheet'):
+            sheet_paths.append(target)
+    return sst_path, sheet_paths
+
+
+def _string_text(element) -> str:
+    """字符串元素（si / is）的文本：直接的 t 或各富文本段 r/t 拼接，不含注音 rPh"""
+    parts = []
+    for child in element:
+        tag = etree.QName(child).localname
+        if tag == 't':
+            parts.append(child.text or '')
+        elif tag == 'r':
+            t = child.find('{*}t')
+            if t is not None:
+                parts.append(t.text or '')
+    return ''.join(parts)
+
+
+def _collect_strings(strings: Iterable, texts: List[Dict], elements: List[List],
+                     index: Dict[str, int]) -> int:
+    """
+    收集需要翻译的字符串元素，相同文本只生成一个文本块
+    :param index: 文本 -> texts 下标（共享字符串表和各工作表共用）
+    :return: 收集到的元素数
+    """
+    collected = 0
+    for element in strings:
+        text = _string_text(element)
+        if not _should_translate(text):
+            continue
+        i = index.get(text)
+        if i is None:
+            i = index[text] = len(texts)
+            texts.append({
+                'text': text,
+                'original': text,
+                'complete': False,
+                'count': 0
+            })
+            elements.append([])
+        elements[i].append(element)
+        collected += 1
+    return collected
+
+
+def _set_string(element, text: str):
+    """
+    写入译文：富文本保留第一段的格式，其余段和注音删除
+    """
+    first = None
+    for child in list(element):
+        tag = etree.QName(child).localname
+        if first is None and tag in ('t', 'r'):
+            first = child
+        elif tag in ('t', 'r', 'rPh'):
+            element.remove(child)
+
+    if first is None:
+        first = etree.SubElement(element, etree.QName(element, 't'))
+    t = first if etree.QName(first).localname == 't' else first.find('{*}t')
+    if t is None:
+        t = etree.SubElement(first, etree.QName(element, 't'))
+    t.text = text
+    t.set(ooxml.XML_SPACE, 'preserve')
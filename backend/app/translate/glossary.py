@@ -0,0 +1,288 @@
+# translate/glossary.py
+"""
+术语库索引
+- 任务开始时用全部源术语（小写）构建一次 Aho–Corasick 自动机，所有文本块复用
+- 扫描文本一次找出全部候选出现位置，再按原有三种策略校验边界：
+  1. 单词边界（等价于 \\b术语\\b）
+  2. 词组边界（前后为空白、标点或文本首尾）
+  3. 中英混合术语（如 "API接口"）：各部分按顺序出现即可，各部分也作为模式加入自动机
+- 匹配耗时与文本长度和命中数成正比，与术语数量无关
+- 解析后的术语库（术语列表+索引）按 (comparison_id, 版本键) 进程内缓存（版本键为创建时间+术语版本号 terms_version），
+  多任务共享，按缓存的总术语数做LRU淘汰。缓存在执行翻译的worker进程中，
+  术语变化靠版本号使其失效（invalidate() 只清除调用它的进程自己的缓存）
+"""
+import os
+import re
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from threading import Lock
+from typing import Dict, List, Optional
+
+# 术语库缓存配置
+CACHE_MAX_TERMS = int(os.environ.get('GLOSSARY_CACHE_MAX_TERMS', 200000))  # 缓存的术语总数上限
+
+# 词组边界使用的标点（与原正则回退分支的字符集一致）
+PHRASE_PUNCTUATION = frozenset('!"#$%&\'()*+,./:;<=>?@[\\]^`{|}~…。【】！（），：；？～￥')
+
+_MIXED_PART_PATTERN = re.compile(r'([a-zA-Z]+|[\u4e00-\u9fff]+|[0-9]+)')
+
+
+_cache = OrderedDict()  # {comparison_id: (版本键, GlossaryIndex)}
+_cache_terms = [0]  # 缓存中的术语总数
+_cache_lock = Lock()
+
+
+def parse_terms(content: str) -> List[Dict]:
+    """
+    解析术语库内容
+    支持 ; / 换行 / | 分隔术语对，术语对内支持 逗号 / 制表符 / 冒号 分隔
+    :return: [{'source': str, 'target': str}, ...]
+    """
+    terms_content = (content or '').strip()
+    term_pairs = []
+
+    separator = ';'
+    if ';' not in terms_content:
+        if '\n' in terms_content:
+            separator = '\n'
+        elif '|' in terms_content:
+            separator = '|'
+
+    for term_pair in terms_content.split(separator):
+        term_pair = term_pair.strip()
+        if not term_pair:
+            continue
+
+        if ',' in term_pair:
+            parts = term_pair.split(',', 1)
+        elif '\t' in term_pair:
+            parts = term_pair.split('\t', 1)
+        elif ':' in term_pair:
+            parts = term_pair.split(':', 1)
+        else:
+            continue
+
+        if len(parts) != 2:
+            continue
+
+        source_term = parts[0].strip()
+        target_term = parts[1].strip()
+        if source_term and target_term:
+            term_pairs.append({'source': source_term, 'target': target_term})
+
+    return term_pairs
+
+
+def get_cached(comparison_id, version) -> Optional['GlossaryIndex']:
+    """获取缓存的术语库索引，版本键不一致时视为失效"""
+    with _cache_lock:
+        entry = _cache.get(comparison_id)
+        if entry is None:
+            return None
+        if entry[0] != version:
+            _cache_pop(comparison_id)
+            return None
+        _cache.move_to_end(comparison_id)
+        return entry[1]
+
+
+def put_cached(comparison_id, version, index: 'GlossaryIndex'):
+    """缓存术语库索引，超过术语总数上限时淘汰最久未用的术语库"""
+    with _cache_lock:
+        _cache_pop(comparison_id)
+        if len(index) > CACHE_MAX_TERMS:
+            return
+        _cache[comparison_id] = (version, index)
+        _cache_terms[0] += len(index)
+        while _cache_terms[0] > CACHE_MAX_TERMS:
+            _, (_, evicted) = _cache.popitem(last=False)
+            _cache_terms[0] -= len(evicted)
+
+
+def invalidate(comparison_id):
+    """
+    术语库内容变化时清除缓存
+    只影响当前进程（web服务），worker进程中的缓存由术语版本号判断失效
+    """
+    with _cache_lock:
+        _cache_pop(comparison_id)
+
+
+def _cache_pop(comparison_id):
+    entry = _cache.pop(comparison_id, None)
+    if entry is not None:
+        _cache_terms[0] -= len(entry[1])
+
+
+def split_mixed_term(term: str) -> List[str]:
+    """
+    拆分中英混合术语
+    例如：API接口 -> ["API", "接口"]
+    """
+    return [p for p in _MIXED_PART_PATTERN.findall(term) if len(p.strip()) > 0]
+
+
+def _is_word_char(ch: str) -> bool:
+    """与正则 \\w 一致"""
+    return ch.isalnum() or ch == '_'
+
+
+def _is_phrase_boundary(ch: str) -> bool:
+    return ch.isspace() or ch in PHRASE_PUNCTUATION
+
+
+def _lower(text: str) -> str:
+    """小写化并保持字符位置不变"""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return ''.join(c if len(c.lower()) != 1 else c.lower() for c in text)
+
+
+class GlossaryIndex:
+    """单个任务的术语匹配索引"""
+
+    def __init__(self, term_pairs: List[Dict]):
+        self.term_pairs = term_pairs
+        self._goto = [{}]  # 状态转移表
+        self._fail = [0]
+        self._output = [[]]  # 每个状态结束的模式编号
+        self._patterns = []  # 模式字符串（小写）
+        self._pattern_ids = {}  # type: Dict[str, int]
+        self._full_terms = {}  # type: Dict[int, List[int]]  # 模式 -> 以其为完整术语的术语编号
+        self._mixed_terms = {}  # type: Dict[int, List[int]]  # 术语编号 -> 各部分模式
+        self._part_terms = {}  # type: Dict[int, List[int]]  # 部分模式 -> 包含它的混合术语编号
+
+        for term_no, pair in enumerate(term_pairs):
+            source = (pair.get('source') or '').strip()
+            if not source:
+                continue
+            pattern_id = self._add_pattern(_lower(source))
+            self._full_terms.setdefault(pattern_id, []).append(term_no)
+
+            parts = split_mixed_term(source)
+            if len(parts) > 1:
+                part_ids = [self._add_pattern(_lower(p)) for p in parts]
+                self._mixed_terms[term_no] = part_ids
+                for part_id in set(part_ids):
+                    self._part_terms.setdefault(part_id, []).append(term_no)
+
+        self._build_failure_links()
+
+    def __len__(self):
+        return len(self.term_pairs)
+
+    def match(self, text: str) -> List[str]:
+        """
+        匹配文本中出现的术语
+        :return: 去重后的 "源术语 → 目标术语" 列表，按术语库顺序
+        """
+        if not text or not self._patterns:
+            return []
+
+        lowered = _lower(text)
+        matched = set()
+        part_positions = {}  # type: Dict[int, List[int]]
+
+        for start, pattern_id in self._scan(lowered):
+            end = start + len(self._patterns[pattern_id])
+            full_terms = self._full_terms.get(pattern_id)
+            if full_terms and not matched.issuperset(full_terms) and (
+                    self._is_word_boundary(text, start, end) or
+                    self._is_phrase_boundary(text, start, end)):
+                matched.update(full_terms)
+            if pattern_id in self._part_terms:
+                part_positions.setdefault(pattern_id, []).append(start)
+
+        # 混合术语：各部分按顺序出现
+        candidates = set()
+        for part_id in part_positions:
+            candidates.update(self._part_terms[part_id])
+        for term_no in candidates - matched:
+            if self._is_mixed_match(self._mixed_terms[term_no], part_positions):
+                matched.add(term_no)
+
+        results = []
+        for term_no in sorted(matched):
+            pair = self.term_pairs[term_no]
+            results.append(f"{pair['source']} → {pair['target']}")
+        return list(dict.fromkeys(results))
+
+    def _add_pattern(self, pattern: str) -> int:
+        pattern_id = self._pattern_ids.get(pattern)
+        if pattern_id is not None:
+            return pattern_id
+
+        pattern_id = len(self._patterns)
+        self._patterns.append(pattern)
+        self._pattern_ids[pattern] = pattern_id
+
+        state = 0
+        for ch in pattern:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][ch] = next_state
+            state = next_state
+        self._output[state].append(pattern_id)
+        return pattern_id
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(ch, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def _scan(self, lowered: str):
+        """扫描文本，产出 (起始位置, 模式编号)"""
+        goto, fail, output, patterns = self._goto, self._fail, self._output, self._patterns
+        state = 0
+        for i, ch in enumerate(lowered):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for pattern_id in output[state]:
+                yield i + 1 - len(patterns[pattern_id]), pattern_id
+
+    @staticmethod
+    def _is_word_boundary(text: str, start: int, end: int) -> bool:
+        """等价于 re.search(r'\\b' + 术语 + r'\\b')"""
+        before = start > 0 and _is_word_char(text[start - 1])
+        after = end < len(text) and _is_word_char(text[end])
+        return (before != _is_word_char(text[start]) and
+                after != _is_word_char(text[end - 1]))
+
+    @staticmethod
+    def _is_phrase_boundary(text: str, start: int, end: int) -> bool:
+        """前后为空白、标点或文本首尾"""
+        return ((start == 0 or _is_phrase_boundary(text[start - 1])) and
+                (end == len(text) or _is_phrase_boundary(text[end])))
+
+    def _is_mixed_match(self, part_ids: List[int], part_positions: Dict[int, List[int]]) -> bool:
+        """各部分依次在上一部分之后出现"""
+        current = 0
+        for part_id in part_ids:
+            positions = part_positions.get(part_id)
+            if not positions:
+                return False
+            k = bisect_left(positions, current)
+            if k == len(positions):
+                return False
+            current = positions[k] + len(self._patterns[part_id])
+        return True
+
+
+def build_index(term_pairs: Optional[List[Dict]]) -> Optional[GlossaryIndex]:
+    """构建术语索引，术语库为空时返回None"""
+    if not term_pairs:
+        return None
+    return GlossaryIndex(term_pairs)
@@ -5,7 +5,7 @@ Markdown文件翻译处理器
 1. 保护代码块、行内代码、公式、HTML标签结构
 2. 按语义块切分（标题、列表、引用、表格、段落）
 3. 保持块的完整性
-4. 超长块按句子边界切分
+4. 超过模型token上限的块按行/列表项/句子边界切分
 5. 链接/图片只保留，不翻译
 """
 
@@ -17,9 +17,7 @@ from typing import List, Dict, Tuple
 from dataclasses import dataclass
 from . import to_translate
 from . import common
-
-# 分块配置
-MAX_CHUNK_SIZE = 2000
+from .chunking import Chunker, SENTENCE_PATTERN_NO_SEMICOLON, get_chunker
 
 
 @dataclass
@@ -67,7 +65,7 @@ def start(trans: Dict) -> bool:
     processed_content, protected_blocks = _protect_special_syntax(content)
 
     # 智能分块
-    texts = _smart_chunk_markdown(processed_content)
+    texts = _smart_chunk_markdown(processed_content, get_chunker(trans))
 
     # 统计需要翻译的块数
     to_translate_count = sum(1 for t in texts if not t.get('skip', False))
@@ -198,7 +196,7 @@ def _protect_special_syntax(content: str) -> Tuple[str, List[ProtectedBlock]]:
     return content, protected_blocks
 
 
-def _smart_chunk_markdown(content: str) -> List[Dict]:
+def _smart_chunk_markdown(content: str, chunker: Chunker) -> List[Dict]:
     """
     智能分块Markdown内容
     按语义块切分：标题、列表、引用、表格、普通段落
@@ -251,9 +249,9 @@ def _smart_chunk_markdown(content: str) -> List[Dict]:
             table_lines, end_i = _collect_table(lines, i)
             table_text = '\n'.join(table_lines)
             if _should_translate(table_text):
-                if len(table_text) > MAX_CHUNK_SIZE:
+                if not chunker.fits(table_text):
                     # 表格太大，按行切分
-                    sub_chunks = _split_table(table_lines)
+                    sub_chunks = _split_table(table_lines, chunker)
                     for j, chunk in enumerate(sub_chunks):
                         texts.append(_make_text_item(
                             chunk,
@@ -274,8 +272,8 @@ def _smart_chunk_markdown(content: str) -> List[Dict]:
             quote_lines, end_i = _collect_quote(lines, i)
             quote_text = '\n'.join(quote_lines)
             if _should_translate(quote_text):
-                if len(quote_text) > MAX_CHUNK_SIZE:
-                    sub_chunks = _split_quote(quote_lines)
+                if not chunker.fits(quote_text):
+                    sub_chunks = _split_quote(quote_lines, chunker)
                     for j, chunk in enumerate(sub_chunks):
                         texts.append(_make_text_item(
                             chunk,
@@ -296,8 +294,8 @@ def _smart_chunk_markdown(content: str) -> List[Dict]:
             list_lines, end_i = _collect_list(lines, i, 'unordered')
             list_text = '\n'.join(list_lines)
             if _should_translate(list_text):
-                if len(list_text) > MAX_CHUNK_SIZE:
-                    sub_chunks = _split_list(list_lines)
+                if not chunker.fits(list_text):
+                    sub_chunks = _split_list(list_lines, chunker)
                     for j, chunk in enumerate(sub_chunks):
                         texts.append(_make_text_item(
                             chunk,
@@ -318,8 +316,8 @@ def _smart_chunk_markdown(content: str) -> List[Dict]:
             list_lines, end_i = _collect_list(lines, i, 'ordered')
             list_text = '\n'.join(list_lines)
             if _should_translate(list_text):
-                if len(list_text) > MAX_CHUNK_SIZE:
-                    sub_chunks = _split_list(list_lines)
+                if not chunker.fits(list_text):
+                    sub_chunks = _split_list(list_lines, chunker)
                     for j, chunk in enumerate(sub_chunks):
                         texts.append(_make_text_item(
                             chunk,
@@ -339,8 +337,8 @@ def _smart_chunk_markdown(content: str) -> List[Dict]:
         para_lines, end_i = _collect_paragraph(lines, i)
         para_text = '\n'.join(para_lines)
         if _should_translate(para_text):
-            if len(para_text) > MAX_CHUNK_SIZE:
-                sub_chunks = _split_by_sentences_md(para_text)
+            if not chunker.fits(para_text):
+                sub_chunks = chunker.split(para_text, SENTENCE_PATTERN_NO_SEMICOLON, strip=True)
                 for j, chunk in enumerate(sub_chunks):
                     texts.append(_make_text_item(
                         chunk,
@@ -514,7 +512,7 @@ def _should_translate(text: str) -> bool:
     return True
 
 
-def _split_table(table_lines: List[str]) -> List[str]:
+def _split_table(table_lines: List[str], chunker: Chunker) -> List[str]:
     """切分大表格（保持表头）"""
     if len(table_lines) <= 2:
         return ['\n'.join(table_lines)]
@@ -531,18 +529,20 @@ def _split_table(table_lines: List[str]) -> List[str]:
     else:
         data_start = 1
 
-    current_size = len('\n'.join(current_chunk))
+    header_size = chunker.count('\n'.join(current_chunk))
+    current_size = header_size
 
     for line in table_lines[data_start:]:
-        if current_size + len(line) + 1 > MAX_CHUNK_SIZE:
+        line_size = chunker.count(line) + 1
+        if current_size + line_size > chunker.max_tokens:
             chunks.append('\n'.join(current_chunk))
             current_chunk = [header]
             if separator:
                 current_chunk.append(separator)
-            current_size = len('\n'.join(current_chunk))
+            current_size = header_size
 
         current_chunk.append(line)
-        current_size += len(line) + 1
+        current_size += line_size
 
     if current_chunk and len(current_chunk) > (2 if separator else 1):
         chunks.append('\n'.join(current_chunk))
@@ -550,21 +550,22 @@ def _split_table(table_lines: List[str]) -> List[str]:
     return chunks if chunks else ['\n'.join(table_lines)]
 
 
-def _split_quote(quote_lines: List[str]) -> List[str]:
+def _split_quote(quote_lines: List[str], chunker: Chunker) -> List[str]:
     """切分大引用块"""
     chunks = []
     current_chunk = []
     current_size = 0
 
     for line in quote_lines:
-        if current_size + len(line) + 1 > MAX_CHUNK_SIZE:
+        line_size = chunker.count(line)
+        if current_size + line_size + 1 > chunker.max_tokens:
             if current_chunk:
                 chunks.append('\n'.join(current_chunk))
             current_chunk = [line]
-            current_size = len(line)
+            current_size = line_size
         else:
             current_chunk.append(line)
-            current_size += len(line) + 1
+            current_size += line_size + 1
 
     if current_chunk:
         chunks.append('\n'.join(current_chunk))
@@ -572,7 +573,7 @@ def _split_quote(quote_lines: List[str]) -> List[str]:
     return chunks if chunks else ['\n'.join(quote_lines)]
 
 
-def _split_list(list_lines: List[str]) -> List[str]:
+def _split_list(list_lines: List[str], chunker: Chunker) -> List[str]:
     """
     切分大列表
     尽量按完整的列表项切分
@@ -592,16 +593,16 @@ def _split_list(list_lines: List[str]) -> List[str]:
         end = item_starts[i + 1] if i + 1 < len(item_starts) else len(list_lines)
         items.append(list_lines[start:end])
 
-    # 合并列表项直到接近MAX_CHUNK_SIZE
+    # 合并列表项直到接近token上限
     chunks = []
     current_chunk = []
     current_size = 0
 
     for item in items:
         item_text = '\n'.join(item)
-        item_size = len(item_text)
+        item_size = chunker.count(item_text)
 
-        if current_size + item_size + 1 > MAX_CHUNK_SIZE:
+        if current_size + item_size + 1 > chunker.max_tokens:
             if current_chunk:
                 chunks.append('\n'.join(['\n'.join(it) for it in current_chunk]))
             current_chunk = [item]
@@ -616,54 +617,6 @@ def _split_list(list_lines: List[str]) -> List[str]:
     return chunks if chunks else ['\n'.join(list_lines)]
 
 
-def _split_by_sentences_md(text: str) -> List[str]:
-    """按句子边界切分Markdown段落"""
-    # 句子结束标记
-    sentence_endings = r'([.!?。！？][\s]*)'
-
-    parts = re.split(sentence_endings, text)
-
-    # 重新组合
-    sentences = []
-    i = 0
-    while i < len(parts):
-        sentence = parts[i]
-        if i + 1 < len(parts) and re.match(sentence_endings, parts[i + 1]):
-            sentence += parts[i + 1]
-            i += 2
-        else:
-            i += 1
-        if sentence.strip():
-            sentences.append(sentence)
-
-    # 合并句子
-    chunks = []
-    current_chunk = ""
-
-    for sentence in sentences:
-        if len(sentence) > MAX_CHUNK_SIZE:
-            if current_chunk:
-                chunks.append(current_chunk.strip())
-                current_chunk = ""
-            for j in range(0, len(sentence), MAX_CHUNK_SIZE):
-                chunk = sentence[j:j + MAX_CHUNK_SIZE]
-                if chunk.strip():
-                    chunks.append(chunk.strip())
-            continue
-
-        if len(current_chunk) + len(sentence) <= MAX_CHUNK_SIZE:
-            current_chunk += sentence
-        else:
-            if current_chunk:
-                chunks.append(current_chunk.strip())
-            current_chunk = sentence
-
-    if current_chunk:
-        chunks.append(current_chunk.strip())
-
-    return chunks if chunks else [text]
-
-
 def _make_text_item(text: str, skip: bool = False, block_type: str = 'paragraph',
                     is_sub: bool = False, sub_index: int = 0, sub_total: int = 1,
                     prefix: str = '', content_text: str = '') -> Dict:
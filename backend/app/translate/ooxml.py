@@ -0,0 +1,94 @@
+# translate/ooxml.py
+"""
+OOXML包（xlsx / docx / pptx 的zip）读写工具，供XML引擎共用
+- 按关系文件（_rels/*.rels）定位部件
+- 重新打包时只改写指定部件，其余成员按原压缩方式流式复制
+"""
+import os
+import posixpath
+import shutil
+import zipfile
+from typing import Callable, Dict, IO, List, Tuple
+
+from lxml import etree
+
+REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+XML_SPACE = '{http://www.w3.org/XML/1998/namespace}space'
+COPY_CHUNK_SIZE = 1024 * 1024  # 复制zip成员时每次读取的字节数
+
+
+def read_rels(zin: zipfile.ZipFile, part: str) -> List[Tuple[str, str]]:
+    """
+    读取部件的关系文件（part 为空字符串时读取包级关系 _rels/.rels）
+    :return: [(关系类型, 目标部件在zip中的路径), ...]，不含外部链接
+    """
+    folder, name = posixpath.split(part)
+    rels_path = posixpath.join(folder, '_rels', name + '.rels')
+    if rels_path not in zin.NameToInfo:
+        return []
+    root = etree.fromstring(zin.read(rels_path))
+    rels = []
+    for rel in root.iterchildren('{%s}Relationship' % REL_NS):
+        if rel.get('TargetMode') == 'External':
+            continue
+        target = rel.get('Target', '')
+        if target.startswith('/'):
+            target = target[1:]
+        else:
+            target = posixpath.normpath(posixpath.join(folder, target))
+        rels.append((rel.get('Type', ''), target))
+    return rels
+
+
+def main_part(zin: zipfile.ZipFile, default: str) -> str:
+    """包的主文档部件（officeDocument 关系），缺失时返回默认路径"""
+    return next((target for rel_type, target in read_rels(zin, '')
+                 if rel_type.endswith('/officeDocument')), default)
+
+
+def parse_part(zin: zipfile.ZipFile, name: str):
+    """解析zip中的XML部件"""
+    parser = etree.XMLParser(huge_tree=True, remove_blank_text=False)
+    with zin.open(name) as f:
+        return etree.parse(f, parser)
+
+
+def serialize(tree) -> bytes:
+    """序列化XML部件（带 standalone 声明，与Office写出的格式一致）"""
+    return etree.tostring(tree, xml_declaration=True, encoding='UTF-8', standalone=True)
+
+
+def contains(zin: zipfile.ZipFile, name: str, marker: bytes) -> bool:
+    """流式解压检查部件中是否出现某个字节串（不解析XML）"""
+    tail = b''
+    with zin.open(name) as f:
+        while True:
+            data = f.read(COPY_CHUNK_SIZE)
+            if not data:
+                return False
+            if marker in tail + data[:len(marker)] or marker in data:
+                return True
+            tail = data[-len(marker):]
+
+
+def repack(source: str, target: str, rewrite: Dict[str, Callable[[IO], bytes]]):
+    """
+    写出新的包：rewrite 中的部件由回调生成新内容（回调参数为原成员的只读流），
+    逐个生成、写入后即释放；其余成员按原压缩方式流式复制
+    """
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with zipfile.ZipFile(source) as zin, zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED) as zout:
+        for info in zin.infolist():
+            out_info = zipfile.ZipInfo(info.filename, info.date_time)
+            out_info.compress_type = info.compress_type
+            out_info.external_attr = info.external_attr
+            callback = rewrite.get(info.filename)
+            if callback is not None:
+                with zin.open(info) as src:
+                    data = callback(src)
+                zout.writestr(out_info, data, compress_type=zipfile.ZIP_DEFLATED)
+                continue
+            out_info.file_size = info.file_size
+            with zin.open(info) as src, \
+                    zout.open(out_info, 'w', force_zip64=info.file_size > zipfile.ZIP64_LIMIT) as dst:
+                shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
@@ -6,8 +6,8 @@ PPT文档翻译处理器 (.pptx)
 1. 识别并区分标题/副标题/正文/表格等元素
 2. 保留图片、图表等非文本元素
 3. 智能调整容器大小和字体以适应译文
-4. 防止元素重叠和超出边界
-5. 双语模式正确复制幻灯片
+4. 防止元素重叠和超出边界（每张幻灯片建一次网格索引，碰撞检测只检查相邻网格内的形状）
+5. 双语模式正确复制幻灯片（在包层面克隆幻灯片部件，图片等资源按引用共享，最后一次性排列顺序）
 
 元素处理策略：
 - 标题/副标题：不换行，优先扩展宽度或缩小字体
@@ -20,7 +20,8 @@ import datetime
 import logging
 import re
 import copy
-from typing import List, Dict, Any, Optional, Tuple, Set
+from collections import defaultdict
+from typing import List, Dict, Any, Iterator, Optional, Tuple, Set
 from dataclasses import dataclass
 from threading import Event
 from enum import Enum
@@ -32,20 +33,27 @@ from pptx.shapes.base import BaseShape
 from pptx.shapes.placeholder import PlaceholderPicture
 from pptx.text.text import TextFrame, _Paragraph, _Run
 from pptx.oxml.ns import qn
-from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.opc.constants import CONTENT_TYPE as CT, RELATIONSHIP_TYPE as RT
+from pptx.opc.package import _Relationship
+from pptx.opc.packuri import PackURI
+from pptx.parts.slide import SlidePart
 from lxml import etree
 
 from . import to_translate
 from . import common
+from .chunking import Chunker, get_chunker
 
 # ==================== 配置 ====================
 
-MAX_CHUNK_SIZE = 2000
 MIN_FONT_SIZE = Pt(10)  # 最小字体
 MAX_WIDTH_EXPANSION = 1.3  # 最大宽度扩展比例
 MAX_HEIGHT_EXPANSION = 1.5  # 最大高度扩展比例
 FONT_SHRINK_STEP = 0.9  # 字体缩小步长
 MIN_FONT_SCALE = 0.6  # 最小字体缩放比例
+SHAPE_INDEX_GRID = 16  # 碰撞检测网格：幻灯片每边划分的格数
+POSITION_TOLERANCE = Emu(Inches(0.1))  # 双语模式按位置匹配形状的容差
+# 克隆幻灯片时不复制的关系（备注页和批注回指原幻灯片，不能共享）
+CLONE_SKIP_RELS = (RT.NOTES_SLIDE, RT.COMMENTS)
 
 
 class ElementType(Enum):
@@ -79,6 +87,59 @@ class ShapeGeometry:
     height: int = 0
 
 
+class ShapeIndex:
+    """
+    幻灯片形状的网格索引（每张幻灯片建一次）
+    形状按外接矩形登记到覆盖的网格中，碰撞查询只检查相关网格内的形状；
+    超出幻灯片的部分归入边缘网格；形状调整大小后用 update() 更新登记的几何
+    """
+
+    def __init__(self, slide_width: int, slide_height: int, grid: int = SHAPE_INDEX_GRID):
+        self._grid = grid
+        self._cell_width = max(1, int(slide_width) // grid)
+        self._cell_height = max(1, int(slide_height) // grid)
+        self._buckets: Dict[Tuple[int, int], List[Tuple[int, ShapeGeometry]]] = defaultdict(list)
+        self._entries: Dict[int, List[Tuple[int, ShapeGeometry]]] = defaultdict(list)  # shape_id -> 登记项
+
+    def _span(self, start: int, length: int, cell: int) -> range:
+        first = min(max(start // cell, -1), self._grid)
+        last = min(max((start + max(length, 1) - 1) // cell, -1), self._grid)
+        return range(first, last + 1)
+
+    def _cells(self, geo: ShapeGeometry) -> Iterator[Tuple[int, int]]:
+        rows = self._span(geo.top, geo.height, self._cell_height)
+        for x in self._span(geo.left, geo.width, self._cell_width):
+            for y in rows:
+                yield x, y
+
+    def add(self, shape_id: int, geo: ShapeGeometry):
+        """登记形状"""
+        entry = (shape_id, geo)
+        self._entries[shape_id].append(entry)
+        for cell in self._cells(geo):
+            self._buckets[cell].append(entry)
+
+    def update(self, shape_id: int, geo: ShapeGeometry):
+        """形状调整大小后，用新几何替换登记的旧几何"""
+        for entry in self._entries.pop(shape_id, ()):
+            for cell in self._cells(entry[1]):
+                bucket = self._buckets.get(cell)
+                if bucket:
+                    bucket[:] = [e for e in bucket if e is not entry]
+        self.add(shape_id, geo)
+
+    def overlapping(self, geo: ShapeGeometry) -> Iterator[Tuple[int, ShapeGeometry]]:
+        """与给定几何重叠的已登记形状 (shape_id, 几何)"""
+        seen = set()
+        for cell in self._cells(geo):
+            for entry in self._buckets.get(cell, ()):
+                if id(entry) in seen:
+                    continue
+                seen.add(id(entry))
+                if _geometries_overlap(geo, entry[1]):
+                    yield entry
+
+
 @dataclass
 class TextBlock:
     """文本块"""
@@ -142,7 +203,7 @@ def start(trans: Dict[str, Any]) -> bool:
 
     # 提取文本块
     try:
-        all_blocks = _extract_all_blocks(prs)
+        all_blocks = _extract_all_blocks(prs, get_chunker(trans))
     except Exception as e:
         logging.error(f"[任务{translate_id}] 提取文本失败: {e}")
         to_translate.error(translate_id, f"提取文本失败: {str(e)}")
@@ -191,7 +252,7 @@ def start(trans: Dict[str, Any]) -> bool:
 
 # ==================== 文本提取 ====================
 
-def _extract_all_blocks(prs: Presentation) -> List[TextBlock]:
+def _extract_all_blocks(prs: Presentation, chunker: Chunker) -> List[TextBlock]:
     """提取所有文本块"""
     blocks = []
     uid_counter = [0]
@@ -202,13 +263,14 @@ def _extract_all_blocks(prs: Presentation) -> List[TextBlock]:
 
     for slide_idx, slide in enumerate(prs.slides):
         for shape in slide.shapes:
-            shape_blocks = _extract_shape_blocks(shape, slide_idx, next_uid)
+            shape_blocks = _extract_shape_blocks(shape, slide_idx, next_uid, chunker)
             blocks.extend(shape_blocks)
 
     return blocks
 
 
-def _extract_shape_blocks(shape: BaseShape, slide_idx: int, next_uid) -> List[TextBlock]:
+def _extract_shape_blocks(shape: BaseShape, slide_idx: int, next_uid,
+                          chunker: Chunker) -> List[TextBlock]:
     """提取形状中的文本块"""
     blocks = []
     shape_id = shape.shape_id
@@ -240,7 +302,7 @@ def _extract_shape_blocks(shape: BaseShape, slide_idx: int, next_uid) -> List[Te
     if shape.shape_type == MSO_SHAPE_TYPE.GROUP:
         try:
             for sub_shape in shape.shapes:
-                sub_blocks = _extract_shape_blocks(sub_shape, slide_idx, next_uid)
+                sub_blocks = _extract_shape_blocks(sub_shape, slide_idx, next_uid, chunker)
                 blocks.extend(sub_blocks)
         except:
             pass
@@ -255,13 +317,13 @@ def _extract_shape_blocks(shape: BaseShape, slide_idx: int, next_uid) -> List[Te
     # 7. 表格
     if shape.has_table:
         blocks.extend(_extract_table_blocks(shape.table, slide_idx, shape_id,
-                                            geometry, next_uid))
+                                            geometry, next_uid, chunker))
         return blocks
 
     # 8. 文本框
     if shape.has_text_frame:
         blocks.extend(_extract_textframe_blocks(shape.text_frame, slide_idx, shape_id,
-                                                element_type, geometry, next_uid))
+                                                element_type, geometry, next_uid, chunker))
 
     return blocks
 
@@ -369,7 +431,7 @@ def _identify_element_type(shape: BaseShape) -> ElementType:
 
 def _extract_textframe_blocks(text_frame: TextFrame, slide_idx: int, shape_id: int,
                               element_type: ElementType, geometry: ShapeGeometry,
-                              next_uid) -> List[TextBlock]:
+                              next_uid, chunker: Chunker) -> List[TextBlock]:
     """提取文本框中的段落"""
     blocks = []
 
@@ -398,7 +460,7 @@ def _extract_textframe_blocks(text_frame: TextFrame, slide_idx: int, shape_id: i
             continue
 
         # 分块
-        if len(text) <= MAX_CHUNK_SIZE:
+        if chunker.fits(text):
             blocks.append(TextBlock(
                 uid=next_uid(),
                 slide_index=slide_idx,
@@ -411,7 +473,7 @@ def _extract_textframe_blocks(text_frame: TextFrame, slide_idx: int, shape_id: i
                 geometry=geometry
             ))
         else:
-            sub_texts = _split_by_sentences(text, MAX_CHUNK_SIZE)
+            sub_texts = chunker.split(text)
             parent_uid = next_uid()
             for i, sub_text in enumerate(sub_texts):
                 blocks.append(TextBlock(
@@ -434,7 +496,7 @@ def _extract_textframe_blocks(text_frame: TextFrame, slide_idx: int, shape_id: i
 
 
 def _extract_table_blocks(table, slide_idx: int, shape_id: int,
-                          geometry: ShapeGeometry, next_uid) -> List[TextBlock]:
+                          geometry: ShapeGeometry, next_uid, chunker: Chunker) -> List[TextBlock]:
     """提取表格文本"""
     blocks = []
     processed_cells: Set[int] = set()
@@ -473,7 +535,7 @@ def _extract_table_blocks(table, slide_idx: int, shape_id: int,
                 ))
                 continue
 
-            if len(cell_text) <= MAX_CHUNK_SIZE:
+            if chunker.fits(cell_text):
                 blocks.append(TextBlock(
                     uid=next_uid(),
                     slide_index=slide_idx,
@@ -487,7 +549,7 @@ def _extract_table_blocks(table, slide_idx: int, shape_id: int,
                     geometry=geometry
                 ))
             else:
-                sub_texts = _split_by_sentences(cell_text, MAX_CHUNK_SIZE)
+                sub_texts = chunker.split(cell_text)
                 parent_uid = next_uid()
                 for i, sub_text in enumerate(sub_texts):
                     blocks.append(TextBlock(
@@ -609,46 +671,6 @@ def _should_translate(text: str) -> bool:
     return True
 
 
-def _split_by_sentences(text: str, max_size: int) -> List[str]:
-    """按句子边界切分"""
-    endings = r'([.!?。！？；;]\s*)'
-    parts = re.split(endings, text)
-
-    sentences = []
-    i = 0
-    while i < len(parts):
-        s = parts[i]
-        if i + 1 < len(parts) and re.match(endings, parts[i + 1]):
-            s += parts[i + 1]
-            i += 2
-        else:
-            i += 1
-        if s.strip():
-            sentences.append(s)
-
-    chunks = []
-    current = ""
-
-    for s in sentences:
-        if len(s) > max_size:
-            if current:
-                chunks.append(current)
-                current = ""
-            for j in range(0, len(s), max_size):
-                chunks.append(s[j:j + max_size])
-        elif len(current) + len(s) <= max_size:
-            current += s
-        else:
-            if current:
-                chunks.append(current)
-            current = s
-
-    if current:
-        chunks.append(current)
-
-    return chunks if chunks else [text]
-
-
 # ==================== 翻译接口 ====================
 
 def _blocks_to_api_format(blocks: List[TextBlock]) -> List[Dict]:
@@ -691,8 +713,8 @@ def _apply_translation_mode(prs: Presentation, blocks: List[TextBlock],
         sblocks = slide_blocks[slide_idx]
         shape_map = _build_shape_map(slide)
 
-        # 获取所有形状的几何信息（用于碰撞检测）
-        all_geometries = _get_all_shape_geometries(slide)
+        # 所有形状的网格索引（用于碰撞检测）
+        shape_index = _build_shape_index(slide, slide_width, slide_height)
 
         # 按shape分组
         shape_blocks = _group_by_shape(sblocks)
@@ -703,7 +725,7 @@ def _apply_translation_mode(prs: Presentation, blocks: List[TextBlock],
 
             shape = shape_map[shape_id]
             count = _apply_to_shape(shape, blocks_list, target_lang,
-                                    slide_width, slide_height, all_geometries)
+                                    slide_width, slide_height, shape_index)
             text_count += count
 
     return text_count
@@ -748,15 +770,15 @@ def _build_shape_map(slide) -> Dict[int, BaseShape]:
     return shape_map
 
 
-def _get_all_shape_geometries(slide) -> List[ShapeGeometry]:
-    """获取幻灯片上所有形状的几何信息"""
-    geometries = []
+def _build_shape_index(slide, slide_width: int, slide_height: int) -> ShapeIndex:
+    """为幻灯片上所有形状（含组合内的形状）建立网格索引"""
+    shape_index = ShapeIndex(slide_width, slide_height)
 
     def collect_geometry(shape):
         try:
             geo = _get_shape_geometry(shape)
             if geo.width > 0 and geo.height > 0:
-                geometries.append(geo)
+                shape_index.add(shape.shape_id, geo)
         except:
             pass
 
@@ -770,24 +792,24 @@ def _get_all_shape_geometries(slide) -> List[ShapeGeometry]:
     for shape in slide.shapes:
         collect_geometry(shape)
 
-    return geometries
+    return shape_index
 
 
 def _apply_to_shape(shape: BaseShape, blocks: List[TextBlock], target_lang: str,
                     slide_width: int, slide_height: int,
-                    all_geometries: List[ShapeGeometry]) -> int:
+                    shape_index: ShapeIndex) -> int:
     """应用翻译到形状"""
     if shape.has_table:
         return _apply_to_table(shape.table, blocks, target_lang)
     elif shape.has_text_frame:
         return _apply_to_textframe(shape, blocks, target_lang,
-                                   slide_width, slide_height, all_geometries)
+                                   slide_width, slide_height, shape_index)
     return 0
 
 
 def _apply_to_textframe(shape: BaseShape, blocks: List[TextBlock], target_lang: str,
                         slide_width: int, slide_height: int,
-                        all_geometries: List[ShapeGeometry]) -> int:
+                        shape_index: ShapeIndex) -> int:
     """应用翻译到文本框"""
     text_count = 0
     text_frame = shape.text_frame
@@ -834,7 +856,7 @@ def _apply_to_textframe(shape: BaseShape, blocks: List[TextBlock], target_lang:
             target_lang=target_lang,
             slide_width=slide_width,
             slide_height=slide_height,
-            all_geometries=all_geometries
+            shape_index=shape_index
         )
 
     return text_count
@@ -886,7 +908,7 @@ def _replace_paragraph_text_smart(paragraph: _Paragraph, shape: BaseShape,
                                   run_style: Optional[RunStyle],
                                   target_lang: str,
                                   slide_width: int, slide_height: int,
-                                  all_geometries: List[ShapeGeometry]):
+                                  shape_index: ShapeIndex):
     """
     智能替换段落文本
     根据元素类型和文本长度变化调整容器和字体
@@ -924,7 +946,7 @@ def _replace_paragraph_text_smart(paragraph: _Paragraph, shape: BaseShape,
             run_style=run_style,
             slide_width=slide_width,
             slide_height=slide_height,
-            all_geometries=all_geometries
+            shape_index=shape_index
         )
 
 
@@ -932,7 +954,7 @@ def _adjust_for_longer_text(paragraph: _Paragraph, shape: BaseShape, first_run:
                             length_ratio: float, element_type: ElementType,
                             run_style: Optional[RunStyle],
                             slide_width: int, slide_height: int,
-                            all_geometries: List[ShapeGeometry]):
+                            shape_index: ShapeIndex):
     """
     调整以适应更长的文本
     策略：
@@ -944,17 +966,17 @@ def _adjust_for_longer_text(paragraph: _Paragraph, shape: BaseShape, first_run:
     if element_type in [ElementType.TITLE, ElementType.SUBTITLE]:
         # 标题类：优先缩小字体
         _adjust_title_element(shape, first_run, length_ratio, run_style,
-                              slide_width, slide_height, all_geometries)
+                              slide_width, slide_height, shape_index)
     else:
         # 正文类：优先扩展容器
         _adjust_body_element(shape, first_run, length_ratio, run_style,
-                             slide_width, slide_height, all_geometries)
+                             slide_width, slide_height, shape_index)
 
 
 def _adjust_title_element(shape: BaseShape, run: _Run, length_ratio: float,
                           run_style: Optional[RunStyle],
                           slide_width: int, slide_height: int,
-                          all_geometries: List[ShapeGeometry]):
+                          shape_index: ShapeIndex):
     """
     调整标题元素
     策略：缩小字体 > 扩展宽度 > 移动位置
@@ -985,8 +1007,9 @@ def _adjust_title_element(shape: BaseShape, run: _Run, length_ratio: float,
                 height=shape.height
             )
 
-            if not _would_overlap(new_geo, all_geometries, shape.shape_id, shape):
+            if not _would_overlap(new_geo, shape_index, shape.shape_id, shape):
                 shape.width = new_width
+                shape_index.update(shape.shape_id, new_geo)
             else:
                 # 如果扩展会重叠，进一步缩小字体
                 _scale_run_font(run, 0.85, run_style)
@@ -998,7 +1021,7 @@ def _adjust_title_element(shape: BaseShape, run: _Run, length_ratio: float,
 def _adjust_body_element(shape: BaseShape, run: _Run, length_ratio: float,
                          run_style: Optional[RunStyle],
                          slide_width: int, slide_height: int,
-                         all_geometries: List[ShapeGeometry]):
+                         shape_index: ShapeIndex):
     """
     调整正文元素
     策略：扩展高度 > 缩小字体
@@ -1023,8 +1046,9 @@ def _adjust_body_element(shape: BaseShape, run: _Run, length_ratio: float,
                 height=new_height
             )
 
-            if not _would_overlap(new_geo, all_geometries, shape.shape_id, shape):
+            if not _would_overlap(new_geo, shape_index, shape.shape_id, shape):
                 shape.height = new_height
+                shape_index.update(shape.shape_id, new_geo)
             else:
                 # 如果扩展会重叠，缩小字体
                 font_scale = _calculate_font_scale_for_body(length_ratio)
@@ -1090,21 +1114,17 @@ def _scale_run_font(run: _Run, scale: float, run_style: Optional[RunStyle]):
         logging.debug(f"缩放字体失败: {e}")
 
 
-def _would_overlap(new_geo: ShapeGeometry, all_geometries: List[ShapeGeometry],
+def _would_overlap(new_geo: ShapeGeometry, shape_index: ShapeIndex,
                    exclude_shape_id: int, shape: BaseShape) -> bool:
     """检查新几何是否会与其他形状重叠"""
     # 获取当前形状的几何
     current_geo = _get_shape_geometry(shape)
 
-    for geo in all_geometries:
+    for shape_id, geo in shape_index.overlapping(new_geo):
         # 跳过自己
-        if (geo.left == current_geo.left and geo.top == current_geo.top and
-                geo.width == current_geo.width and geo.height == current_geo.height):
+        if shape_id == exclude_shape_id or geo == current_geo:
             continue
-
-        # 检查是否重叠
-        if _geometries_overlap(new_geo, geo):
-            return True
+        return True
 
     return False
 
@@ -1284,37 +1304,43 @@ def _apply_bilingual_mode(prs: Presentation, blocks: List[TextBlock],
                           target_lang: str, slide_width: int, slide_height: int) -> int:
     """
     双语模式：每个原文幻灯片后插入译文幻灯片
+
+    译文幻灯片在包层面克隆（复制幻灯片XML和关系，关系ID和形状ID不变，图片等资源按引用共享），
+    按形状ID应用翻译；克隆失败时退回逐个复制形状并按位置映射。所有幻灯片最后一次性排列顺序
     """
     text_count = 0
 
     # 按幻灯片分组
     slide_blocks = _group_by_slide(blocks)
 
-    original_count = len(prs.slides)
+    sldIdLst = prs.slides._sldIdLst
+    original_ids = list(sldIdLst)
+    original_slides = list(prs.slides)
+    order = []
 
-    # 从后往前处理
-    for slide_idx in range(original_count - 1, -1, -1):
+    for slide_idx, original_slide in enumerate(original_slides):
+        order.append(original_ids[slide_idx])
         try:
-            original_slide = prs.slides[slide_idx]
-
-            # 复制幻灯片（包含图片等所有元素）
-            new_slide = _duplicate_slide(prs, original_slide)
-
-            if new_slide is None:
-                logging.warning(f"复制幻灯片 {slide_idx} 失败")
-                continue
-
-            # 移动到正确位置
-            _move_slide(prs, len(prs.slides) - 1, slide_idx + 1)
-
-            # 获取新幻灯片并应用翻译
-            translated_slide = prs.slides[slide_idx + 1]
+            shape_mapping = None
+            try:
+                translated_slide, sld_id = _clone_slide(prs, original_slide)
+            except Exception as e:
+                logging.warning(f"克隆幻灯片 {slide_idx} 失败，改为逐个复制形状: {e}")
+                translated_slide = _duplicate_slide(prs, original_slide)
+                if translated_slide is None:
+                    logging.warning(f"复制幻灯片 {slide_idx} 失败")
+                    continue
+                sld_id = sldIdLst[-1]
+                # 建立位置映射
+                shape_mapping = _build_shape_mapping_by_position(original_slide, translated_slide)
+            order.append(sld_id)
 
             if slide_idx in slide_blocks:
                 sblocks = slide_blocks[slide_idx]
 
-                # 建立位置映射
-                shape_mapping = _build_shape_mapping_by_position(original_slide, translated_slide)
+                # 克隆的幻灯片形状ID不变，直接按ID映射
+                if shape_mapping is None:
+                    shape_mapping = _build_shape_map(translated_slide)
 
                 # 统计
                 for b in sblocks:
@@ -1330,9 +1356,49 @@ def _apply_bilingual_mode(prs: Presentation, blocks: List[TextBlock],
             import traceback
             traceback.print_exc()
 
+    _reorder_slides(prs, order)
+
     return text_count
 
 
+def _clone_slide(prs: Presentation, source_slide):
+    """
+    在包层面克隆幻灯片：复制幻灯片XML，按原关系ID复制关系（目标部件按引用共享，
+    不复制图片、图表等资源），新幻灯片追加到幻灯片列表末尾
+    :return: (新幻灯片, 新的 p:sldId 元素)
+    """
+    source_part = source_slide.part
+    # 临时部件名，排序后统一重命名
+    partname = PackURI('/ppt/slides/slide%d.xml' % (len(prs.slides._sldIdLst) + 1))
+    new_part = SlidePart(partname, CT.PML_SLIDE, prs.part.package,
+                         copy.deepcopy(source_part._element))
+
+    new_rels = new_part.rels
+    for rId, rel in source_part.rels.items():
+        if rel.reltype in CLONE_SKIP_RELS:
+            continue
+        target = rel.target_ref if rel.is_external else rel.target_part
+        new_rels._rels[rId] = _Relationship(
+            new_part.partname.baseURI, rId, rel.reltype, rel._target_mode, target)
+
+    rId = prs.part.relate_to(new_part, RT.SLIDE)
+    sld_id = prs.slides._sldIdLst.add_sldId(rId)
+    return new_part.slide, sld_id
+
+
+def _reorder_slides(prs: Presentation, order: List):
+    """按给定的 p:sldId 顺序一次性重排幻灯片，并按新顺序重命名幻灯片部件"""
+    sldIdLst = prs.slides._sldIdLst
+    placed = set(id(sld_id) for sld_id in order)
+    # 不在顺序中的幻灯片（如克隆失败时残留的）保持在末尾
+    order = order + [sld_id for sld_id in sldIdLst if id(sld_id) not in placed]
+    for sld_id in list(sldIdLst):
+        sldIdLst.remove(sld_id)
+    for sld_id in order:
+        sldIdLst.append(sld_id)
+    prs.part.rename_slide_parts([sld_id.rId for sld_id in order])
+
+
 def _duplicate_slide(prs: Presentation, source_slide) -> Optional[object]:
     """
     完整复制幻灯片，包括所有元素和图片关系
@@ -1559,53 +1625,40 @@ def _copy_slide_background(source_slide, new_slide):
         logging.debug(f"复制背景失败: {e}")
 
 
-def _move_slide(prs: Presentation, from_idx: int, to_idx: int):
-    """移动幻灯片位置"""
-    try:
-        sldIdLst = prs.slides._sldIdLst
-        slides = list(sldIdLst)
-
-        if from_idx < len(slides):
-            slide = slides[from_idx]
-            sldIdLst.remove(slide)
-
-            # 调整目标索引
-            actual_to = to_idx if to_idx < from_idx else to_idx - 1
-            actual_to = min(actual_to, len(list(sldIdLst)))
-
-            if actual_to >= len(list(sldIdLst)):
-                sldIdLst.append(slide)
-            else:
-                sldIdLst.insert(actual_to, slide)
-    except Exception as e:
-        logging.warning(f"移动幻灯片失败: {e}")
-
-
 def _build_shape_mapping_by_position(original_slide, new_slide) -> Dict[int, BaseShape]:
     """
     通过位置建立形状映射
 
-    使用形状的位置和大小来匹配，比单纯按顺序更可靠
+    使用形状的位置和大小来匹配，比单纯按顺序更可靠；
+    新幻灯片的形状按左上角坐标分桶（桶大小等于容差），每个原始形状只比较相邻桶中的形状
     """
     mapping = {}
 
     orig_shapes = list(original_slide.shapes)
     new_shapes = list(new_slide.shapes)
 
+    new_geometries = [_get_shape_geometry(shape) for shape in new_shapes]
+    buckets = defaultdict(list)
+    for idx, geo in enumerate(new_geometries):
+        buckets[(geo.left // POSITION_TOLERANCE, geo.top // POSITION_TOLERANCE)].append(idx)
+
     # 为每个原始形状找到匹配的新形状
     used_new_indices = set()
 
     for orig_shape in orig_shapes:
         orig_geo = _get_shape_geometry(orig_shape)
+        bucket_x = orig_geo.left // POSITION_TOLERANCE
+        bucket_y = orig_geo.top // POSITION_TOLERANCE
+        candidates = sorted(idx for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                            for idx in buckets.get((bucket_x + dx, bucket_y + dy), ())
+                            if idx not in used_new_indices)
+
         best_match = None
-        best_distance = float('inf')
+        best_distance = POSITION_TOLERANCE  # 只接受差异小于容差的匹配
         best_idx = -1
 
-        for idx, new_shape in enumerate(new_shapes):
-            if idx in used_new_indices:
-                continue
-
-            new_geo = _get_shape_geometry(new_shape)
+        for idx in candidates:
+            new_geo = new_geometries[idx]
 
             # 计算位置和大小的差异
             distance = (
@@ -1615,13 +1668,12 @@ def _build_shape_mapping_by_position(original_slide, new_slide) -> Dict[int, Bas
                     abs(orig_geo.height - new_geo.height)
             )
 
-            # 如果完全匹配（或非常接近）
             if distance < best_distance:
                 best_distance = distance
-                best_match = new_shape
+                best_match = new_shapes[idx]
                 best_idx = idx
 
-        if best_match is not None and best_distance < Emu(Inches(0.1)):  # 容差0.1英寸
+        if best_match is not None:
             mapping[orig_shape.shape_id] = best_match
             used_new_indices.add(best_idx)
 
@@ -1649,6 +1701,7 @@ def _map_group_by_position(orig_group, new_group, mapping: Dict[int, BaseShape])
     try:
         orig_sub = list(orig_group.shapes)
         new_sub = list(new_group.shapes)
+        new_geometries = [_get_shape_geometry(shape) for shape in new_sub]
 
         used_new_indices = set()
 
@@ -1662,7 +1715,7 @@ def _map_group_by_position(orig_group, new_group, mapping: Dict[int, BaseShape])
                 if idx in used_new_indices:
                     continue
 
-                new_geo = _get_shape_geometry(new_shape)
+                new_geo = new_geometries[idx]
                 distance = (
                         abs(orig_geo.left - new_geo.left) +
                         abs(orig_geo.top - new_geo.top)
@@ -1694,12 +1747,12 @@ def _apply_blocks_with_mapping(slide, blocks: List[TextBlock],
     # 按原始shape_id分组
     shape_blocks = _group_by_shape(blocks)
 
-    # 获取几何信息
-    all_geometries = _get_all_shape_geometries(slide)
+    # 形状网格索引
+    shape_index = _build_shape_index(slide, slide_width, slide_height)
 
     for orig_shape_id, sblocks in shape_blocks.items():
         if orig_shape_id not in shape_mapping:
             continue
 
         shape = shape_mapping[orig_shape_id]
-        _apply_to_shape(shape, sblocks, target_lang, slide_width, slide_height, all_geometries)
+        _apply_to_shape(shape, sblocks, target_lang, slide_width, slide_height, shape_index)
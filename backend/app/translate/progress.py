@@ -0,0 +1,121 @@
+# translate/progress.py
+"""
+翻译进度后台写入
+- 翻译线程/协程只在内存中记录每个任务的最新进度，不等待数据库
+- 后台线程按任务合并更新：距上次写入超过间隔且变化达到最小幅度时写库，
+  进度跨过步长阈值（原 update_progress 的规则）时立即唤醒写入
+- 写入带 status='process' 条件，任务完成/失败后迟到的进度不会覆盖最终状态
+"""
+import logging
+import os
+import time
+from threading import Event, Lock, Thread
+
+from . import db
+
+# 进度写入配置
+FLUSH_INTERVAL = int(os.environ.get('PROGRESS_FLUSH_INTERVAL_MS', 2000)) / 1000.0  # 同一任务最短写入间隔
+MIN_DELTA = float(os.environ.get('PROGRESS_MIN_DELTA', 1.0))  # 按间隔写入的最小进度变化（%）
+STEP = float(os.environ.get('PROGRESS_STEP', 15.0))  # 进度增长超过该值立即写入（%）
+TAIL_START = float(os.environ.get('PROGRESS_TAIL_START', 90.0))  # 接近完成阶段的起点（%）
+TAIL_STEP = float(os.environ.get('PROGRESS_TAIL_STEP', 10.0))  # 接近完成阶段立即写入的步长（%）
+
+
+class _TaskProgress:
+    __slots__ = ('pending', 'forced', 'written', 'written_at')
+
+    def __init__(self):
+        self.pending = None  # 待写入的进度
+        self.forced = False  # 是否要求立即写入
+        self.written = 0.0  # 上次写入的进度
+        self.written_at = 0.0  # 上次写入时间（monotonic）
+
+
+class ProgressReporter:
+    """进程内共享的进度写入器"""
+
+    def __init__(self):
+        self._tasks = {}  # {task_id: _TaskProgress}
+        self._lock = Lock()
+        self._wakeup = Event()
+        self._thread = None
+
+    def report(self, translate_id, progress: float, force: bool = False):
+        """记录任务进度（不阻塞）"""
+        with self._lock:
+            state = self._tasks.get(translate_id)
+            if state is None:
+                state = self._tasks[translate_id] = _TaskProgress()
+            state.pending = progress
+            state.forced = state.forced or force
+            urgent = state.forced or _is_step(state.written, progress)
+            self._ensure_thread()
+        if urgent:
+            self._wakeup.set()
+
+    def finish(self, translate_id):
+        """任务结束，丢弃未写入的进度"""
+        with self._lock:
+            self._tasks.pop(translate_id, None)
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = Thread(target=self._run, daemon=True, name='progress-writer')
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(FLUSH_INTERVAL)
+            self._wakeup.clear()
+            for translate_id, value in self._collect_due():
+                self._write(translate_id, value)
+
+    def _collect_due(self):
+        """取出需要写入的进度（同一任务只取最新值）"""
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            for translate_id, state in self._tasks.items():
+                value = state.pending
+                if value is None:
+                    continue
+                if not (state.forced or _is_step(state.written, value) or
+                        (now - state.written_at >= FLUSH_INTERVAL and
+                         abs(value - state.written) >= MIN_DELTA)):
+                    continue
+                state.pending = None
+                state.forced = False
+                state.written = value
+                state.written_at = now
+                due.append((translate_id, value))
+        return due
+
+    @staticmethod
+    def _write(translate_id, value):
+        try:
+            db.execute("UPDATE translate SET process=%s WHERE id=%s AND status='process'",
+                       value, translate_id)
+            logging.info(f"[任务{translate_id}] 进度更新: {value}%")
+        except Exception as e:
+            logging.error(f"更新进度失败: {e}")
+
+
+def _is_step(last: float, current: float) -> bool:
+    """原 update_progress 的立即写入规则：首次进度、每STEP%、接近完成后每TAIL_STEP%"""
+    delta = current - last
+    return ((last == 0 and current > 0) or
+            delta >= STEP or
+            (current >= TAIL_START and delta >= TAIL_STEP))
+
+
+_reporter = ProgressReporter()
+
+
+def report(translate_id, progress: float, force: bool = False):
+    """记录任务进度，由后台线程合并写库"""
+    _reporter.report(translate_id, progress, force)
+
+
+def finish(translate_id):
+    """任务完成或失败时调用"""
+    _reporter.finish(translate_id)
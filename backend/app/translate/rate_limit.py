@@ -0,0 +1,238 @@
+# translate/rate_limit.py
+"""
+按接口的自适应限流
+- 按 (api_url, api_key, model) 进程内共享一个限流器，多任务共用同一密钥时协同退避
+- 令牌桶：每分钟请求数（RPM）与每分钟token数（TPM）
+- AIMD并发控制：成功时加性增加，429或延迟明显升高时乘性减少
+- 遵循 Retry-After 响应头，冷却期内该接口的所有调用一起等待
+- 带抖动的指数退避
+"""
+import asyncio
+import email.utils
+import logging
+import os
+import random
+import time
+from threading import Lock
+from typing import Optional, Tuple
+
+# 限流配置（0表示不限制）
+DEFAULT_RPM = int(os.environ.get('RATE_LIMIT_RPM', 0))
+DEFAULT_TPM = int(os.environ.get('RATE_LIMIT_TPM', 0))
+BAIDU_RPM = int(os.environ.get('BAIDU_RATE_LIMIT_RPM', 600))
+
+# AIMD并发配置
+INITIAL_CONCURRENCY = float(os.environ.get('RATE_LIMIT_INITIAL_CONCURRENCY', 8))
+MIN_CONCURRENCY = 1.0
+MAX_CONCURRENCY = float(os.environ.get('RATE_LIMIT_MAX_CONCURRENCY', 64))
+DECREASE_FACTOR = 0.5  # 429时的乘性减少系数
+SLOW_DECREASE_FACTOR = 0.9  # 延迟升高时的减少系数
+SLOW_LATENCY = 20.0  # 秒，超过该值且明显高于平均值视为变慢
+LATENCY_EWMA_ALPHA = 0.2
+
+# 退避配置
+BACKOFF_BASE = 2.0  # 秒
+BACKOFF_MAX = 60.0  # 秒
+DEFAULT_RETRY_AFTER = 5.0  # 429未返回Retry-After时的冷却时间
+POLL_INTERVAL = 0.05  # 等待许可时的最小轮询间隔
+
+
+class RateLimited(Exception):
+    """非OpenAI接口（如百度）返回的限流错误"""
+
+    def __init__(self, message, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Bucket:
+    """令牌桶，容量为每分钟配额"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """返回可扣减前需等待的秒数（不扣减）"""
+        if self.capacity <= 0:
+            return 0.0
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        if self.capacity > 0:
+            self.tokens -= min(amount, self.capacity)
+
+
+class EndpointLimiter:
+    """单个接口的限流器，线程与事件循环都可使用"""
+
+    def __init__(self, name: str, rpm: int = 0, tpm: int = 0):
+        self.name = name
+        self._lock = Lock()
+        self._requests = _Bucket(rpm)
+        self._tokens = _Bucket(tpm)
+        self._limit = INITIAL_CONCURRENCY
+        self._in_flight = 0
+        self._cooldown_until = 0.0
+        self._latency_ewma = None
+
+    @property
+    def concurrency(self) -> float:
+        return self._limit
+
+    def try_acquire(self, tokens: int = 0) -> float:
+        """
+        尝试获取许可
+        :return: 0表示已获取，否则为建议等待的秒数
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now < self._cooldown_until:
+                return self._cooldown_until - now
+            if self._in_flight >= int(self._limit):
+                return POLL_INTERVAL
+            wait = max(self._requests.wait_time(1, now), self._tokens.wait_time(tokens, now))
+            if wait > 0:
+                return max(wait, POLL_INTERVAL)
+            self._requests.take(1)
+            self._tokens.take(tokens)
+            self._in_flight += 1
+            return 0.0
+
+    def acquire(self, tokens: int = 0):
+        """阻塞获取许可（线程模式）"""
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: int = 0):
+        """获取许可（异步模式）"""
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def release(self, latency: float, rate_limited: bool = False,
+                retry_after: Optional[float] = None):
+        """归还许可并根据结果调整并发"""
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+
+            if rate_limited:
+                self._limit = max(MIN_CONCURRENCY, self._limit * DECREASE_FACTOR)
+                cooldown = retry_after if retry_after is not None else DEFAULT_RETRY_AFTER
+                self._cooldown_until = max(self._cooldown_until,
+                                           time.monotonic() + cooldown * random.uniform(1.0, 1.2))
+                logging.warning(
+                    f"[限流] {self.name} 触发限流，并发降至 {self._limit:.1f}，冷却 {cooldown:.1f} 秒")
+                return
+
+            average = self._latency_ewma
+            self._latency_ewma = latency if average is None else (
+                    LATENCY_EWMA_ALPHA * latency + (1 - LATENCY_EWMA_ALPHA) * average)
+
+            if average is not None and latency > SLOW_LATENCY and latency > 2 * average:
+                self._limit = max(MIN_CONCURRENCY, self._limit * SLOW_DECREASE_FACTOR)
+            else:
+                self._limit = min(MAX_CONCURRENCY, self._limit + 1.0 / self._limit)
+
+
+_limiters = {}
+_limiters_lock = Lock()
+
+
+def get_limiter(api_url: str, api_key: str, model: str,
+                rpm: Optional[int] = None, tpm: Optional[int] = None) -> EndpointLimiter:
+    """获取进程内共享的接口限流器"""
+    key = (api_url or '', api_key or '', model or '')
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = EndpointLimiter(
+                name=f"{api_url}|{model}",
+                rpm=DEFAULT_RPM if rpm is None else rpm,
+                tpm=DEFAULT_TPM if tpm is None else tpm,
+            )
+            _limiters[key] = limiter
+        return limiter
+
+
+def call(limiter: EndpointLimiter, tokens: int, fn):
+    """在限流器内执行同步调用"""
+    limiter.acquire(tokens)
+    start = time.monotonic()
+    try:
+        result = fn()
+    except Exception as e:
+        rate_limited, retry_after = classify_error(e)
+        limiter.release(time.monotonic() - start, rate_limited, retry_after)
+        raise
+    limiter.release(time.monotonic() - start)
+    return result
+
+
+async def call_async(limiter: EndpointLimiter, tokens: int, coro_fn):
+    """在限流器内执行异步调用"""
+    await limiter.acquire_async(tokens)
+    start = time.monotonic()
+    try:
+        result = await coro_fn()
+    except asyncio.CancelledError:
+        limiter.release(time.monotonic() - start)
+        raise
+    except Exception as e:
+        rate_limited, retry_after = classify_error(e)
+        limiter.release(time.monotonic() - start, rate_limited, retry_after)
+        raise
+    limiter.release(time.monotonic() - start)
+    return result
+
+
+def classify_error(e: Exception) -> Tuple[bool, Optional[float]]:
+    """
+    判断异常是否为限流错误
+    :return: (是否限流, Retry-After秒数)
+    """
+    if isinstance(e, RateLimited):
+        return True, e.retry_after
+    if getattr(e, 'status_code', None) != 429:
+        return False, None
+    response = getattr(e, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    return True, parse_retry_after(headers)
+
+
+def parse_retry_after(headers) -> Optional[float]:
+    """解析 retry-after-ms / retry-after 响应头"""
+    try:
+        value = headers.get('retry-after-ms')
+        if value:
+            return float(value) / 1000.0
+        value = headers.get('retry-after')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            retry_at = email.utils.parsedate_to_datetime(value)
+            return max(0.0, retry_at.timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """带抖动的指数退避时间（秒）"""
+    if retry_after is not None:
+        return retry_after + random.uniform(0, BACKOFF_BASE)
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** (attempt - 1)))
+    return random.uniform(delay / 2, delay)
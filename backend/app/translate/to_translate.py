@@ -1,5 +1,7 @@
 # translate/to_translate.py
+import json
 import logging
+import os
 import re
 import time
 import openai
@@ -7,61 +9,52 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 from threading import  Lock
 from . import common
 from . import db
+from . import cache
+from . import checkpoint
+from . import chunking
+from . import clients
+from . import glossary
+from . import progress
+from . import rate_limit
 
 # 重试配置
 MAX_RETRIES = 3
 RETRY_DELAY = 5  # 秒
 
-# 进度更新锁
-_progress_lock = Lock()
+# 翻译引擎：thread（每任务线程池）/ async（进程共享的asyncio引擎，见async_engine.py）
+ENGINE = os.environ.get('TRANSLATE_ENGINE', 'async').lower()
+
+# 多段打包配置：相邻短文本合并为一个请求，按JSON数组拆回
+# 文本块带 section 字段时只合并同一 section（如Word正文/同一表格/同一页眉页脚）的相邻块
+PACK_ENABLED = os.environ.get('TRANSLATE_PACK_ENABLED', 'true').lower() == 'true'
+PACK_TOKEN_BUDGET = int(os.environ.get('TRANSLATE_PACK_TOKEN_BUDGET', 0))  # 每包token上限，0为按模型（chunking.max_chunk_tokens）
+PACK_SEGMENT_RATIO = float(os.environ.get('TRANSLATE_PACK_SEGMENT_RATIO', 0.5))  # 可打包的单段最多占每包上限的比例
+PACK_MAX_SEGMENTS = int(os.environ.get('TRANSLATE_PACK_MAX_SEGMENTS', 50))  # 每包最大段数
 
-_last_reported_progress = {}  # 存储每个任务的上次报告进度 {task_id: progress}
+# 进度计数锁
+_progress_lock = Lock()
 
 
 def update_progress(texts, translate_id, force_update=False):
     """
-    智能更新翻译进度
+    更新翻译进度（由 progress 模块后台合并写库，写入阈值见 progress.py）
     :param texts: 文本块列表
     :param translate_id: 任务ID
     :param force_update: 是否强制更新（任务完成时使用）
     """
     total = len(texts)
-    completed = sum(1 for t in texts if t.get('complete', False))
-
     if total <= 0:
         return
 
-    current_progress = round((completed / total) * 100, 1)
-
-    with _progress_lock:
-        last_progress = _last_reported_progress.get(translate_id, 0)
-
-        # 进度更新条件：
-        # 1. 强制更新（任务完成/失败）
-        # 2. 进度增长超过15%
-        # 3. 首次更新（从0开始）
-        # 4. 接近完成时的特殊处理（90%以上每10%更新）
-        progress_delta = current_progress - last_progress
-
-        should_update = (
-                force_update or
-                progress_delta >= 15.0 or  # 每15%更新一次
-                (last_progress == 0 and current_progress > 0) or  # 首次进度
-                (current_progress >= 90 and progress_delta >= 10.0)  # 90%后每10%更新
-        )
-
-        if should_update:
-            try:
-                db.execute("UPDATE translate SET process=%s WHERE id=%s",
-                           current_progress, translate_id)
-                _last_reported_progress[translate_id] = current_progress
-                logging.info(f"[任务{translate_id}] 进度更新: {current_progress}%")
-            except Exception as e:
-                logging.error(f"更新进度失败: {e}")
+    completed = sum(1 for t in texts if t.get('complete', False))
+    progress.report(translate_id, round((completed / total) * 100, 1), force_update)
 
 
 def complete(trans, text_count, spend_time):
-    """标记任务完成"""
+    """标记任务完成（任务已被取消时不更新，结果以接手的worker为准）"""
+    if cancelled(trans):
+        logging.warning(f"[任务{trans['id']}] 任务已取消，不标记完成")
+        return
     try:
         translate_id = trans['id']
         target_filesize = 1
@@ -72,8 +65,10 @@ def complete(trans, text_count, spend_time):
             target_filesize, text_count, translate_id
         )
 
-        # 清理进度缓存
-        _last_reported_progress.pop(translate_id, None)
+        # 清理进度缓存和断点
+        progress.finish(translate_id)
+        cache.pop_stats(translate_id)
+        checkpoint.clear(translate_id)
 
         logging.info(f"[任务{translate_id}] 翻译完成")
 
@@ -87,7 +82,8 @@ def error(translate_id, message):
         message = str(message)[:500] if message else "未知错误"
 
         # 清理进度缓存
-        _last_reported_progress.pop(translate_id, None)
+        progress.finish(translate_id)
+        cache.pop_stats(translate_id)
 
         db.execute(
             "UPDATE translate SET failed_count=failed_count+1, status='failed', "
@@ -98,6 +94,26 @@ def error(translate_id, message):
         logging.error(f"更新失败状态失败: {e}")
 
 
+def cancelled(trans):
+    """任务是否已取消（worker心跳失败、任务已被回收给其他worker时由worker设置 trans['cancel_event']）"""
+    cancel = trans.get('cancel_event')
+    return cancel is not None and cancel.is_set()
+
+
+class _TaskEvent:
+    """处理器传入的中断事件叠加任务级取消事件：任一被设置即视为中断"""
+
+    def __init__(self, event, cancel):
+        self._event = event
+        self._cancel = cancel
+
+    def is_set(self):
+        return self._event.is_set() or self._cancel.is_set()
+
+    def set(self):
+        self._event.set()
+
+
 class TranslationError(Exception):
     """翻译异常基类"""
     pass
@@ -110,81 +126,132 @@ class FatalError(TranslationError):
 
 def translate_batch(trans, texts, event):
     """
-    批量翻译文本块（线程池模式）
+    批量翻译文本块（线程池模式，TRANSLATE_ENGINE=async 时交给异步引擎）
     :param trans: 翻译配置
     :param texts: 文本块列表
     :param event: 中断事件
     :return: 是否全部成功
     """
     translate_id = trans['id']
-    max_threads = common.parse_threads(trans.get('threads'))
+    if trans.get('cancel_event') is not None:
+        event = _TaskEvent(event, trans['cancel_event'])
+    if event.is_set():
+        return False
 
-    # 过滤需要翻译的文本块索引
-    to_translate_indices = [
-        i for i, t in enumerate(texts)
-        if not t.get('complete', False) and not t.get('skip', False)
-    ]
+    # 断点续译：回填上次运行已完成的文本块，完成的块批量写入断点
+    checkpoint.restore(translate_id, texts)
+    checkpoints = checkpoint.Writer(translate_id)
+    try:
+        if ENGINE == 'async' and trans.get('server', 'openai') != 'baidu':
+            from . import async_engine
+            return async_engine.translate_batch(trans, texts, event, checkpoints)
+        return _translate_batch_threaded(trans, texts, event, checkpoints)
+    finally:
+        # 已取消的任务由接手的worker续译，不再写断点
+        if not cancelled(trans):
+            checkpoints.flush()
 
-    if not to_translate_indices:
-        return True
 
-    logging.info(
-        f"[任务{translate_id}] 开始翻译 {len(to_translate_indices)} 个文本块，线程数: {max_threads}")
+def _translate_batch_threaded(trans, texts, event, checkpoints):
+    """线程池模式的批量翻译"""
+    translate_id = trans['id']
+    max_threads = common.parse_threads(trans.get('threads'))
+
+    total_count, packs, single_groups = _plan_batch(trans, texts)
+    if not total_count:
+        return True
 
     has_fatal_error = False
     completed_count = 0
-    total_count = len(to_translate_indices)
 
-    def translate_single(index):
-        """翻译单个文本块"""
-        nonlocal has_fatal_error, completed_count
+    def mark_done(indices, result):
+        """回填翻译结果并更新进度（重复块一并计入）"""
+        nonlocal completed_count
+        if cancelled(trans):
+            return
+        flush = False
+        for index in indices:
+            flush = checkpoints.add(texts[index], result) or flush
+            texts[index]['text'] = result['translated_text']
+            texts[index]['count'] = result['count']
+            texts[index]['complete'] = True
+
+        with _progress_lock:
+            completed_count += len(indices)
+            report_progress(translate_id, completed_count, total_count,
+                            trans.get('progress_span'))
+
+        if flush:
+            checkpoints.flush()
+
+    def mark_fatal(e):
+        nonlocal has_fatal_error
+        logging.error(f"[任务{translate_id}] 致命错误: {str(e)}")
+        has_fatal_error = True
+        if not cancelled(trans):
+            error(translate_id, str(e))
+        event.set()
+
+    def translate_single(indices):
+        """翻译一组相同的文本块"""
+        nonlocal completed_count
 
         if event.is_set() or has_fatal_error:
             return False
 
-        text_item = texts[index]
+        text_item = texts[indices[0]]
 
         try:
             result = _translate_text_block(trans, text_item)
-            text_item['text'] = result['translated_text']
-            text_item['count'] = result['count']
-            text_item['complete'] = True
-
-            # 更新进度
-            with _progress_lock:
-                completed_count += 1
-                progress = round((completed_count / total_count) * 100, 1)
-                db.execute("UPDATE translate SET process=%s WHERE id=%s", progress, translate_id)
-
+            mark_done(indices, result)
             return True
 
         except FatalError as e:
-            logging.error(f"[任务{translate_id}] 致命错误: {str(e)}")
-            has_fatal_error = True
-            error(translate_id, str(e))
-            event.set()
+            mark_fatal(e)
             return False
 
         except Exception as e:
-            logging.error(f"[任务{translate_id}] 文本块{index}翻译失败，保留原文: {str(e)}")
-            text_item['complete'] = True
-            text_item['count'] = count_text(text_item.get('text', ''))
+            logging.error(
+                f"[任务{translate_id}] 文本块{indices[0]}翻译失败，保留原文"
+                f"（共{len(indices)}处）: {str(e)}")
+            for index in indices:
+                texts[index]['complete'] = True
+                texts[index]['count'] = count_text(texts[index].get('text', ''))
 
             with _progress_lock:
-                completed_count += 1
+                completed_count += len(indices)
 
             return True  # 保留原文，继续处理其他块
 
+    def translate_pack(pack):
+        """打包翻译多组短文本，解析失败的段回退为单段请求"""
+        if event.is_set() or has_fatal_error:
+            return False
+
+        try:
+            results = _translate_text_pack(trans, [texts[g[0]].get('text', '') for g in pack])
+        except FatalError as e:
+            mark_fatal(e)
+            return False
+        except Exception as e:
+            logging.warning(f"[任务{translate_id}] 打包翻译异常，回退单段翻译: {e}")
+            results = [None] * len(pack)
+
+        for indices, result in zip(pack, results):
+            if result is not None:
+                mark_done(indices, result)
+            elif not translate_single(indices):
+                return False
+        return True
+
     # 使用线程池执行
     with ThreadPoolExecutor(max_workers=max_threads) as executor:
         # 提交所有任务
-        future_to_index = {
-            executor.submit(translate_single, idx): idx
-            for idx in to_translate_indices
-        }
+        futures = [executor.submit(translate_pack, pack) for pack in packs]
+        futures += [executor.submit(translate_single, indices) for indices in single_groups]
 
         # 等待完成
-        for future in as_completed(future_to_index):
+        for future in as_completed(futures):
             if event.is_set() or has_fatal_error:
                 # 取消剩余任务
                 executor.shutdown(wait=False, cancel_futures=True)
@@ -195,9 +262,125 @@ def translate_batch(trans, texts, event):
             except Exception as e:
                 logging.error(f"[任务{translate_id}] 线程执行异常: {e}")
 
+    stats = cache.get_stats(translate_id)
+    logging.info(
+        f"[任务{translate_id}] 翻译记忆命中 {stats['hit']} 次，未命中 {stats['miss']} 次")
+
     return not has_fatal_error
 
 
+def _plan_batch(trans, texts):
+    """
+    规划批量翻译：过滤待翻译块、去重、打包
+    :return: (待翻译块数, 打包列表, 单独翻译的分组列表)
+    """
+    translate_id = trans['id']
+
+    # 过滤需要翻译的文本块索引
+    to_translate_indices = [
+        i for i, t in enumerate(texts)
+        if not t.get('complete', False) and not t.get('skip', False)
+    ]
+
+    if not to_translate_indices:
+        return 0, [], []
+
+    # 提前构建术语索引（异步引擎在工作线程中规划，避免在共享的事件循环中构建）
+    _terms_index(trans)
+
+    # 相同文本只请求一次，结果回填到所有重复块
+    groups = _group_duplicate_indices(texts, to_translate_indices)
+    total_count = len(to_translate_indices)
+    unique_count = len(groups)
+    dedup_ratio = round((1 - unique_count / total_count) * 100, 1)
+
+    logging.info(
+        f"[任务{translate_id}] 开始翻译 {total_count} 个文本块，去重后 {unique_count} 个"
+        f"（去重率 {dedup_ratio}%），引擎: {ENGINE}")
+
+    # 短文本打包，长文本单独请求
+    packs, single_groups = _build_packs(trans, texts, groups)
+    if packs:
+        logging.info(
+            f"[任务{translate_id}] 打包模式: {sum(len(p) for p in packs)} 个短文本合并为 "
+            f"{len(packs)} 个请求")
+
+    return total_count, packs, single_groups
+
+
+def report_progress(translate_id, completed_count, total_count, span=None):
+    """
+    记录批量翻译进度（不阻塞，后台合并写库）
+    :param span: (起点, 跨度) 分批翻译时本批对应的整体进度区间（%），默认 (0, 100)
+    """
+    base, width = span or (0, 100)
+    progress.report(translate_id, round(base + completed_count / total_count * width, 1))
+
+
+def _group_duplicate_indices(texts, indices):
+    """
+    按文本内容分组待翻译块索引
+    :return: 索引分组列表，每组文本相同，保持首次出现顺序
+    """
+    groups = {}
+    for index in indices:
+        groups.setdefault(texts[index].get('text', ''), []).append(index)
+    return list(groups.values())
+
+
+def _build_packs(trans, texts, groups):
+    """
+    将相邻的短文本分组按模型token预算打包，不跨 section
+    :return: (打包列表[[indices, ...], ...], 单独翻译的分组列表)
+    """
+    if not PACK_ENABLED or trans.get('server', 'openai') == 'baidu':
+        return [], groups
+
+    chunker = chunking.get_chunker(trans)
+    budget = PACK_TOKEN_BUDGET or chunker.max_tokens
+    max_segment_tokens = max(1, int(budget * PACK_SEGMENT_RATIO))
+
+    packs = []
+    singles = []
+    current = []
+    current_tokens = 0
+    current_section = None
+
+    for indices in groups:
+        item = texts[indices[0]]
+        text = item.get('text', '')
+        if not text or not text.strip():
+            singles.append(indices)
+            continue
+
+        tokens = chunker.count(text)
+        if tokens > max_segment_tokens:
+            singles.append(indices)
+            continue
+
+        section = item.get('section')
+        if current and (section != current_section
+                        or current_tokens + tokens > budget
+                        or len(current) >= PACK_MAX_SEGMENTS):
+            packs.append(current)
+            current = []
+            current_tokens = 0
+
+        current.append(indices)
+        current_tokens += tokens
+        current_section = section
+
+    if current:
+        packs.append(current)
+
+    # 只有一段的包没有打包意义
+    for pack in [p for p in packs if len(p) == 1]:
+        packs.remove(pack)
+        singles.append(pack[0])
+
+    return packs, singles
+
+
 def get(trans, event, texts, index):
     """
     翻译单个文本块的入口函数（兼容旧接口）
@@ -254,7 +437,7 @@ def _translate_text_block(trans, text_item):
 
     # 百度翻译没有备用模型的概念
     if server == 'baidu':
-        result = _try_translate_with_retries(trans, text_item, 'baidu')
+        result = _translate_with_cache(trans, text_item, 'baidu')
         if result:
             return result
         raise FatalError("百度翻译失败")
@@ -264,7 +447,7 @@ def _translate_text_block(trans, text_item):
         backup_model = trans.get('backup_model')
 
         # 尝试主模型
-        result = _try_translate_with_retries(trans, text_item, model)
+        result = _translate_with_cache(trans, text_item, model)
         if result:
             return result
 
@@ -272,7 +455,7 @@ def _translate_text_block(trans, text_item):
         if backup_model and backup_model.strip():
             logging.info(f"[任务{trans['id']}] 主模型{model}失败，切换到备用模型{backup_model}")
             time.sleep(RETRY_DELAY)
-            result = _try_translate_with_retries(trans, text_item, backup_model)
+            result = _translate_with_cache(trans, text_item, backup_model)
             if result:
                 return result
 
@@ -280,6 +463,175 @@ def _translate_text_block(trans, text_item):
         raise FatalError(f"主模型和备用模型均失败，最后使用模型: {backup_model or model}")
 
 
+def cache_key(trans, text, model):
+    """生成文本在当前任务配置下的翻译记忆缓存键"""
+    if trans.get('server', 'openai') == 'baidu':
+        prompt = 'baidu_terms' if trans.get('use_baidu_terms') else ''
+        matched_terms = None
+    else:
+        # Markdown会追加格式要求，扩展名也参与缓存键
+        prompt = f"{trans.get('prompt', '')}\x1f{trans.get('extension', '').lower()}"
+        matched_terms = _match_terms(trans, text)
+
+    return cache.make_key(text, trans.get('lang', ''), model, prompt, matched_terms)
+
+
+def _translate_with_cache(trans, text_item, model):
+    """
+    先查询翻译记忆缓存，未命中时调用模型翻译并写入缓存
+    :return: 成功返回结果dict，失败返回None
+    """
+    original_text = text_item.get('text', '')
+
+    key = cache_key(trans, original_text, model)
+    cached = cache.get(key, trans['id'])
+    if cached:
+        return {'translated_text': cached['translated_text'],
+                'count': cached.get('count', count_text(original_text))}
+
+    result = _try_translate_with_retries(trans, text_item, model)
+    if result:
+        cache.put(key, result)
+    return result
+
+
+def _translate_text_pack(trans, pack_texts):
+    """
+    打包翻译多段短文本（仅主模型），命中缓存的段不再请求
+    :return: 与pack_texts等长的列表，元素为结果dict或None（需回退单段翻译）
+    """
+    model = trans.get('model')
+
+    results = [None] * len(pack_texts)
+    keys = []
+    pending = []
+
+    for i, text in enumerate(pack_texts):
+        key = cache_key(trans, text, model)
+        keys.append(key)
+        cached = cache.get(key, trans['id'])
+        if cached:
+            results[i] = {'translated_text': cached['translated_text'],
+                          'count': cached.get('count', count_text(text))}
+        else:
+            pending.append(i)
+
+    # 只剩一段未命中时交给单段翻译
+    if len(pending) <= 1:
+        return results
+
+    translated = _try_translate_pack_with_retries(trans, [pack_texts[i] for i in pending], model)
+    if translated is None:
+        return results
+
+    for i, text in zip(pending, translated):
+        if text is None:
+            continue
+        result = {'translated_text': text, 'count': count_text(pack_texts[i])}
+        results[i] = result
+        cache.put(keys[i], result)
+
+    return results
+
+
+def _try_translate_pack_with_retries(trans, segments, model):
+    """
+    打包请求，校验返回段数
+    :return: 与segments等长的译文列表（无效段为None），整体失败返回None
+    """
+    translate_id = trans['id']
+
+    for attempt in range(1, MAX_RETRIES + 1):
+        try:
+            logging.info(
+                f"[任务{translate_id}] 打包翻译 {len(segments)} 段，模型{model}，第{attempt}次请求")
+            content = _translate_openai_pack(trans, segments, model)
+            translated = parse_pack_response(content, len(segments))
+            if translated is None:
+                logging.warning(f"[任务{translate_id}] 打包结果段数不匹配或无法解析，回退单段翻译")
+                return None
+
+            return [
+                t.strip() if _is_valid_translation(t) else None
+                for t in translated
+            ]
+
+        except openai.RateLimitError as e:
+            logging.warning(f"[任务{translate_id}] 速率限制，等待后重试: {e}")
+            time.sleep(rate_limit.backoff_delay(attempt))
+            continue
+
+        except openai.AuthenticationError as e:
+            raise FatalError(f"API密钥无效: {e}")
+
+        except Exception as e:
+            logging.warning(f"[任务{translate_id}] 打包翻译异常: {e}")
+            return None
+
+    return None
+
+
+def _translate_openai_pack(trans, segments, model):
+    """以JSON数组形式调用OpenAI兼容API翻译多段文本"""
+    return _chat_completion(trans, model, build_pack_messages(trans, segments))
+
+
+def build_pack_messages(trans, segments):
+    """构建打包翻译的消息"""
+    target_lang = trans.get('lang', '英语')
+    base_prompt = trans.get('prompt', '')
+    extension = trans.get('extension', '').lower()
+
+    # 合并所有段匹配到的术语
+    final_prompt = _inject_matched_terms(trans, '\n'.join(segments), base_prompt, target_lang)
+
+    if extension == '.md':
+        final_prompt += "\n请保持Markdown格式不变，只翻译文本内容。"
+
+    final_prompt += (
+        f"\n\n输入是一个包含{len(segments)}个字符串的JSON数组（多为文档中相邻的段落），请逐条翻译每个字符串。"
+        f"只返回一个包含{len(segments)}个译文字符串的JSON数组，顺序与输入一一对应，"
+        "不要合并或拆分条目，不要输出任何其他内容。"
+    )
+
+    return [
+        {"role": "system", "content": final_prompt},
+        {"role": "user", "content": json.dumps(segments, ensure_ascii=False)}
+    ]
+
+
+def parse_pack_response(content, expected):
+    """
+    解析打包翻译返回的JSON数组
+    :return: 字符串列表，段数不符或无法解析时返回None
+    """
+    if not content:
+        return None
+
+    content = content.strip()
+    # 去除Markdown代码块包裹
+    fence = re.match(r'^```(?:json)?\s*([\s\S]*?)\s*```$', content)
+    if fence:
+        content = fence.group(1)
+
+    start = content.find('[')
+    end = content.rfind(']')
+    if start == -1 or end <= start:
+        return None
+
+    try:
+        data = json.loads(content[start:end + 1])
+    except ValueError:
+        return None
+
+    if not isinstance(data, list) or len(data) != expected:
+        return None
+    if not all(isinstance(item, str) for item in data):
+        return None
+
+    return data
+
+
 def _try_translate_with_retries(trans, text_item, model):
     """
     使用指定模型重试翻译
@@ -304,7 +656,7 @@ def _try_translate_with_retries(trans, text_item, model):
             if not _is_valid_translation(translated):
                 logging.warning(
                     f"类型: {trans.get('server', '')}——[任务{translate_id}] 翻译结果无效: {translated[:50] if translated else 'None'}...")
-                time.sleep(RETRY_DELAY)
+                time.sleep(rate_limit.backoff_delay(attempt))
                 continue
 
             # 过滤deepseek思考标签
@@ -312,9 +664,10 @@ def _try_translate_with_retries(trans, text_item, model):
 
             return {'translated_text': translated, 'count': count_text(original_text)}
 
-        except openai.RateLimitError as e:
+        except (openai.RateLimitError, rate_limit.RateLimited) as e:
+            # 限流器已按Retry-After冷却该接口，这里只做带抖动的退避
             logging.warning(f"[任务{translate_id}] 速率限制，等待后重试: {e}")
-            time.sleep(RETRY_DELAY * attempt * 2)  # 递增等待，限速时等待更长
+            time.sleep(rate_limit.backoff_delay(attempt))
             continue
 
         except openai.AuthenticationError as e:
@@ -322,12 +675,12 @@ def _try_translate_with_retries(trans, text_item, model):
 
         except openai.APIConnectionError as e:
             logging.warning(f"[任务{translate_id}] 连接错误: {e}")
-            time.sleep(RETRY_DELAY)
+            time.sleep(rate_limit.backoff_delay(attempt))
             continue
 
         except Exception as e:
             logging.warning(f"[任务{translate_id}] 翻译异常: {e}")
-            time.sleep(RETRY_DELAY)
+            time.sleep(rate_limit.backoff_delay(attempt))
             continue
 
     return None  # 所有重试失败
@@ -335,6 +688,11 @@ def _try_translate_with_retries(trans, text_item, model):
 
 def _translate_openai(trans, text, model):
     """调用OpenAI兼容API翻译"""
+    return _chat_completion(trans, model, build_messages(trans, text, model))
+
+
+def build_messages(trans, text, model=None):
+    """构建单段翻译的消息"""
     target_lang = trans.get('lang', '英语')
     base_prompt = trans.get('prompt', '')
     extension = trans.get('extension', '').lower()
@@ -346,24 +704,52 @@ def _translate_openai(trans, text, model):
     if extension == '.md':
         final_prompt += "\n请保持Markdown格式不变，只翻译文本内容。"
 
-    messages = [
+    print(f"[任务{trans['id']}] 模型{model} ，提示词: {final_prompt}")
+
+    return [
         {"role": "system", "content": final_prompt},
         {"role": "user", "content": text}
     ]
-    print(f"[任务{trans['id']}] 模型{model} ，提示词: {final_prompt}")
+
+
+def _chat_completion(trans, model, messages):
+    """经接口限流器发送chat completion请求，返回消息内容"""
     # 禁用日志
     logging.getLogger("openai").setLevel(logging.WARNING)
     logging.getLogger("httpx").setLevel(logging.WARNING)
 
-    response = openai.chat.completions.create(
-        model=model,
-        messages=messages,
-        temperature=0.7
+    client = get_client(trans)
+    limiter = get_limiter(trans, model)
+    response = rate_limit.call(
+        limiter, estimate_request_tokens(messages, model),
+        lambda: client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0.7
+        )
     )
 
     return response.choices[0].message.content
 
 
+def get_limiter(trans, model):
+    """获取任务所用接口的限流器"""
+    return rate_limit.get_limiter(trans.get('api_url'), trans.get('api_key'), model)
+
+
+def estimate_request_tokens(messages, model=None):
+    """估算一次请求消耗的token（输入 + 约等长的输出），与文本切分、打包使用同一计数（chunking.Chunker.count）"""
+    chunker = chunking.Chunker(model)
+    user_tokens = 0
+    total = 0
+    for message in messages:
+        tokens = chunker.count(message.get('content') or '')
+        total += tokens
+        if message.get('role') == 'user':
+            user_tokens += tokens
+    return total + user_tokens
+
+
 def _translate_baidu(trans, text):
     """调用百度翻译API"""
     from .baidu.main import baidu_translate
@@ -383,29 +769,13 @@ def _translate_baidu(trans, text):
 def _inject_matched_terms(trans, text, base_prompt, target_lang):
     """
     动态匹配术语并注入prompt
-    使用正则表达式精确匹配术语（单词边界）
+    使用术语索引匹配（单词边界/词组边界/中英混合）
     """
-    terms_dict = trans.get('terms_dict')
-    if not terms_dict:
-        logging.debug("无术语库数据，跳过术语匹配")
-        return base_prompt.replace("{target_lang}", target_lang)
-
-    matched_terms = []
-
-
-    for term_pair in terms_dict:
-        source_term = term_pair['source']
-        target_term = term_pair['target']
-
-        if _is_term_matched_in_text(source_term, text):
-            matched_terms.append(f"{source_term} → {target_term}")
-            logging.debug(f"匹配到术语: {source_term} → {target_term}")
+    matched_terms = _match_terms(trans, text)
 
     # 构建最终prompt
     if matched_terms:
-        # 去重（防止重复术语）
-        unique_terms = list(dict.fromkeys(matched_terms))
-        terms_section = "【术语翻译对照表如下】\n" + "\n".join(unique_terms)
+        terms_section = "【术语翻译对照表如下】\n" + "\n".join(matched_terms)
         full_prompt = f"{terms_section}\n\n{base_prompt}"
     else:
         full_prompt = base_prompt
@@ -414,130 +784,26 @@ def _inject_matched_terms(trans, text, base_prompt, target_lang):
     return full_prompt.replace("{target_lang}", target_lang)
 
 
-def _is_term_matched_in_text(source_term, text):
-    """
-    检查术语是否在文本中精确匹配
-    使用多种匹配策略以提高准确性
-    """
-    if not source_term or not text:
-        return False
-
-    source_term = source_term.strip()
-    if not source_term:
-        return False
-
-    # 策略1：单词边界匹配（适用于英文单词）
-    if _is_word_boundary_match(source_term, text):
-        return True
-
-    # 策略2：完整词组匹配（适用于中文词组、专业术语）
-    if _is_phrase_match(source_term, text):
-        return True
-
-    # 策略3：混合语言匹配（适用于中英混合术语）
-    if _is_mixed_language_match(source_term, text):
-        return True
-
-    return False
-
-
-def _is_word_boundary_match(source_term, text):
-    """
-    单词边界匹配：使用\b进行精确单词匹配
-    适用于：API, JSON, HTTP, database 等英文术语
-    """
-    try:
-        # 转义特殊字符
-        escaped_term = re.escape(source_term)
-
-        # 构建单词边界模式
-        pattern = r'\b' + escaped_term + r'\b'
-
-        # 不区分大小写匹配
-        return bool(re.search(pattern, text, re.IGNORECASE))
-
-    except Exception as e:
-        logging.warning(f"单词边界匹配失败: {e}")
-        return False
-
-
-def _is_phrase_match(source_term, text):
-    """
-    词组匹配：适用于中文词组或多词术语
-    使用标点符号和空白作为边界
-    适用于：人工智能、机器学习、REST API 等
-    """
-    try:
-        # 转义特殊字符
-        escaped_term = re.escape(source_term)
-
-        # 定义词组边界：空白、标点符号、行首行尾
-        boundary = r'(?:^|[\s\p{P}])'  # 开始边界
-        end_boundary = r'(?=[\s\p{P}]|$)'  # 结束边界
-
-        # 构建词组模式
-        pattern = boundary + escaped_term + end_boundary
-
-        # 不区分大小写匹配
-        return bool(re.search(pattern, text, re.IGNORECASE))
-
-    except Exception:
-        # 如果正则表达式不支持\p{P}，使用常见标点符号
-        try:
-            escaped_term = re.escape(source_term)
-            punctuation = r'[\s.,!?;:()\[\]{}"\'`~@#$%^&*+=|\\/<>，。！？；：（）【】{}""''`～@#￥%…&*+=|\\/<>]'
-            boundary = r'(?:^|' + punctuation + r')'
-            end_boundary = r'(?=' + punctuation + r'|$)'
-            pattern = boundary + escaped_term + end_boundary
-
-            return bool(re.search(pattern, text, re.IGNORECASE))
-        except Exception as e:
-            logging.warning(f"词组匹配失败: {e}")
-            return False
-
-
-def _is_mixed_language_match(source_term, text):
+def _match_terms(trans, text):
     """
-    混合语言匹配：适用于中英混合的术语
-    如：API接口、JSON数据、HTTP请求 等
+    匹配文本中出现的术语（使用任务的术语索引，见 glossary.py）
+    :return: 去重后的 "源术语 → 目标术语" 列表
     """
-    try:
-        # 将术语按中英文拆分
-        parts = _split_mixed_term(source_term)
-        if len(parts) <= 1:
-            return False
-
-        # 检查各部分是否都存在且顺序正确
-        current_pos = 0
-        text_lower = text.lower()
-
-        for part in parts:
-            part_lower = part.lower()
-            pos = text_lower.find(part_lower, current_pos)
-            if pos == -1:
-                return False
-            current_pos = pos + len(part)
+    index = _terms_index(trans)
+    if index is None:
+        logging.debug("无术语库数据，跳过术语匹配")
+        return []
 
-        return True
+    return index.match(text)
 
-    except Exception as e:
-        logging.warning(f"混合语言匹配失败: {e}")
-        return False
 
+def _terms_index(trans):
+    """任务的术语索引，未预先构建索引的调用方首次使用时构建并复用；无术语库时返回None"""
+    index = trans.get('terms_index')
+    if index is None and trans.get('terms_dict'):
+        index = trans['terms_index'] = glossary.build_index(trans['terms_dict'])
+    return index
 
-def _split_mixed_term(term):
-    """
-    拆分中英混合术语
-    例如：API接口 -> ["API", "接口"]
-    """
-    import re
-
-    # 按中英文字符边界拆分
-    pattern = r'([a-zA-Z]+|[\u4e00-\u9fff]+|[0-9]+)'
-    parts = re.findall(pattern, term)
-
-    # 过滤空字符串和单字符
-    return [p for p in parts if len(p.strip()) > 0]
 
 def _is_valid_translation(content):
     """验证翻译结果是否有效"""
@@ -570,26 +836,30 @@ def count_text(text):
 
 
 def init_openai(url, key):
-    """初始化OpenAI配置"""
-    openai.api_key = key
-    if not url.endswith("/v1/"):
-        if url.endswith("/v1"):
-            url = url + "/"
-        elif url.endswith("/"):
-            url = url + "v1/"
-        else:
-            url = url + "/v1/"
-    openai.base_url = url
+    """
+    获取任务使用的OpenAI客户端（按接口隔离，不修改openai全局配置）
+    :return: OpenAI客户端，调用方放入 trans['client']
+    """
+    return clients.get_client(url, key)
+
+
+def get_client(trans):
+    """获取任务的OpenAI客户端"""
+    client = trans.get('client')
+    if client is None:
+        client = clients.get_client(trans.get('api_url'), trans.get('api_key'))
+        trans['client'] = client
+    return client
 
 
-def check(model):
+def check(model, client):
     """检查模型可用性"""
     try:
         message = [
             {"role": "system", "content": "测试"},
             {"role": "user", "content": "你好"}
         ]
-        openai.chat.completions.create(model=model, messages=message, max_tokens=10)
+        client.chat.completions.create(model=model, messages=message, max_tokens=10)
         return "OK"
     except openai.AuthenticationError:
         return "API密钥无效"
@@ -4,20 +4,38 @@ TXT文件翻译处理器
 分块策略：
 1. 按空行分割段落
 2. 保持段落完整性
-3. 超长段落按句子边界切分
+3. 超过模型token上限的段落按句子边界切分
 4. 跳过纯标点/数字行
+
+大文件（超过 TXT_STREAM_THRESHOLD_MB）流式处理：
+- 按开头样本检测编码后流式校验整个文件，无法完整解码时换用其他编码，按校验通过的编码严格解码
+- 逐行读取、按段落产出（分段规则与一次性读取时相同），每累积 TXT_STREAM_WINDOW 个文本块为一个窗口，
+  最多 TXT_STREAM_INFLIGHT 个窗口同时翻译，译完按原顺序追加写入目标文件，内存占用与文件大小无关
+- 无空行的超长文本按 MAX_PARAGRAPH_CHARS 截为多段翻译，写出时保留截断处原有的空白
 """
 
+import os
 import re
 import datetime
 import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from threading import Event
-from typing import List, Dict, Tuple
+from typing import List, Dict, Iterator, Optional, Tuple
 from . import to_translate
 from . import common
+from .chunking import Chunker, get_chunker
+
+# 候选编码（按顺序尝试）
+ENCODINGS = ['utf-8', 'gbk', 'gb2312', 'gb18030', 'big5', 'iso-8859-1']
+ENCODING_SAMPLE_SIZE = 1024 * 1024  # 检测编码读取的字节数
 
-# 分块配置
-MAX_CHUNK_SIZE = 2000
+# 流式处理配置
+STREAM_THRESHOLD = int(os.environ.get('TXT_STREAM_THRESHOLD_MB', 20)) * 1024 * 1024  # 超过该大小的文件流式翻译
+STREAM_WINDOW = int(os.environ.get('TXT_STREAM_WINDOW', 500))  # 每个翻译窗口的文本块数
+STREAM_INFLIGHT = int(os.environ.get('TXT_STREAM_INFLIGHT', 2))  # 同时翻译的窗口数
+MAX_LINE_CHARS = 64 * 1024  # 单次读取的最大字符数（超长行分多次读取）
+MAX_PARAGRAPH_CHARS = 1024 * 1024  # 无空行的超长文本按该长度截为多个段落
 
 
 def start(trans: Dict) -> bool:
@@ -29,6 +47,14 @@ def start(trans: Dict) -> bool:
     translate_id = trans['id']
     start_time = datetime.datetime.now()
 
+    try:
+        if os.path.getsize(trans['file_path']) > STREAM_THRESHOLD:
+            return _start_streaming(trans, start_time)
+    except OSError as e:
+        logging.error(f"[任务{translate_id}] 读取文件失败: {e}")
+        to_translate.error(translate_id, f"读取文件失败: {str(e)}")
+        return False
+
     # 读取文件
     try:
         content, encoding = _read_file(trans['file_path'])
@@ -44,7 +70,7 @@ def start(trans: Dict) -> bool:
         return True
 
     # 智能分块
-    texts = _smart_chunk(content)
+    texts = _smart_chunk(content, get_chunker(trans))
 
     # 统计需要翻译的块数
     to_translate_count = sum(1 for t in texts if not t.get('skip', False))
@@ -80,20 +106,25 @@ def start(trans: Dict) -> bool:
 
 def _read_file(file_path: str) -> Tuple[str, str]:
     """
-    读取文件内容，尝试多种编码
+    读取文件内容，按开头样本检测编码
     :return: (内容, 使用的编码)
     """
-    encodings = ['utf-8', 'utf-8-sig', 'gbk', 'gb2312', 'gb18030', 'big5', 'iso-8859-1']
-
-    for encoding in encodings:
+    encoding = common.detect_encoding(file_path, ENCODINGS, ENCODING_SAMPLE_SIZE)
+    try:
+        with open(file_path, 'r', encoding=encoding) as f:
+            return f.read(), encoding
+    except UnicodeDecodeError:
+        pass
+
+    # 样本之后出现无法解码的内容，逐个尝试其他编码
+    for fallback in ENCODINGS:
+        if fallback == encoding:
+            continue
         try:
-            with open(file_path, 'r', encoding=encoding) as f:
-                content = f.read()
-            return content, encoding
+            with open(file_path, 'r', encoding=fallback) as f:
+                return f.read(), fallback
         except UnicodeDecodeError:
             continue
-        except Exception as e:
-            raise
 
     raise ValueError("无法识别文件编码")
 
@@ -104,7 +135,7 @@ def _write_file(file_path: str, content: str):
         f.write(content)
 
 
-def _smart_chunk(content: str) -> List[Dict]:
+def _smart_chunk(content: str, chunker: Chunker) -> List[Dict]:
     """
     智能分块策略：
     1. 按空行分割成段落
@@ -127,29 +158,36 @@ def _smart_chunk(content: str) -> List[Dict]:
             texts.append(_make_text_item('', skip=True, is_separator=True))
             continue
 
-        # 检查是否需要翻译
-        if not _should_translate(para):
-            texts.append(_make_text_item(para, skip=True))
-            continue
-
-        # 检查长度
-        if len(para) <= MAX_CHUNK_SIZE:
-            # 段落不超过限制，整段作为一个块
-            texts.append(_make_text_item(para))
-        else:
-            # 超长段落，按句子边界切分
-            sub_chunks = _split_by_sentences(para, MAX_CHUNK_SIZE)
-            for i, chunk in enumerate(sub_chunks):
-                texts.append(_make_text_item(
-                    chunk,
-                    is_sub=True,
-                    sub_index=i,
-                    sub_total=len(sub_chunks)
-                ))
+        texts.extend(_paragraph_items(para, chunker))
 
     return texts
 
 
+def _paragraph_items(para: str, chunker: Chunker, uid: str = None) -> List[Dict]:
+    """将一个段落转换为文本块（超过token上限时按句子边界切分）"""
+    # 检查是否需要翻译
+    if not _should_translate(para):
+        return [_make_text_item(para, skip=True)]
+
+    # 检查token数
+    if chunker.fits(para):
+        # 段落不超过限制，整段作为一个块
+        item = _make_text_item(para)
+        if uid:
+            item['_uid'] = uid
+        return [item]
+
+    # 超长段落，按句子边界切分
+    sub_chunks = chunker.split(para, strip=True)
+    items = []
+    for i, chunk in enumerate(sub_chunks):
+        item = _make_text_item(chunk, is_sub=True, sub_index=i, sub_total=len(sub_chunks))
+        if uid:
+            item['_uid'] = f"{uid}_{i}"
+        items.append(item)
+    return items
+
+
 def _should_translate(text: str) -> bool:
     """判断文本是否需要翻译"""
     if not text or not text.strip():
@@ -168,65 +206,6 @@ def _should_translate(text: str) -> bool:
     return True
 
 
-def _split_by_sentences(text: str, max_size: int) -> List[str]:
-    """
-    按句子边界切分长文本
-    优先保持句子完整性
-    """
-    # 句子结束标记（中英文）
-    sentence_endings = r'([.!?。！？；;][\s]*)'
-
-    # 按句子分割，保留分隔符
-    parts = re.split(sentence_endings, text)
-
-    # 重新组合（句子+标点）
-    sentences = []
-    i = 0
-    while i < len(parts):
-        sentence = parts[i]
-        # 如果下一个是标点，合并
-        if i + 1 < len(parts) and re.match(sentence_endings, parts[i + 1]):
-            sentence += parts[i + 1]
-            i += 2
-        else:
-            i += 1
-        if sentence.strip():
-            sentences.append(sentence)
-
-    # 合并句子直到接近max_size
-    chunks = []
-    current_chunk = ""
-
-    for sentence in sentences:
-        # 单个句子就超过限制，需要强制切分
-        if len(sentence) > max_size:
-            # 先保存当前块
-            if current_chunk:
-                chunks.append(current_chunk.strip())
-                current_chunk = ""
-            # 强制按字符切分超长句子
-            for j in range(0, len(sentence), max_size):
-                chunk = sentence[j:j + max_size]
-                if chunk.strip():
-                    chunks.append(chunk.strip())
-            continue
-
-        # 检查是否可以合并
-        if len(current_chunk) + len(sentence) <= max_size:
-            current_chunk += sentence
-        else:
-            # 当前块已满，保存并开始新块
-            if current_chunk:
-                chunks.append(current_chunk.strip())
-            current_chunk = sentence
-
-    # 保存最后一个块
-    if current_chunk:
-        chunks.append(current_chunk.strip())
-
-    return chunks if chunks else [text]
-
-
 def _make_text_item(text: str, skip: bool = False, is_sub: bool = False,
                     sub_index: int = 0, sub_total: int = 1,
                     is_separator: bool = False) -> Dict:
@@ -249,6 +228,19 @@ def _write_result(trans: Dict, texts: List[Dict]) -> int:
     写入翻译结果
     :return: 翻译字数统计
     """
+    result_parts, text_count = _format_result(trans, texts)
+
+    # 合并输出，用双换行分隔段落
+    _write_file(trans['target_file'], '\n\n'.join(result_parts))
+
+    return text_count
+
+
+def _format_result(trans: Dict, texts: List[Dict]) -> Tuple[List[str], int]:
+    """
+    按翻译模式生成输出段落
+    :return: (段落列表, 翻译字数统计)
+    """
     trans_type = trans.get('type', '')
     only_translation = 'only' in trans_type
     keep_both = 'both' in trans_type
@@ -329,9 +321,156 @@ def _write_result(trans: Dict, texts: List[Dict]) -> int:
             result_parts.append(sub_original)
             result_parts.append(sub_translated)
 
-    # 合并输出，用双换行分隔段落
-    content = '\n\n'.join(result_parts)
+    return result_parts, text_count
 
-    _write_file(trans['target_file'], content)
 
-    return text_count
+# ==================== 流式处理 ====================
+
+def _start_streaming(trans: Dict, start_time) -> bool:
+    """
+    大文件流式翻译：按窗口读取段落，最多 STREAM_INFLIGHT 个窗口同时翻译，
+    译完的窗口放入顺序缓冲，按原顺序追加写入目标文件
+    """
+    translate_id = trans['id']
+    file_path = trans['file_path']
+
+    try:
+        encoding = common.detect_stream_encoding(file_path, ENCODINGS, ENCODING_SAMPLE_SIZE)
+    except Exception as e:
+        logging.error(f"[任务{translate_id}] 读取文件失败: {e}")
+        to_translate.error(translate_id, f"读取文件失败: {str(e)}")
+        return False
+
+    file_size = max(1, os.path.getsize(file_path))
+    chunker = get_chunker(trans)
+    event = Event()
+    logging.info(
+        f"[任务{translate_id}] 流式翻译 {file_size / 1024 / 1024:.1f}MB，编码 {encoding}，"
+        f"每窗口 {STREAM_WINDOW} 个文本块，并发 {STREAM_INFLIGHT} 个窗口")
+
+    def translate_window(window, pending, span) -> bool:
+        return not pending or to_translate.translate_batch(
+            dict(trans, progress_span=span), window, event)
+
+    text_count = 0
+    written = False  # 是否已写出段落
+    inflight = deque()  # 顺序缓冲：(窗口各段落的 (文本块, 与上一段之间的原空白), Future)，按读取顺序排列
+
+    def write_ready(out, block: bool) -> bool:
+        """按顺序写出已完成的窗口；block 为 True 时等待队首窗口完成"""
+        nonlocal text_count, written
+        while inflight and (block or inflight[0][1].done()):
+            paragraphs, future = inflight.popleft()
+            # 任务已取消（已被回收给其他worker）时不再写目标文件
+            if not future.result() or to_translate.cancelled(trans):
+                return False
+            # 段落之间用双换行分隔（与一次性写出时相同），截断的段落还原截断处的空白
+            for items, joiner in paragraphs:
+                parts, count = _format_result(trans, items)
+                if written:
+                    out.write('\n\n' if joiner is None else joiner)
+                out.write('\n\n'.join(parts))
+                written = True
+                text_count += count
+            out.flush()
+            block = False
+        return True
+
+    try:
+        with open(trans['target_file'], 'w', encoding='utf-8') as out, \
+                ThreadPoolExecutor(max_workers=max(1, STREAM_INFLIGHT)) as executor:
+            try:
+                window = []
+                window_paragraphs = []  # 窗口内各段落的 (文本块, 与上一段之间的原空白)
+                window_pending = 0  # 窗口内需要翻译的块数
+                window_start = 0  # 窗口起始位置（字节），用于计算整体进度
+
+                def submit_window(position: int) -> bool:
+                    nonlocal window, window_paragraphs, window_pending, window_start
+                    span = (window_start / file_size * 100, max(0, position - window_start) / file_size * 100)
+                    inflight.append((window_paragraphs,
+                                     executor.submit(translate_window, window, window_pending, span)))
+                    window, window_paragraphs, window_pending, window_start = [], [], 0, position
+                    # 在途窗口已满时等待最早的窗口完成
+                    return write_ready(out, block=len(inflight) >= max(1, STREAM_INFLIGHT))
+
+                for para_no, (para, position, joiner) in enumerate(_iter_paragraphs(file_path, encoding)):
+                    if para:
+                        items = _paragraph_items(para, chunker, uid=f"p{para_no}")
+                    elif joiner is None:
+                        # 开头/结尾的空行，与 _smart_chunk 一样保留为分隔符
+                        items = [_make_text_item('', skip=True, is_separator=True)]
+                    else:
+                        continue
+                    window.extend(items)
+                    window_paragraphs.append((items, joiner))
+                    window_pending += sum(1 for t in items if not t.get('skip', False))
+                    if window_pending >= STREAM_WINDOW and not submit_window(position):
+                        event.set()
+                        return False
+
+                if window and not submit_window(file_size):
+                    event.set()
+                    return False
+                while inflight:
+                    if not write_ready(out, block=True):
+                        event.set()
+                        return False
+            except BaseException:
+                event.set()  # 中断其余在途窗口，避免退出线程池时等待它们译完
+                raise
+    except Exception as e:
+        logging.error(f"[任务{translate_id}] 流式翻译失败: {e}")
+        to_translate.error(translate_id, f"流式翻译失败: {str(e)}")
+        return False
+
+    end_time = datetime.datetime.now()
+    spend_time = common.display_spend(start_time, end_time)
+    to_translate.complete(trans, text_count, spend_time)
+    return True
+
+
+def _iter_paragraphs(file_path: str, encoding: str) -> Iterator[Tuple[str, int, Optional[str]]]:
+    """
+    逐行读取文件，按空行产出段落，与 _smart_chunk 的分段规则一致：
+    行首开始的空白行（首行除外）结束当前段落，连续的空白行视为一个分隔，
+    分隔出现在开头/结尾时产出空段落；超长段落按 MAX_PARAGRAPH_CHARS 截为多段
+    :return: (段落文本（去除首尾空白）, 当前读取位置（字节）, 截断段落的后续部分与前一部分之间的原空白，
+             新段落为None) 迭代器
+    """
+    def joiner(cut: Optional[str], raw: str) -> Optional[str]:
+        return None if cut is None else cut + raw[:len(raw) - len(raw.lstrip())]
+
+    with open(file_path, 'r', encoding=encoding) as f:
+        lines = []
+        size = 0
+        cut = None  # 当前段落是截断后的后续部分时，为前一部分末尾的空白
+        separated = False  # 刚以空白行分段，随后的空白行属于同一分隔
+        line_start = False  # 当前读取位置是否在行首（文件开头不算，与按 \n\s*\n 分割一致）
+        while True:
+            line = f.readline(MAX_LINE_CHARS)
+            if not line:
+                break
+            blank = line_start and line.endswith('\n') and not line.strip()
+            line_start = line.endswith('\n')
+            if blank:
+                if not separated:
+                    if lines or cut is None:
+                        raw = ''.join(lines)
+                        yield raw.strip(), f.buffer.tell(), joiner(cut, raw)
+                    lines, size, cut = [], 0, None
+                    separated = True
+                continue
+
+            separated = False
+            lines.append(line)
+            size += len(line)
+            if size >= MAX_PARAGRAPH_CHARS and line.strip():
+                raw = ''.join(lines)
+                yield raw.strip(), f.buffer.tell(), joiner(cut, raw)
+                cut = raw[len(raw.rstrip()):]
+                lines, size = [], 0
+
+        if lines or separated:
+            raw = ''.join(lines)
+            yield raw.strip(), f.buffer.tell(), joiner(cut, raw)
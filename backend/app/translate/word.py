@@ -1,30 +1,51 @@
 # translate/word.py
 """
 分块策略：
-- 正文按段落为单位
+- 正文按段落为单位，超过模型token上限的段落按句子切分
 - 表格按单元格为单位
 - 页眉页脚单独处理
+- 文本框、脚注、尾注、批注、SmartArt 中的段落在lxml层处理（不构建python-docx对象）：
+  文本框在正文遍历时一并收集，其他部件按主文档的关系遍历一次
 - 保留图片、图表等非文本元素
 - 保持对齐方式、缩进、行间距等段落格式
+
+正文只在lxml层按文档顺序遍历一次（段落、表格、单元格），文本块记录所在段落/单元格的引用，
+回写时直接使用该引用，不再重复构建 document.paragraphs / document.tables / row.cells
+
+WORD_ENGINE=xml 时使用部件级XML引擎，不构建python-docx对象：
+- 正文、页眉、页脚、脚注、尾注、批注、SmartArt 各部件用 iterparse 流式提取段落文本
+  （含文本框中的段落，处理完的元素立即释放），记录 部件 -> 段落序号 -> 文本块 的索引
+- 翻译后逐个部件解析、原地改写 <w:t>、序列化写回，其余zip成员原样复制
+- 以段落为单位（表格单元格中的每个段落单独翻译），仅译文/双语、继承格式的输出与默认引擎一致
 """
+import os
 import datetime
 import logging
 import re
-from typing import List, Dict, Any, Optional
-from dataclasses import dataclass
+import zipfile
+from itertools import groupby
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from dataclasses import dataclass, field
 from threading import Event
 from copy import deepcopy
+from functools import partial
+from lxml import etree
 from docx import Document
 from docx.shared import Pt, RGBColor
 from docx.oxml.ns import qn
 from docx.text.paragraph import Paragraph
 from docx.text.run import Run
 from docx.table import Table, _Cell
+from docx.opc.part import XmlPart
 from . import to_translate
 from . import common
+from . import ooxml
+from .chunking import Chunker, get_chunker
 
-# 分块配置
-MAX_CHUNK_SIZE = 2000
+ENGINE = os.environ.get('WORD_ENGINE', 'python-docx').lower()  # python-docx / xml（部件级XML引擎）
+# 主文档关系类型后缀：页眉页脚（默认引擎按节处理），以及脚注、尾注、批注、SmartArt（数据和绘图缓存）
+HEADER_FOOTER_TYPES = ('/header', '/footer')
+NOTE_PART_TYPES = ('/footnotes', '/endnotes', '/comments', '/diagramData', '/diagramDrawing')
 
 
 @dataclass
@@ -57,7 +78,7 @@ class ParagraphFormat:
 class TextBlock:
     """文本块"""
     uid: str
-    block_type: str  # paragraph, table_cell, header, footer
+    block_type: str  # paragraph, table_cell, header_footer, textbox, xml_paragraph
 
     # 位置
     paragraph_index: int = -1
@@ -86,6 +107,11 @@ class TextBlock:
     sub_total: int = 1
     parent_uid: str = ""
 
+    # 所在段落/单元格（Paragraph / _Cell；xml_paragraph 为段落元素），回写时直接使用
+    target: Any = field(default=None, repr=False, compare=False)
+    # xml_paragraph 所在部件（脚注、批注、SmartArt等）
+    part: Any = field(default=None, repr=False, compare=False)
+
 
 def start(trans: Dict[str, Any]) -> bool:
     """Word文档翻译入口"""
@@ -99,6 +125,9 @@ def start(trans: Dict[str, Any]) -> bool:
     logging.info(
         f"[任务{translate_id}] 翻译模式: only={only_translation}, inherit={inherit_format}")
 
+    if ENGINE == 'xml' and zipfile.is_zipfile(trans['file_path']):
+        return _start_xml(trans, start_time, only_translation, inherit_format)
+
     try:
         document = Document(trans['file_path'])
     except Exception as e:
@@ -107,7 +136,7 @@ def start(trans: Dict[str, Any]) -> bool:
         return False
 
     try:
-        text_blocks = _extract_all_text_blocks(document)
+        text_blocks = _extract_all_text_blocks(document, get_chunker(trans))
     except Exception as e:
         logging.error(f"[任务{translate_id}] 提取文本失败: {e}")
         to_translate.error(translate_id, f"提取文本失败: {str(e)}")
@@ -150,8 +179,8 @@ def start(trans: Dict[str, Any]) -> bool:
 
 # ==================== 文本提取 ====================
 
-def _extract_all_text_blocks(document: Document) -> List[TextBlock]:
-    """提取文档中所有文本块"""
+def _extract_all_text_blocks(document: Document, chunker: Chunker) -> List[TextBlock]:
+    """单次遍历正文提取所有文本块（段落和表格按文档顺序），再提取页眉页脚"""
     blocks = []
     uid_counter = [0]
 
@@ -159,22 +188,64 @@ def _extract_all_text_blocks(document: Document) -> List[TextBlock]:
         uid_counter[0] += 1
         return f"{prefix}_{uid_counter[0]}"
 
-    for para_idx, paragraph in enumerate(document.paragraphs):
-        para_blocks = _extract_paragraph_blocks(paragraph, para_idx, next_uid)
-        blocks.extend(para_blocks)
-
-    for table_idx, table in enumerate(document.tables):
-        table_blocks = _extract_table_blocks(table, table_idx, next_uid)
-        blocks.extend(table_blocks)
+    body = document._body
+    para_idx = 0
+    table_idx = 0
+    for element in _iter_block_elements(body._element):
+        # 文本框排在所在段落/表格之前：外层段落按重排格式回写时会复制含文本框的run
+        blocks.extend(_extract_textbox_blocks(element, body, next_uid, chunker))
+        if element.tag == qn('w:p'):
+            paragraph = Paragraph(element, body)
+            blocks.extend(_extract_paragraph_blocks(paragraph, para_idx, next_uid, chunker))
+            para_idx += 1
+        else:
+            table = Table(element, body)
+            blocks.extend(_extract_table_blocks(table, table_idx, next_uid, chunker))
+            table_idx += 1
 
     for section_idx, section in enumerate(document.sections):
         hf_blocks = _extract_header_footer_blocks(section, section_idx, next_uid)
         blocks.extend(hf_blocks)
 
+    blocks.extend(_extract_part_blocks(document, next_uid, chunker))
+
     return blocks
 
 
-def _extract_paragraph_blocks(paragraph: Paragraph, para_idx: int, next_uid) -> List[TextBlock]:
+def _iter_block_elements(container) -> Iterator:
+    """按文档顺序产出容器的直接子段落（w:p）和表格（w:tbl）元素"""
+    block_tags = (qn('w:p'), qn('w:tbl'))
+    for child in container.iterchildren(*block_tags):
+        yield child
+
+
+def _iter_table_cells(tbl) -> Iterator[Tuple[int, int, Any]]:
+    """
+    逐行产出表格单元格元素，跳过纵向合并的延续单元格（与 row.cells 去重后的结果一致）
+    :return: (行号, 网格列号, w:tc) 迭代器
+    """
+    tr_tag, tc_tag = qn('w:tr'), qn('w:tc')
+    tcPr_tag, span_tag, vmerge_tag, val_attr = qn('w:tcPr'), qn('w:gridSpan'), qn('w:vMerge'), qn('w:val')
+    for row_idx, tr in enumerate(tbl.iterchildren(tr_tag)):
+        col_idx = 0
+        for tc in tr.iterchildren(tc_tag):
+            span = 1
+            continuation = False
+            tcPr = tc.find(tcPr_tag)
+            if tcPr is not None:
+                grid_span = tcPr.find(span_tag)
+                if grid_span is not None:
+                    span = int(grid_span.get(val_attr, 1))
+                v_merge = tcPr.find(vmerge_tag)
+                # vMerge 未写 val 时表示延续上方单元格
+                continuation = v_merge is not None and v_merge.get(val_attr) != 'restart'
+            if not continuation:
+                yield row_idx, col_idx, tc
+            col_idx += span
+
+
+def _extract_paragraph_blocks(paragraph: Paragraph, para_idx: int, next_uid,
+                              chunker: Chunker, block_type: str = "paragraph") -> List[TextBlock]:
     """提取段落文本块"""
     blocks = []
 
@@ -189,34 +260,36 @@ def _extract_paragraph_blocks(paragraph: Paragraph, para_idx: int, next_uid) ->
     if not _should_translate(text):
         block = TextBlock(
             uid=next_uid("para"),
-            block_type="paragraph",
+            block_type=block_type,
             paragraph_index=para_idx,
             original_text=text,
             para_format=para_format,
-            skip=True
+            skip=True,
+            target=paragraph
         )
         blocks.append(block)
         return blocks
 
     run_style = _extract_first_run_style(paragraph)
 
-    if len(text) <= MAX_CHUNK_SIZE:
+    if chunker.fits(text):
         block = TextBlock(
             uid=next_uid("para"),
-            block_type="paragraph",
+            block_type=block_type,
             paragraph_index=para_idx,
             original_text=text,
             run_style=run_style,
-            para_format=para_format
+            para_format=para_format,
+            target=paragraph
         )
         blocks.append(block)
     else:
-        sub_texts = _split_by_sentences(text, MAX_CHUNK_SIZE)
+        sub_texts = chunker.split(text)
         parent_uid = next_uid("para_parent")
         for i, sub_text in enumerate(sub_texts):
             block = TextBlock(
                 uid=next_uid("para_sub"),
-                block_type="paragraph",
+                block_type=block_type,
                 paragraph_index=para_idx,
                 original_text=sub_text,
                 run_style=run_style,
@@ -224,83 +297,138 @@ def _extract_paragraph_blocks(paragraph: Paragraph, para_idx: int, next_uid) ->
                 is_sub=True,
                 sub_index=i,
                 sub_total=len(sub_texts),
-                parent_uid=parent_uid
+                parent_uid=parent_uid,
+                target=paragraph
             )
             blocks.append(block)
 
     return blocks
 
 
-def _extract_table_blocks(table: Table, table_idx: int, next_uid) -> List[TextBlock]:
+def _extract_table_blocks(table: Table, table_idx: int, next_uid,
+                          chunker: Chunker) -> List[TextBlock]:
     """提取表格文本块"""
     blocks = []
-    processed_cells = set()
 
-    for row_idx, row in enumerate(table.rows):
-        for col_idx, cell in enumerate(row.cells):
-            cell_id = id(cell._tc)
-            if cell_id in processed_cells:
-                continue
-            processed_cells.add(cell_id)
+    for row_idx, col_idx, tc in _iter_table_cells(table._tbl):
+        cell = _Cell(tc, table)
+        paragraphs = cell.paragraphs
+        text = _get_cell_text(paragraphs)
 
-            text = _get_cell_text(cell)
+        if not text or not text.strip():
+            continue
 
-            if not text or not text.strip():
-                continue
+        # 提取单元格第一段落的格式
+        para_format = None
+        if paragraphs:
+            para_format = _extract_paragraph_format(paragraphs[0])
 
-            # 提取单元格第一段落的格式
-            para_format = None
-            if cell.paragraphs:
-                para_format = _extract_paragraph_format(cell.paragraphs[0])
+        if not _should_translate(text):
+            block = TextBlock(
+                uid=next_uid("cell"),
+                block_type="table_cell",
+                table_index=table_idx,
+                row_index=row_idx,
+                col_index=col_idx,
+                original_text=text,
+                para_format=para_format,
+                skip=True,
+                target=cell
+            )
+            blocks.append(block)
+            continue
 
-            if not _should_translate(text):
+        run_style = _extract_cell_first_run_style(paragraphs)
+
+        if chunker.fits(text):
+            block = TextBlock(
+                uid=next_uid("cell"),
+                block_type="table_cell",
+                table_index=table_idx,
+                row_index=row_idx,
+                col_index=col_idx,
+                original_text=text,
+                run_style=run_style,
+                para_format=para_format,
+                target=cell
+            )
+            blocks.append(block)
+        else:
+            sub_texts = chunker.split(text)
+            parent_uid = next_uid("cell_parent")
+            for i, sub_text in enumerate(sub_texts):
                 block = TextBlock(
-                    uid=next_uid("cell"),
+                    uid=next_uid("cell_sub"),
                     block_type="table_cell",
                     table_index=table_idx,
                     row_index=row_idx,
                     col_index=col_idx,
-                    original_text=text,
+                    original_text=sub_text,
+                    run_style=run_style,
                     para_format=para_format,
-                    skip=True
+                    is_sub=True,
+                    sub_index=i,
+                    sub_total=len(sub_texts),
+                    parent_uid=parent_uid,
+                    target=cell
                 )
                 blocks.append(block)
-                continue
 
-            run_style = _extract_cell_first_run_style(cell)
+    return blocks
 
-            if len(text) <= MAX_CHUNK_SIZE:
-                block = TextBlock(
-                    uid=next_uid("cell"),
-                    block_type="table_cell",
-                    table_index=table_idx,
-                    row_index=row_idx,
-                    col_index=col_idx,
-                    original_text=text,
-                    run_style=run_style,
-                    para_format=para_format
-                )
-                blocks.append(block)
+
+def _extract_textbox_blocks(element, parent, next_uid, chunker: Chunker) -> List[TextBlock]:
+    """提取段落/表格中文本框（w:txbxContent）的段落"""
+    blocks = []
+    for txbx in element.iter(qn('w:txbxContent')):
+        for p in txbx.iter(qn('w:p')):
+            blocks.extend(_extract_paragraph_blocks(Paragraph(p, parent), -1, next_uid,
+                                                    chunker, block_type="textbox"))
+    return blocks
+
+
+def _extract_part_blocks(document: Document, next_uid, chunker: Chunker) -> List[TextBlock]:
+    """
+    提取脚注、尾注、批注、SmartArt 部件中的段落（遍历一次主文档的关系，在lxml层处理）
+    """
+    blocks = []
+    seen = set()
+    for rel in document.part.rels.values():
+        if rel.is_external or not rel.reltype.endswith(NOTE_PART_TYPES):
+            continue
+        part = rel.target_part
+        if part.partname in seen:
+            continue
+        seen.add(part.partname)
+
+        try:
+            if isinstance(part, XmlPart):
+                root = part.element
             else:
-                sub_texts = _split_by_sentences(text, MAX_CHUNK_SIZE)
-                parent_uid = next_uid("cell_parent")
+                root = etree.fromstring(part.blob, etree.XMLParser(huge_tree=True))
+        except Exception as e:
+            logging.warning(f"解析部件 {part.partname} 失败: {e}")
+            continue
+
+        for item in _xml_items(root):
+            for p in _xml_paragraphs(item):
+                text = ''.join(t.text or '' for t in _xml_text_nodes(p))
+                if not _should_translate(text):
+                    continue
+                sub_texts = [text] if chunker.fits(text) else chunker.split(text)
+                parent_uid = next_uid("part_parent") if len(sub_texts) > 1 else ""
                 for i, sub_text in enumerate(sub_texts):
-                    block = TextBlock(
-                        uid=next_uid("cell_sub"),
-                        block_type="table_cell",
-                        table_index=table_idx,
-                        row_index=row_idx,
-                        col_index=col_idx,
+                    blocks.append(TextBlock(
+                        uid=next_uid("part"),
+                        block_type="xml_paragraph",
                         original_text=sub_text,
-                        run_style=run_style,
-                        para_format=para_format,
-                        is_sub=True,
+                        is_sub=len(sub_texts) > 1,
                         sub_index=i,
                         sub_total=len(sub_texts),
-                        parent_uid=parent_uid
-                    )
-                    blocks.append(block)
-
+                        parent_uid=parent_uid,
+                        target=p,
+                        part=part
+                    ))
     return blocks
 
 
@@ -338,7 +466,8 @@ def _extract_header_footer_blocks(section, section_idx: int, next_uid) -> List[T
                         paragraph_index=para_idx,
                         original_text=text,
                         run_style=run_style,
-                        para_format=para_format
+                        para_format=para_format,
+                        target=paragraph
                     )
                     blocks.append(block)
         except Exception as e:
@@ -387,10 +516,10 @@ def _get_paragraph_text(paragraph: Paragraph) -> str:
     return ''.join(texts)
 
 
-def _get_cell_text(cell: _Cell) -> str:
+def _get_cell_text(paragraphs: List[Paragraph]) -> str:
     """获取单元格文本"""
     texts = []
-    for paragraph in cell.paragraphs:
+    for paragraph in paragraphs:
         para_text = _get_paragraph_text(paragraph)
         if para_text:
             texts.append(para_text)
@@ -419,9 +548,9 @@ def _extract_first_run_style(paragraph: Paragraph) -> Optional[RunStyle]:
     return None
 
 
-def _extract_cell_first_run_style(cell: _Cell) -> Optional[RunStyle]:
+def _extract_cell_first_run_style(paragraphs: List[Paragraph]) -> Optional[RunStyle]:
     """提取单元格第一个有效run的样式"""
-    for paragraph in cell.paragraphs:
+    for paragraph in paragraphs:
         style = _extract_first_run_style(paragraph)
         if style:
             return style
@@ -484,49 +613,6 @@ def _should_translate(text: str) -> bool:
     return True
 
 
-def _split_by_sentences(text: str, max_size: int) -> List[str]:
-    """按句子边界切分长文本"""
-    sentence_endings = r'([.!?。！？；;]\s*)'
-
-    parts = re.split(sentence_endings, text)
-
-    sentences = []
-    i = 0
-    while i < len(parts):
-        sentence = parts[i]
-        if i + 1 < len(parts) and re.match(sentence_endings, parts[i + 1]):
-            sentence += parts[i + 1]
-            i += 2
-        else:
-            i += 1
-        if sentence.strip():
-            sentences.append(sentence)
-
-    chunks = []
-    current = ""
-
-    for sentence in sentences:
-        if len(sentence) > max_size:
-            if current:
-                chunks.append(current)
-                current = ""
-            for j in range(0, len(sentence), max_size):
-                chunks.append(sentence[j:j + max_size])
-            continue
-
-        if len(current) + len(sentence) <= max_size:
-            current += sentence
-        else:
-            if current:
-                chunks.append(current)
-            current = sentence
-
-    if current:
-        chunks.append(current)
-
-    return chunks if chunks else [text]
-
-
 # ==================== 翻译接口 ====================
 
 def _blocks_to_texts(blocks: List[TextBlock]) -> List[Dict]:
@@ -536,10 +622,24 @@ def _blocks_to_texts(blocks: List[TextBlock]) -> List[Dict]:
         'original': b.original_text,
         'complete': False,
         'count': 0,
-        '_block_uid': b.uid
+        '_block_uid': b.uid,
+        'section': _block_section(b)
     } for b in blocks]
 
 
+def _block_section(block: TextBlock) -> str:
+    """文本块所属区域，翻译时只合并同一区域的相邻短块"""
+    if block.block_type == "table_cell":
+        return f"table_{block.table_index}"
+    if block.block_type == "header_footer":
+        return f"{block.header_footer_type}_{block.section_index}"
+    if block.block_type == "xml_paragraph":
+        return str(block.part.partname)
+    if block.block_type == "textbox":
+        return "textbox"
+    return "body"
+
+
 def _sync_results(blocks: List[TextBlock], texts: List[Dict]):
     """同步翻译结果到TextBlock"""
     block_map = {b.uid: b for b in blocks}
@@ -558,87 +658,39 @@ def _sync_results(blocks: List[TextBlock], texts: List[Dict]):
 def _apply_translation(document: Document, all_blocks: List[TextBlock],
                        only_translation: bool, inherit_format: bool,
                        target_lang: str) -> int:
-    """应用翻译结果到文档"""
+    """按文本块记录的段落/单元格引用应用翻译结果，同一段落/单元格的子块相邻"""
     text_count = 0
 
-    para_blocks = _organize_paragraph_blocks(all_blocks)
-    table_blocks = _organize_table_blocks(all_blocks)
-    hf_blocks = _organize_header_footer_blocks(all_blocks)
-
-    for para_idx, paragraph in enumerate(document.paragraphs):
-        if para_idx in para_blocks:
-            blocks = para_blocks[para_idx]
-            count = _apply_to_paragraph(paragraph, blocks, only_translation,
-                                        inherit_format, target_lang)
-            text_count += count
-
-    for table_idx, table in enumerate(document.tables):
-        processed_cells = set()
-        for row_idx, row in enumerate(table.rows):
-            for col_idx, cell in enumerate(row.cells):
-                cell_id = id(cell._tc)
-                if cell_id in processed_cells:
-                    continue
-                processed_cells.add(cell_id)
+    for _, group in groupby(all_blocks, key=lambda b: id(b.target)):
+        blocks = list(group)
+        first = blocks[0]
+        if first.block_type == "table_cell":
+            text_count += _apply_to_cell(first.target, blocks, only_translation,
+                                         inherit_format, target_lang)
+        elif first.block_type == "header_footer":
+            try:
+                _apply_to_paragraph(first.target, blocks, only_translation,
+                                    inherit_format, target_lang)
+            except Exception as e:
+                logging.warning(f"处理页眉页脚失败: {e}")
+        elif first.block_type == "xml_paragraph":
+            original = ''.join(b.original_text for b in blocks)
+            translated = ''.join(b.translated_text or b.original_text for b in blocks)
+            _xml_apply_paragraph(first.target, translated, len(original), only_translation,
+                                 inherit_format, target_lang)
+            text_count += sum(b.count for b in blocks)
+        else:
+            text_count += _apply_to_paragraph(first.target, blocks, only_translation,
+                                              inherit_format, target_lang)
 
-                key = (table_idx, row_idx, col_idx)
-                if key in table_blocks:
-                    blocks = table_blocks[key]
-                    count = _apply_to_cell(cell, blocks, only_translation,
-                                           inherit_format, target_lang)
-                    text_count += count
-
-    for section_idx, section in enumerate(document.sections):
-        _apply_to_header_footer(section, section_idx, hf_blocks,
-                                only_translation, inherit_format, target_lang)
+    # 非XmlPart的部件（如脚注、SmartArt）保存时使用原始字节，需要重新序列化
+    parts = {id(b.part): b for b in all_blocks if b.part is not None and not isinstance(b.part, XmlPart)}
+    for block in parts.values():
+        block.part._blob = ooxml.serialize(block.target.getroottree())
 
     return text_count
 
 
-def _organize_paragraph_blocks(blocks: List[TextBlock]) -> Dict[int, List[TextBlock]]:
-    """按段落索引组织块"""
-    result = {}
-    for b in blocks:
-        if b.block_type == "paragraph":
-            if b.paragraph_index not in result:
-                result[b.paragraph_index] = []
-            result[b.paragraph_index].append(b)
-
-    for idx in result:
-        result[idx].sort(key=lambda x: x.sub_index)
-
-    return result
-
-
-def _organize_table_blocks(blocks: List[TextBlock]) -> Dict[tuple, List[TextBlock]]:
-    """按表格位置组织块"""
-    result = {}
-    for b in blocks:
-        if b.block_type == "table_cell":
-            key = (b.table_index, b.row_index, b.col_index)
-            if key not in result:
-                result[key] = []
-            result[key].append(b)
-
-    for key in result:
-        result[key].sort(key=lambda x: x.sub_index)
-
-    return result
-
-
-def _organize_header_footer_blocks(blocks: List[TextBlock]) -> Dict[tuple, List[TextBlock]]:
-    """按页眉页脚组织块"""
-    result = {}
-    for b in blocks:
-        if b.block_type == "header_footer":
-            key = (b.section_index, b.header_footer_type, b.paragraph_index)
-            if key not in result:
-                result[key] = []
-            result[key].append(b)
-
-    return result
-
-
 def _apply_to_paragraph(paragraph: Paragraph, blocks: List[TextBlock],
                         only_translation: bool, inherit_format: bool,
                         target_lang: str) -> int:
@@ -698,41 +750,6 @@ def _apply_to_cell(cell: _Cell, blocks: List[TextBlock],
     return text_count
 
 
-def _apply_to_header_footer(section, section_idx: int,
-                            hf_blocks: Dict[tuple, List[TextBlock]],
-                            only_translation: bool, inherit_format: bool,
-                            target_lang: str):
-    """应用翻译到页眉页脚"""
-    hf_map = {
-        'header': section.header,
-        'footer': section.footer,
-        'first_header': section.first_page_header,
-        'first_footer': section.first_page_footer,
-    }
-
-    for hf_type, hf in hf_map.items():
-        if hf is None:
-            continue
-        try:
-            for para_idx, paragraph in enumerate(hf.paragraphs):
-                key = (section_idx, hf_type, para_idx)
-                if key in hf_blocks:
-                    blocks = hf_blocks[key]
-                    translated = blocks[0].translated_text or blocks[0].original_text
-                    original_len = len(blocks[0].original_text)
-
-                    if only_translation:
-                        _replace_paragraph_text(paragraph, translated,
-                                                blocks[0].run_style, blocks[0].para_format,
-                                                inherit_format, target_lang, original_len)
-                    else:
-                        _append_translation_to_paragraph(paragraph, translated,
-                                                         blocks[0].run_style, blocks[0].para_format,
-                                                         inherit_format, target_lang)
-        except Exception as e:
-            logging.warning(f"处理页眉页脚失败: {e}")
-
-
 def _replace_paragraph_text(paragraph: Paragraph, new_text: str,
                             run_style: Optional[RunStyle],
                             para_format: Optional[ParagraphFormat],
@@ -1029,3 +1046,260 @@ def _calculate_adjusted_size(original_size: Pt, new_len: int, original_len: int)
         return Pt(max(8, original_size.pt * 0.90))
     else:
         return Pt(max(8, original_size.pt * 0.85))
+
+
+# ==================== 部件级XML引擎 ====================
+
+def _start_xml(trans: Dict[str, Any], start_time, only_translation: bool,
+               inherit_format: bool) -> bool:
+    """
+    部件级XML引擎：流式提取各部件的段落文本，翻译后逐个部件改写 <w:t> 并重新打包
+    """
+    translate_id = trans['id']
+
+    try:
+        chunker = get_chunker(trans)
+        texts = []
+        entries = {}  # 部件 -> {段落序号: (texts起始下标, 块数)}
+        with zipfile.ZipFile(trans['file_path']) as zin:
+            for part in _xml_parts(zin):
+                with zin.open(part) as f:
+                    entries[part] = _xml_extract_part(f, part, chunker, texts)
+    except Exception as e:
+        logging.error(f"[任务{translate_id}] 提取文本失败: {e}")
+        to_translate.error(translate_id, f"提取文本失败: {str(e)}")
+        return False
+
+    logging.info(
+        f"[任务{translate_id}] XML引擎：{len(entries)} 个部件，{len(texts)} 个文本块需要翻译")
+
+    event = Event()
+    if texts and not to_translate.translate_batch(trans, texts, event):
+        return False
+
+    try:
+        target_lang = trans.get('lang', '英语')
+        rewrite = {
+            part: partial(_xml_apply_part, entries=part_entries, texts=texts,
+                          only_translation=only_translation, inherit_format=inherit_format,
+                          target_lang=target_lang)
+            for part, part_entries in entries.items() if part_entries
+        }
+        ooxml.repack(trans['file_path'], trans['target_file'], rewrite)
+    except Exception as e:
+        logging.error(f"[任务{translate_id}] 保存文档失败: {e}")
+        to_translate.error(translate_id, f"保存文档失败: {str(e)}")
+        return False
+
+    text_count = sum(t.get('count', 0) for t in texts)
+    end_time = datetime.datetime.now()
+    spend_time = common.display_spend(start_time, end_time)
+    to_translate.complete(trans, text_count, spend_time)
+    return True
+
+
+def _xml_parts(zin: zipfile.ZipFile) -> List[str]:
+    """主文档及其页眉、页脚、脚注、尾注、批注、SmartArt 部件"""
+    document = ooxml.main_part(zin, 'word/document.xml')
+    parts = [document]
+    part_types = HEADER_FOOTER_TYPES + NOTE_PART_TYPES
+    for rel_type, target in ooxml.read_rels(zin, document):
+        if rel_type.endswith(part_types) and target in zin.NameToInfo and target not in parts:
+            parts.append(target)
+    return parts
+
+
+def _xml_item_depth(root_tag: str) -> int:
+    """逐个处理的元素所在深度：正文为 w:document/w:body 的子元素，其他部件为根元素的子元素"""
+    return 3 if root_tag == qn('w:document') else 2
+
+
+def _xml_extract_part(source, part: str, chunker: Chunker, texts: List[Dict]) -> Dict[int, Tuple[int, int]]:
+    """
+    流式解析部件，按文档顺序提取需要翻译的段落，处理完的元素立即释放
+    :return: {段落序号: (texts起始下标, 块数)}
+    """
+    entries = {}
+    seq = 0
+    depth = 0
+    item_depth = None
+    for event, element in etree.iterparse(source, events=('start', 'end'), huge_tree=True):
+        if event == 'start':
+            depth += 1
+            if item_depth is None:
+                item_depth = _xml_item_depth(element.tag)
+            continue
+
+        if depth == item_depth:
+            for p in _xml_paragraphs(element):
+                text = ''.join(t.text or '' for t in _xml_text_nodes(p))
+                if _should_translate(text):
+                    entries[seq] = _xml_add_texts(text, f"{part}#{seq}", part, chunker, texts)
+                seq += 1
+            element.clear()
+            parent = element.getparent()
+            while element.getprevious() is not None:
+                del parent[0]
+        depth -= 1
+    return entries
+
+
+def _xml_add_texts(text: str, uid: str, section: str, chunker: Chunker,
+                   texts: List[Dict]) -> Tuple[int, int]:
+    """添加段落的文本块，超过token上限时按句子切分"""
+    start = len(texts)
+    sub_texts = [text] if chunker.fits(text) else chunker.split(text)
+    for i, sub_text in enumerate(sub_texts):
+        texts.append({
+            'text': sub_text,
+            'original': sub_text,
+            'complete': False,
+            'count': 0,
+            '_block_uid': uid if len(sub_texts) == 1 else f"{uid}_{i}",
+            'section': section
+        })
+    return start, len(sub_texts)
+
+
+def _xml_items(root) -> Iterator:
+    """部件中逐个处理的元素（与 _xml_extract_part 的处理深度一致）"""
+    if _xml_item_depth(root.tag) == 3:
+        for child in root:
+            yield from child
+    else:
+        yield from root
+
+
+def _xml_paragraphs(item) -> Iterator:
+    """
+    按文档顺序产出元素内的段落（w:p，以及SmartArt等DrawingML中的 a:p），
+    含表格单元格中的段落；文本框中的段落排在所在段落之后
+    """
+    paragraph_tags = _xml_paragraph_tags()
+    stack = [item]
+    while stack:
+        element = stack.pop()
+        if element.tag in paragraph_tags:
+            yield element
+        stack.extend(reversed(element))
+
+
+def _xml_text_nodes(p) -> Iterator:
+    """段落自身的文本节点（w:t / a:t，含超链接、修订插入等容器中的run），不含文本框中的嵌套段落"""
+    paragraph_tags = _xml_paragraph_tags()
+    t_tag = paragraph_tags[p.tag]
+    stack = list(reversed(p))
+    while stack:
+        element = stack.pop()
+        if element.tag == t_tag:
+            yield element
+        elif element.tag not in paragraph_tags:
+            stack.extend(reversed(element))
+
+
+def _xml_paragraph_tags() -> Dict[str, str]:
+    """段落标签 -> 文本节点标签"""
+    return {qn('w:p'): qn('w:t'), qn('a:p'): qn('a:t')}
+
+
+def _xml_apply_part(source, entries: Dict[int, Tuple[int, int]], texts: List[Dict],
+                    only_translation: bool, inherit_format: bool, target_lang: str) -> bytes:
+    """解析部件，按段落序号写入译文后序列化"""
+    tree = etree.parse(source, etree.XMLParser(huge_tree=True))
+    seq = 0
+    for item in _xml_items(tree.getroot()):
+        for p in _xml_paragraphs(item):
+            entry = entries.get(seq)
+            seq += 1
+            if entry is None:
+                continue
+            start, total = entry
+            blocks = texts[start:start + total]
+            original = ''.join(t.get('original', '') for t in blocks)
+            translated = ''.join(t.get('text') or t.get('original', '') for t in blocks)
+            _xml_apply_paragraph(p, translated, len(original), only_translation,
+                                 inherit_format, target_lang)
+    return ooxml.serialize(tree)
+
+
+def _xml_apply_paragraph(p, translated: str, original_len: int, only_translation: bool,
+                         inherit_format: bool, target_lang: str):
+    """
+    仅译文：译文写入第一个有文本的文本节点，其余清空（保留run及其格式、图片）
+    双语：在最后一个文本run之后插入换行和译文run，格式复制自第一个文本run
+    DrawingML段落（a:p）只替换/追加文本，不调整字号和字体
+    """
+    nodes = [t for t in _xml_text_nodes(p) if t.text]
+    if not nodes:
+        return
+    first_run = nodes[0].getparent()
+    wordml = p.tag == qn('w:p')
+
+    if only_translation:
+        nodes[0].text = translated
+        for t in nodes[1:]:
+            t.text = ''
+        if wordml:
+            nodes[0].set(ooxml.XML_SPACE, 'preserve')
+            _xml_adjust_font_size(first_run, len(translated), original_len)
+            if not inherit_format:
+                _xml_set_east_asia_font(first_run, target_lang)
+        return
+
+    prefix = 'w' if wordml else 'a'
+    new_run = p.makeelement(qn(f'{prefix}:r'))
+    rPr = first_run.find(qn(f'{prefix}:rPr'))
+    if rPr is not None:
+        new_run.append(deepcopy(rPr))
+    if wordml:
+        etree.SubElement(new_run, qn('w:br'))
+    t = etree.SubElement(new_run, nodes[0].tag)
+    t.text = translated
+    if wordml:
+        t.set(ooxml.XML_SPACE, 'preserve')
+        if not inherit_format:
+            _xml_set_east_asia_font(new_run, target_lang)
+
+    # 插在最后一个文本run所在的段落直接子元素（run / 超链接等）之后
+    anchor = nodes[-1].getparent()
+    while anchor.getparent() is not p:
+        anchor = anchor.getparent()
+    anchor.addnext(new_run)
+    if not wordml:
+        # DrawingML的换行是段落中与run并列的 a:br
+        anchor.addnext(p.makeelement(qn('a:br')))
+
+
+def _xml_adjust_font_size(run, new_len: int, original_len: int):
+    """按译文长度调整run的字号（w:sz / w:szCs，单位为半磅）"""
+    rPr = run.find(qn('w:rPr'))
+    if rPr is None:
+        return
+    for tag in ('w:sz', 'w:szCs'):
+        sz = rPr.find(qn(tag))
+        if sz is None:
+            continue
+        try:
+            half_points = int(sz.get(qn('w:val')))
+        except (TypeError, ValueError):
+            continue
+        adjusted = _calculate_adjusted_size(Pt(half_points / 2), new_len, original_len)
+        sz.set(qn('w:val'), str(int(round(adjusted.pt * 2))))
+
+
+def _xml_set_east_asia_font(run, target_lang: str):
+    """目标语言为中日韩时，未指定东亚字体的run使用默认东亚字体"""
+    if target_lang not in ['中文', '日语', '韩语']:
+        return
+    rPr = run.find(qn('w:rPr'))
+    if rPr is None:
+        rPr = run.makeelement(qn('w:rPr'))
+        run.insert(0, rPr)
+    rFonts = rPr.find(qn('w:rFonts'))
+    if rFonts is None:
+        rFonts = rPr.makeelement(qn('w:rFonts'))
+        # rFonts 须在 rStyle 之后、其他属性之前
+        index = 1 if len(rPr) and rPr[0].tag == qn('w:rStyle') else 0
+        rPr.insert(index, rFonts)
+    if not rFonts.get(qn('w:eastAsia')):
+        rFonts.set(qn('w:eastAsia'), '微软雅黑')
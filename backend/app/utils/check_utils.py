@@ -1,33 +1,21 @@
 # utils/ai_utils.py
-import openai
 from io import BytesIO
 import fitz  # PyMuPDF
 import logging
 
+from app.translate.clients import get_client
+
 
 class AIChecker:
     @staticmethod
     def check_openai_connection(api_url: str, api_key: str, model: str, timeout: int = 30):
         """OpenAI连通性测试"""
         try:
-            openai.api_key = api_key
-            base_url = api_url
-
-            # 确保URL以/v1/结尾
-            if not base_url.endswith("/v1/"):
-                if base_url.endswith("/v1"):
-                    # 如果以 /v1 结尾，添加 /
-                    base_url = base_url + "/"
-                elif base_url.endswith("/"):
-                    # 如果以 / 结尾，添加 v1/
-                    base_url = base_url + "v1/"
-                else:
-                    # 如果不以 / 结尾，添加 /v1/
-                    base_url = base_url + "/v1/"
-            openai.base_url = base_url
+            # 使用按接口隔离的客户端，不修改openai全局配置
+            client = get_client(api_url, api_key)
 
             # 发送一个简单的聊天请求
-            response = openai.chat.completions.create(
+            response = client.chat.completions.create(
                 model=model,
                 messages=[{"role": "user", "content": "hi"}],
                 timeout=timeout
@@ -0,0 +1,162 @@
+# utils/comparison_terms.py
+"""
+术语表条目（comparison_term）读写
+- 术语按行存储，批量插入、按ID游标分批读取，不再整体拼接/拆分 Comparison.content
+- 旧版 content 文本由 script/upgrade_db.py 的 migrate_content_terms() 迁移为条目
+- Excel 导入使用 openpyxl 只读模式逐行读取，导出使用只写模式逐行写入，不整表加载到内存
+"""
+import unicodedata
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import openpyxl
+import pytz
+from flask import current_app
+from sqlalchemy import func, literal
+
+from app.extensions import db
+from app.models.comparison import Comparison, ComparisonTerm
+
+BATCH_SIZE = 2000  # 批量插入/分批读取的条数
+SOURCE_MAX_LENGTH = 512
+TARGET_MAX_LENGTH = 1024
+EXCEL_HEADER = ('源术语', '目标术语')  # 术语表模板的列名
+
+
+def normalize_source(source: str) -> str:
+    """规范化源术语：Unicode NFC、去首尾空白、小写"""
+    return unicodedata.normalize('NFC', source or '').strip().lower()
+
+
+def add_terms(comparison: Comparison, pairs: Iterable[Tuple[str, str]]) -> int:
+    """
+    批量添加术语（调用方负责提交）
+    :param pairs: (源术语, 目标术语) 迭代器，可以是生成器
+    :return: 添加的条数
+    """
+    table = ComparisonTerm.__table__
+    now = datetime.utcnow()
+    rows = []
+    count = 0
+    for source, target in pairs:
+        source = str(source).strip() if source is not None else ''
+        target = str(target).strip() if target is not None else ''
+        if not source or not target:
+            continue
+        source = source[:SOURCE_MAX_LENGTH]
+        rows.append({
+            'comparison_id': comparison.id,
+            'source': source,
+            'target': target[:TARGET_MAX_LENGTH],
+            'normalized_source': normalize_source(source),
+            'origin_lang': comparison.origin_lang or '',
+            'target_lang': comparison.target_lang or '',
+            'created_at': now,
+        })
+        if len(rows) >= BATCH_SIZE:
+            db.session.execute(table.insert(), rows)
+            count += len(rows)
+            rows = []
+    if rows:
+        db.session.execute(table.insert(), rows)
+        count += len(rows)
+    return count
+
+
+def delete_terms(comparison_id: int):
+    """删除术语表的全部条目（调用方负责提交）"""
+    ComparisonTerm.query.filter_by(comparison_id=comparison_id).delete(synchronize_session=False)
+
+
+def replace_terms(comparison: Comparison, pairs: Iterable[Tuple[str, str]]) -> int:
+    """用新的术语列表替换全部条目（调用方负责提交）"""
+    delete_terms(comparison.id)
+    return add_terms(comparison, pairs)
+
+
+def copy_terms(source_id: int, comparison: Comparison):
+    """在数据库内复制术语条目到另一个术语表（调用方负责提交）"""
+    columns = ['comparison_id', 'source', 'target', 'normalized_source',
+               'origin_lang', 'target_lang', 'created_at']
+    select = db.select(
+        literal(comparison.id), ComparisonTerm.source, ComparisonTerm.target,
+        ComparisonTerm.normalized_source, ComparisonTerm.origin_lang,
+        ComparisonTerm.target_lang, literal(datetime.utcnow())
+    ).where(ComparisonTerm.comparison_id == source_id)
+    db.session.execute(ComparisonTerm.__table__.insert().from_select(columns, select))
+
+
+def iter_terms(comparison_id: int, batch_size: int = BATCH_SIZE) -> Iterator[Tuple[str, str]]:
+    """按ID游标分批读取术语，产出 (源术语, 目标术语)"""
+    last_id = 0
+    while True:
+        rows = (db.session.query(ComparisonTerm.id, ComparisonTerm.source, ComparisonTerm.target)
+                .filter(ComparisonTerm.comparison_id == comparison_id,
+                        ComparisonTerm.id > last_id)
+                .order_by(ComparisonTerm.id)
+                .limit(batch_size)
+                .all())
+        if not rows:
+            return
+        for _, source, target in rows:
+            yield source, target
+        last_id = rows[-1][0]
+
+
+@contextmanager
+def read_terms_workbook(file) -> Iterator[Iterator[Tuple[object, object]]]:
+    """
+    以只读模式打开术语表Excel并校验表头，提供逐行产出 (源术语, 目标术语) 的迭代器；
+    退出 with 块时关闭工作簿（无论迭代器是否被读取）
+    :raises ValueError: 缺少 源术语/目标术语 列
+    """
+    wb = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        header = next(ws.iter_rows(max_row=1, values_only=True), ())
+        header = [str(cell).strip() if cell is not None else '' for cell in header]
+        if not set(EXCEL_HEADER).issubset(header):
+            raise ValueError('文件格式不符合模板要求')
+        source_col = header.index(EXCEL_HEADER[0])
+        target_col = header.index(EXCEL_HEADER[1])
+
+        yield ((row[source_col], row[target_col])
+               for row in ws.iter_rows(min_row=2, values_only=True)
+               if len(row) > max(source_col, target_col))
+    finally:
+        wb.close()
+
+
+def write_terms_workbook(comparison_id: int, fileobj):
+    """以只写模式把术语表条目逐行写入Excel文件"""
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(EXCEL_HEADER)
+    for source, target in iter_terms(comparison_id):
+        ws.append((source, target))
+    wb.save(fileobj)
+
+
+def get_terms_map(comparison_ids: List[int]) -> Dict[int, List[Dict]]:
+    """批量获取多个术语表的条目，返回 {术语表ID: [{'origin', 'target'}, ...]}"""
+    result = {cid: [] for cid in comparison_ids}
+    if not comparison_ids:
+        return result
+    rows = (db.session.query(ComparisonTerm.comparison_id, ComparisonTerm.source, ComparisonTerm.target)
+            .filter(ComparisonTerm.comparison_id.in_(comparison_ids))
+            .order_by(ComparisonTerm.comparison_id, ComparisonTerm.id))
+    for comparison_id, source, target in rows:
+        result[comparison_id].append({'origin': source, 'target': target})
+    return result
+
+
+def touch(comparison: Comparison):
+    """
+    术语变化后更新术语表的 updated_at，并把术语版本号加1
+    翻译任务的术语缓存（在worker进程中）以版本号判断是否失效：updated_at 只精确到秒，
+    同一秒内的两次编辑无法区分；版本号在数据库中自增，并发编辑也不会得到相同的值
+    """
+    comparison.updated_at = datetime.now(pytz.timezone(current_app.config['TIMEZONE']))
+    comparison.terms_version = func.coalesce(Comparison.terms_version, 0) + 1
+
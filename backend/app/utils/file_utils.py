@@ -3,6 +3,7 @@ import uuid
 from werkzeug.utils import secure_filename
 import os
 import hashlib
+import zipfile
 from pathlib import Path
 from datetime import datetime
 from flask import current_app
@@ -260,3 +261,52 @@ def get_upload_dir():
     if not os.path.exists(upload_dir):
         os.makedirs(upload_dir)
     return upload_dir
+
+
+ZIP_CHUNK_SIZE = 256 * 1024  # 流式打包ZIP时每次读取/输出的大小
+
+
+class _ZipStreamBuffer:
+    """只追加的输出缓冲，供 zipfile 以非seek模式写入，按块取出后清空"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(entries, chunk_size=ZIP_CHUNK_SIZE):
+    """
+    流式生成ZIP文件内容（用于分块响应），内存中只保留当前块
+    :param entries: (ZIP内文件名, 已定位到开头的二进制文件对象) 的迭代器，可以是生成器
+    """
+    buffer = _ZipStreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for arcname, fileobj in entries:
+            with zf.open(arcname, 'w', force_zip64=True) as dest:
+                for chunk in iter(lambda: fileobj.read(chunk_size), b''):
+                    dest.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+            data = buffer.drain()
+            if data:
+                yield data
+    data = buffer.drain()
+    if data:
+        yield data
@@ -0,0 +1,6 @@
+from app.resources.task.worker import run_pool
+
+# 翻译worker进程池入口：web服务（app.py）只负责任务入队，翻译由这里的worker进程执行
+# 进程数通过环境变量 TRANSLATE_WORKERS 配置
+if __name__ == '__main__':
+    run_pool()
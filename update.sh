@@ -31,6 +31,8 @@ docker run -d \
   -p 5000:5000 \
   -v ./backend-storage:/app/storage \
   doctranslator
+# 未设置 TRANSLATE_EXTERNAL_WORKER，后端容器自带翻译worker进程池（进程数由 TRANSLATE_WORKERS 配置，默认2），
+# 与web服务共用数据库，无需单独启动worker容器
 
 # 5. 启动 Nginx 容器
 echo "🌍 启动 Nginx 容器..."